@@ -0,0 +1,19 @@
+# Generated by Django 5.1.4 on 2026-10-17 05:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='useractivitylog',
+            index=models.Index(fields=['user', '-created_at'], name='activity_logs_user_recent_idx'),
+        ),
+    ]
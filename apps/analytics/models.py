@@ -333,6 +333,8 @@ class UserActivityLog(models.Model):
             models.Index(fields=['user', 'action']),
             models.Index(fields=['session_id']),
             models.Index(fields=['created_at']),
+            # Per-user activity over a date range
+            models.Index(fields=['user', '-created_at'], name='activity_logs_user_recent_idx'),
         ]
     
     def __str__(self):
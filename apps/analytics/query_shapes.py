@@ -0,0 +1,17 @@
+# apps/analytics/query_shapes.py
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from core.query_audit import register, sample_pk
+
+from .models import UserActivityLog
+
+@register('user_activity_range', expect_index='activity_logs_user_recent_idx')
+def user_activity_range():
+    """user_activity_analytics over the default 30 days."""
+    end = timezone.now()
+    return UserActivityLog.objects.filter(
+        user_id=sample_pk(get_user_model()), created_at__range=[end - timedelta(days=30), end]
+    ).order_by('-created_at')
@@ -2,6 +2,7 @@
 from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
+from django.shortcuts import get_object_or_404
 from django.db.models import Sum, Count, Avg, F
 from django.utils import timezone
 from datetime import timedelta, datetime
@@ -16,6 +17,7 @@ from .serializers import (
     ProductAnalyticsSerializer, DashboardAnalyticsSerializer,
     VendorDashboardSerializer, ReportSerializer
 )
+from apps.vendors.models import Vendor
 from core.permissions import IsVendorOnly, IsAdminOnly
 
 @api_view(['GET'])
@@ -90,7 +92,7 @@ def admin_dashboard_analytics(request):
         'total_customers': User.objects.count(),
         'new_customers_today': latest.new_customers if latest else 0,
         'total_products': Product.objects.count(),
-        'out_of_stock_products': Product.objects.filter(stock_quantity=0).count(),
+        'out_of_stock_products': Product.objects.filter(stock_status='out_of_stock').count(),
         'recent_orders': [
             {
                 'id': str(order.id),
@@ -142,7 +144,7 @@ def admin_dashboard_analytics(request):
 @permission_classes([permissions.IsAuthenticated, IsVendorOnly])
 def vendor_dashboard_analytics(request):
     """Get vendor dashboard analytics."""
-    vendor = get_object_or_404('vendors.Vendor', user=request.user)
+    vendor = get_object_or_404(Vendor, user=request.user)
     
     # Get date range
     days = int(request.query_params.get('days', 30))
@@ -172,10 +174,11 @@ def vendor_dashboard_analytics(request):
     products = Product.objects.filter(vendor=vendor)
     
     total_products = products.count()
-    out_of_stock_products = products.filter(stock_quantity=0).count()
+    out_of_stock_products = products.filter(stock_status='out_of_stock').count()
     low_stock_products = products.filter(
-        stock_quantity__gt=0,
-        stock_quantity__lte=F('low_stock_threshold')
+        stock_status='in_stock',
+        manage_stock=True,
+        available_quantity__lte=F('low_stock_threshold')
     ).count()
     
     # Performance metrics
@@ -445,8 +448,6 @@ def generate_product_report(date_from, date_to, filters):
 
 def generate_vendor_report(date_from, date_to, filters):
     """Generate vendor analytics report."""
-    from apps.vendors.models import Vendor
-    
     vendors = Vendor.objects.filter(created_at__date__range=[date_from, date_to])
     
     return {
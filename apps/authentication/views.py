@@ -14,6 +14,7 @@ from .serializers import (
     ResendEmailVerificationSerializer, OTPVerificationSerializer,
     OTPRequestSerializer, LogoutSerializer, SocialAuthSerializer
 )
+from apps.orders.guest_cart import merge_guest_cart, request_guest_id
 from apps.users.serializers import (
     UserRegistrationSerializer, PasswordResetRequestSerializer,
     PasswordResetConfirmSerializer
@@ -67,6 +68,11 @@ class CustomTokenObtainPairView(TokenObtainPairView):
                 # Update last active
                 user.last_active = timezone.now()
                 user.save(update_fields=['last_active'])
+                
+                # Move the cart built before logging in into the user's
+                guest_id = request_guest_id(request)
+                if guest_id is not None:
+                    merge_guest_cart(user, guest_id)
         
         else:
             # Log failed login attempt
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-17 05:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notificationtemplate',
+            name='notification_type',
+            field=models.CharField(choices=[('order_created', 'Order Created'), ('order_confirmed', 'Order Confirmed'), ('order_shipped', 'Order Shipped'), ('order_delivered', 'Order Delivered'), ('order_cancelled', 'Order Cancelled'), ('payment_successful', 'Payment Successful'), ('payment_failed', 'Payment Failed'), ('return_requested', 'Return Requested'), ('return_approved', 'Return Approved'), ('return_rejected', 'Return Rejected'), ('product_back_in_stock', 'Product Back in Stock'), ('vendor_new_order', 'Vendor New Order'), ('vendor_payment_received', 'Vendor Payment Received'), ('vendor_low_stock', 'Vendor Low Stock'), ('user_registered', 'User Registered'), ('password_reset', 'Password Reset'), ('promotional', 'Promotional'), ('system_maintenance', 'System Maintenance')], max_length=50),
+        ),
+    ]
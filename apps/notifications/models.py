@@ -23,6 +23,7 @@ class NotificationTemplate(models.Model):
         ('product_back_in_stock', 'Product Back in Stock'),
         ('vendor_new_order', 'Vendor New Order'),
         ('vendor_payment_received', 'Vendor Payment Received'),
+        ('vendor_low_stock', 'Vendor Low Stock'),
         ('user_registered', 'User Registered'),
         ('password_reset', 'Password Reset'),
         ('promotional', 'Promotional'),
@@ -93,6 +94,9 @@ class NotificationTemplate(models.Model):
             'title': title
         }
 
+# Delivered but not yet opened
+UNREAD_STATUSES = ('sent', 'delivered')
+
 class Notification(models.Model):
     """Individual notifications sent to users."""
     STATUS_CHOICES = [
@@ -103,6 +107,7 @@ class Notification(models.Model):
         ('failed', 'Failed'),
         ('cancelled', 'Cancelled'),
     ]
+    UNREAD_STATUSES = UNREAD_STATUSES
     
     PRIORITY_CHOICES = [
         ('low', 'Low'),
@@ -152,6 +157,13 @@ class Notification(models.Model):
             models.Index(fields=['channel', 'status']),
             models.Index(fields=['created_at']),
             models.Index(fields=['priority', 'status']),
+            # Notification inbox, newest first
+            models.Index(fields=['user', '-created_at'], name='notifications_user_recent_idx'),
+            # Unread inbox; read notifications are the bulk of the table
+            models.Index(
+                fields=['user', '-created_at'], name='notifications_unread_idx',
+                condition=models.Q(status__in=UNREAD_STATUSES)
+            ),
         ]
     
     def __str__(self):
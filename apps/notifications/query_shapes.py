@@ -0,0 +1,18 @@
+# apps/notifications/query_shapes.py
+from django.contrib.auth import get_user_model
+
+from core.query_audit import register, sample_pk
+
+from .models import Notification
+
+@register('notification_inbox', expect_index='notifications_user_recent_idx')
+def notification_inbox():
+    """UserNotificationListView, first page."""
+    return Notification.objects.filter(user_id=sample_pk(get_user_model())).order_by('-created_at')[:20]
+
+@register('notification_unread', expect_index='notifications_unread_idx')
+def notification_unread():
+    """UserNotificationListView with ?unread=true, first page."""
+    return Notification.objects.filter(
+        user_id=sample_pk(get_user_model()), status__in=Notification.UNREAD_STATUSES
+    ).order_by('-created_at')[:20]
@@ -548,6 +548,23 @@ def notify_vendor_new_order(vendor, order_item):
         }
     )
 
+def notify_vendor_low_stock(vendor, product):
+    """Send low stock alert to vendor."""
+    NotificationService.create_notification(
+        user=vendor.user,
+        notification_type='vendor_low_stock',
+        title='Low Stock Alert',
+        message=f'Only {product.available_quantity} left of {product.name}.',
+        content_object=product,
+        data={
+            'product_id': str(product.id),
+            'product_name': product.name,
+            'available_quantity': product.available_quantity,
+            'low_stock_threshold': product.low_stock_threshold
+        },
+        priority='high'
+    )
+
 def notify_product_back_in_stock(product, users):
     """Send back in stock notification to interested users."""
     for user in users:
@@ -16,12 +16,14 @@ from .serializers import (
     PushDeviceSerializer, BulkNotificationSerializer
 )
 from .services import NotificationService, AnalyticsService
+from core.pagination import HybridPagination
 from core.permissions import IsAdminOnly
 
 class UserNotificationListView(generics.ListAPIView):
     """List user's notifications."""
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = HybridPagination
     
     def get_queryset(self):
         user = self.request.user
@@ -31,6 +33,8 @@ class UserNotificationListView(generics.ListAPIView):
         status_filter = self.request.query_params.get('status')
         if status_filter:
             queryset = queryset.filter(status=status_filter)
+        elif self.request.query_params.get('unread') == 'true':
+            queryset = queryset.filter(status__in=Notification.UNREAD_STATUSES)
         
         # Filter by channel
         channel = self.request.query_params.get('channel')
@@ -74,7 +78,7 @@ def mark_all_notifications_read(request):
     """Mark all notifications as read."""
     updated_count = Notification.objects.filter(
         user=request.user,
-        status__in=['sent', 'delivered']
+        status__in=Notification.UNREAD_STATUSES
     ).update(
         status='read',
         read_at=timezone.now()
@@ -96,7 +100,7 @@ def notification_summary(request):
     
     summary = {
         'total': notifications.count(),
-        'unread': notifications.filter(status__in=['sent', 'delivered']).count(),
+        'unread': notifications.filter(status__in=Notification.UNREAD_STATUSES).count(),
         'read': notifications.filter(status='read').count(),
         'by_channel': dict(
             notifications.values('channel').annotate(count=Count('id'))
@@ -0,0 +1,132 @@
+# apps/orders/cart_batch.py
+from django.db import transaction
+from django.utils import timezone
+
+from .cart_store import line_key, maybe_flush_carts, parse_line_key
+from .inventory import available_quantities
+
+class CartBatch:
+    """
+    A list of cart operations replayed over a loaded cart.
+
+    Operations are validated against the cart's lines and, in one query,
+    against the stock of every line they change; apply() then writes the
+    net result with locked reads of the cart and its rows, one bulk_create,
+    one bulk_update and one DELETE (or one store write per changed line for
+    carts held in a cart store).
+    """
+
+    def __init__(self, cart, operations):
+        self.cart = cart
+        self.items = {line_key(item.product_id, item.variation_id): item for item in cart.lines}
+        self.quantities = {line: item.quantity for line, item in self.items.items()}
+        self.errors = []
+        self.available = {}
+
+        by_id = {item.pk: line for line, item in self.items.items()}
+        last_touched = {}
+        for index, operation in enumerate(operations):
+            if operation['op'] != 'add' and operation.get('item'):
+                line = by_id.get(operation['item'])
+                if line is None:
+                    self.errors.append({'index': index, 'message': 'Cart item not found'})
+                    continue
+            else:
+                line = line_key(operation['product'], operation.get('variation'))
+
+            if operation['op'] == 'add':
+                self.quantities[line] = self.quantities.get(line, 0) + operation['quantity']
+            elif operation['op'] == 'set' and operation['quantity'] > 0:
+                self.quantities[line] = operation['quantity']
+            else:
+                self.quantities.pop(line, None)
+            last_touched[line] = index
+
+        self.changed = [
+            line for line in last_touched
+            if self.quantities.get(line, 0) != (self.items[line].quantity if line in self.items else 0)
+        ]
+        self._check_stock(last_touched)
+
+    def _check_stock(self, last_touched):
+        wanted = [line for line in self.changed if line in self.quantities]
+        self.available = available_quantities(wanted) if wanted else {}
+        for line in wanted:
+            if line not in self.available:
+                message = 'Product not found or not available'
+            else:
+                stock = self.available[line][0]
+                if stock is None or self.quantities[line] <= stock:
+                    continue
+                message = f'Only {stock} items available in stock'
+            self.errors.append({'index': last_touched[line], 'message': message})
+        self.errors.sort(key=lambda error: error['index'])
+
+    @property
+    def is_valid(self):
+        return not self.errors
+
+    def apply(self, store=None, cart_key=None):
+        """
+        Write the batch; with a store, the cart's lines in it are updated instead of rows.
+
+        Kept lines are written as the net change the batch made to them, so
+        quantities added by other requests since the cart was loaded are not
+        overwritten; removed lines are removed.
+        """
+        from .models import CartItem, ShoppingCart
+
+        deltas = {
+            line: self.quantities[line] - (self.items[line].quantity if line in self.items else 0)
+            for line in self.changed if line in self.quantities
+        }
+        if store is not None:
+            for line in self.changed:
+                if line in deltas:
+                    store.add(cart_key, line, deltas[line], max_quantity=self.available[line][0])
+                else:
+                    store.set(cart_key, line, 0)
+            maybe_flush_carts(store)
+            return
+
+        now = timezone.now()
+        with transaction.atomic():
+            # Batches on the same cart queue up on its row, so each one sees
+            # the lines the previous one inserted. Locking the items alone
+            # would not stop two batches inserting the same new line: a NULL
+            # variation never conflicts in the (cart, product, variation) key.
+            list(ShoppingCart.objects.select_for_update().filter(pk=self.cart.pk).values_list('pk'))
+            # Apply the changes to the rows as stored now, locked until commit
+            current = {
+                line_key(item.product_id, item.variation_id): item
+                for item in CartItem.objects.select_for_update().filter(cart=self.cart)
+            }
+            create, update, delete = [], [], []
+            for line in self.changed:
+                item = current.get(line)
+                quantity = ((item.quantity if item else 0) + deltas[line]) if line in deltas else 0
+                stock, price = self.available.get(line, (None, None))
+                if stock is not None:
+                    quantity = min(quantity, stock)
+                if quantity <= 0:
+                    if item is not None:
+                        delete.append(item.pk)
+                elif item is None:
+                    product_id, variation_id = parse_line_key(line)
+                    create.append(CartItem(
+                        cart=self.cart, product_id=product_id, variation_id=variation_id,
+                        quantity=quantity, unit_price=price
+                    ))
+                else:
+                    item.quantity, item.unit_price, item.updated_at = quantity, price, now
+                    update.append(item)
+
+            # A line with a variation inserted by a request outside the lock
+            # takes the batch's quantity instead of failing on the unique key
+            CartItem.objects.bulk_create(
+                create, update_conflicts=True, unique_fields=['cart', 'product', 'variation'],
+                update_fields=['quantity', 'unit_price', 'updated_at']
+            )
+            CartItem.objects.bulk_update(update, ['quantity', 'unit_price', 'updated_at'])
+            if delete:
+                CartItem.objects.filter(pk__in=delete).delete()
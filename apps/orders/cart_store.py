@@ -0,0 +1,526 @@
+# apps/orders/cart_store.py
+import logging
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# One cart line: the CartItem id it is persisted under and its quantity
+CartLine = namedtuple('CartLine', ['item_id', 'quantity'])
+
+def line_key(product_id, variation_id=None):
+    return f"{product_id}:{variation_id or ''}"
+
+def parse_line_key(key):
+    product_id, variation_id = key.split(':', 1)
+    return product_id, variation_id or None
+
+def user_cart_key(user_id):
+    return f'user:{user_id}'
+
+def guest_cart_key(guest_id):
+    return f'guest:{guest_id}'
+
+CART_VERSION_KEY = 'carts:version:%s'
+
+def get_cart_version(cart_key):
+    """
+    The change counter of a cart. Counters start from the current time in
+    milliseconds, so a counter lost from the cache never goes backwards.
+    """
+    key = CART_VERSION_KEY % cart_key
+    cache.add(key, int(time.time() * 1000), None)
+    return cache.get(key)
+
+def bump_cart_version(cart_key):
+    get_cart_version(cart_key)
+    try:
+        return cache.incr(CART_VERSION_KEY % cart_key)
+    except ValueError:
+        # Evicted between the two calls
+        return get_cart_version(cart_key)
+
+class BaseCartStore:
+    """
+    Interface for hot cart stores.
+
+    A cart is a mapping of line keys to CartLine, addressed by a cart key
+    such as 'user:<pk>'. Every mutation marks the cart dirty; dirty carts
+    are written to CartItem rows by flush_carts().
+    """
+
+    def __init__(self):
+        self.ttl = getattr(settings, 'CART_STORE_TTL', 60 * 60 * 24 * 7)
+        self.flush_interval = getattr(settings, 'CART_STORE_FLUSH_INTERVAL', 30)
+
+    def get(self, cart_key):
+        """{line key: CartLine}, or None if the cart is not in the store."""
+        raise NotImplementedError
+
+    def load(self, cart_key, lines):
+        """Seed a cart from the database without overwriting newer lines."""
+        raise NotImplementedError
+
+    def add(self, cart_key, line, quantity, max_quantity=None):
+        """
+        Atomically add `quantity` to a line, capped at `max_quantity`.
+
+        `quantity` may be negative; a line that drops to 0 is removed.
+        Returns (CartLine or None, capped) where capped tells whether the
+        cap applied.
+        """
+        raise NotImplementedError
+
+    def set(self, cart_key, line, quantity):
+        """Set a line's quantity; 0 removes it. Returns the CartLine or None."""
+        raise NotImplementedError
+
+    def clear(self, cart_key):
+        """Empty a cart; the next flush deletes its CartItem rows."""
+        raise NotImplementedError
+
+    def discard(self, cart_key):
+        """Forget a cart without persisting it (a guest cart after merging)."""
+        raise NotImplementedError
+
+    def drain_dirty(self):
+        """Atomically take the keys of carts changed since the last drain."""
+        raise NotImplementedError
+
+    def mark_dirty(self, cart_keys):
+        raise NotImplementedError
+
+    def should_flush(self):
+        """Return True when this caller should flush dirty carts now."""
+        raise NotImplementedError
+
+class LocalCartStore(BaseCartStore):
+    """In-process store, for tests and single-process development."""
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._carts = {}
+        self._dirty = set()
+        self._last_flush = time.monotonic()
+
+    def get(self, cart_key):
+        with self._lock:
+            lines = self._carts.get(cart_key)
+            return dict(lines) if lines is not None else None
+
+    def load(self, cart_key, lines):
+        with self._lock:
+            self._carts.setdefault(cart_key, dict(lines))
+
+    def add(self, cart_key, line, quantity, max_quantity=None):
+        with self._lock:
+            lines = self._carts.setdefault(cart_key, {})
+            current = lines.get(line) or CartLine(str(uuid.uuid4()), 0)
+            total = current.quantity + quantity
+            capped = max_quantity is not None and total > max_quantity
+            self._dirty.add(cart_key)
+            if total <= 0:
+                lines.pop(line, None)
+                return None, capped
+            lines[line] = CartLine(current.item_id, max_quantity if capped else total)
+            return lines[line], capped
+
+    def set(self, cart_key, line, quantity):
+        with self._lock:
+            lines = self._carts.setdefault(cart_key, {})
+            self._dirty.add(cart_key)
+            if quantity <= 0:
+                lines.pop(line, None)
+                return None
+            current = lines.get(line) or CartLine(str(uuid.uuid4()), 0)
+            lines[line] = CartLine(current.item_id, quantity)
+            return lines[line]
+
+    def clear(self, cart_key):
+        with self._lock:
+            self._carts[cart_key] = {}
+            self._dirty.add(cart_key)
+
+    def discard(self, cart_key):
+        with self._lock:
+            self._carts.pop(cart_key, None)
+            self._dirty.discard(cart_key)
+
+    def drain_dirty(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        return dirty
+
+    def mark_dirty(self, cart_keys):
+        with self._lock:
+            self._dirty.update(cart_keys)
+
+    def should_flush(self):
+        now = time.monotonic()
+        with self._lock:
+            if not self._dirty or now - self._last_flush < self.flush_interval:
+                return False
+            self._last_flush = now
+            return True
+
+class RedisCartStore(BaseCartStore):
+    """
+    Redis-backed store shared by all workers.
+
+    Each cart is one hash: 'q:<line>' holds the quantity, 'id:<line>' the
+    CartItem id and 'loaded' marks the cart as present even when empty.
+    Mutations are Lua scripts, so read-modify-write races between workers
+    cannot lose updates.
+    """
+    cart_key = 'carts:%s'
+    dirty_key = 'carts:dirty'
+    lock_key = 'carts:flush_lock'
+
+    ADD_SCRIPT = """
+    local quantity = redis.call('HINCRBY', KEYS[1], 'q:' .. ARGV[1], ARGV[2])
+    local capped = 0
+    if ARGV[3] ~= '' and quantity > tonumber(ARGV[3]) then
+        quantity = tonumber(ARGV[3])
+        redis.call('HSET', KEYS[1], 'q:' .. ARGV[1], quantity)
+        capped = 1
+    end
+    local item_id = ''
+    if quantity <= 0 then
+        redis.call('HDEL', KEYS[1], 'q:' .. ARGV[1], 'id:' .. ARGV[1])
+    else
+        redis.call('HSETNX', KEYS[1], 'id:' .. ARGV[1], ARGV[4])
+        item_id = redis.call('HGET', KEYS[1], 'id:' .. ARGV[1])
+    end
+    redis.call('HSET', KEYS[1], 'loaded', 1)
+    redis.call('EXPIRE', KEYS[1], ARGV[5])
+    redis.call('SADD', KEYS[2], ARGV[6])
+    return {item_id, quantity, capped}
+    """
+    SET_SCRIPT = """
+    if tonumber(ARGV[2]) <= 0 then
+        redis.call('HDEL', KEYS[1], 'q:' .. ARGV[1], 'id:' .. ARGV[1])
+    else
+        redis.call('HSET', KEYS[1], 'q:' .. ARGV[1], ARGV[2])
+        redis.call('HSETNX', KEYS[1], 'id:' .. ARGV[1], ARGV[3])
+    end
+    redis.call('HSET', KEYS[1], 'loaded', 1)
+    redis.call('EXPIRE', KEYS[1], ARGV[4])
+    redis.call('SADD', KEYS[2], ARGV[5])
+    return redis.call('HGET', KEYS[1], 'id:' .. ARGV[1])
+    """
+
+    def __init__(self):
+        super().__init__()
+        import redis
+
+        self.client = redis.Redis.from_url(settings.CART_STORE_REDIS_URL, decode_responses=True)
+        self.response_error = redis.exceptions.ResponseError
+        self._add = self.client.register_script(self.ADD_SCRIPT)
+        self._set = self.client.register_script(self.SET_SCRIPT)
+
+    def get(self, cart_key):
+        values = self.client.hgetall(self.cart_key % cart_key)
+        if not values:
+            return None
+        return {
+            field[2:]: CartLine(values.get(f'id:{field[2:]}'), int(quantity))
+            for field, quantity in values.items() if field.startswith('q:')
+        }
+
+    def load(self, cart_key, lines):
+        key = self.cart_key % cart_key
+        pipe = self.client.pipeline()
+        for line, (item_id, quantity) in lines.items():
+            pipe.hsetnx(key, f'q:{line}', quantity)
+            pipe.hsetnx(key, f'id:{line}', item_id)
+        pipe.hset(key, 'loaded', 1)
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def add(self, cart_key, line, quantity, max_quantity=None):
+        item_id, total, capped = self._add(
+            keys=[self.cart_key % cart_key, self.dirty_key],
+            args=[
+                line, quantity, '' if max_quantity is None else max_quantity,
+                str(uuid.uuid4()), self.ttl, cart_key
+            ]
+        )
+        return (CartLine(item_id, int(total)) if int(total) > 0 else None), bool(capped)
+
+    def set(self, cart_key, line, quantity):
+        item_id = self._set(
+            keys=[self.cart_key % cart_key, self.dirty_key],
+            args=[line, quantity, str(uuid.uuid4()), self.ttl, cart_key]
+        )
+        return CartLine(item_id, quantity) if quantity > 0 else None
+
+    def clear(self, cart_key):
+        key = self.cart_key % cart_key
+        pipe = self.client.pipeline()
+        pipe.delete(key)
+        pipe.hset(key, 'loaded', 1)
+        pipe.expire(key, self.ttl)
+        pipe.sadd(self.dirty_key, cart_key)
+        pipe.execute()
+
+    def discard(self, cart_key):
+        pipe = self.client.pipeline()
+        pipe.delete(self.cart_key % cart_key)
+        pipe.srem(self.dirty_key, cart_key)
+        pipe.execute()
+
+    def drain_dirty(self):
+        batch_key = f'{self.dirty_key}:flushing'
+        try:
+            self.client.rename(self.dirty_key, batch_key)
+        except self.response_error:
+            return set()  # nothing dirty
+        pipe = self.client.pipeline()
+        pipe.smembers(batch_key)
+        pipe.delete(batch_key)
+        members, _ = pipe.execute()
+        return set(members)
+
+    def mark_dirty(self, cart_keys):
+        if cart_keys:
+            self.client.sadd(self.dirty_key, *cart_keys)
+
+    def should_flush(self):
+        # One worker per interval wins the flush.
+        return bool(self.client.set(self.lock_key, 1, nx=True, ex=self.flush_interval))
+
+class CacheCartStore(BaseCartStore):
+    """
+    Carts kept whole in the Django cache, for guest carts.
+
+    Updates are read-modify-write and nothing is ever marked dirty, so this
+    is only suitable for carts that are never persisted: one guest client
+    per cart, merged into the user's cart on login.
+    """
+    cart_key = 'carts:%s'
+
+    def get(self, cart_key):
+        lines = cache.get(self.cart_key % cart_key)
+        return {line: CartLine(*value) for line, value in lines.items()} if lines is not None else None
+
+    def _save(self, cart_key, lines):
+        cache.set(self.cart_key % cart_key, {line: tuple(value) for line, value in lines.items()}, self.ttl)
+
+    def load(self, cart_key, lines):
+        cache.add(self.cart_key % cart_key, {line: tuple(value) for line, value in lines.items()}, self.ttl)
+
+    def add(self, cart_key, line, quantity, max_quantity=None):
+        lines = self.get(cart_key) or {}
+        current = lines.get(line) or CartLine(str(uuid.uuid4()), 0)
+        total = current.quantity + quantity
+        capped = max_quantity is not None and total > max_quantity
+        if total <= 0:
+            lines.pop(line, None)
+        else:
+            lines[line] = CartLine(current.item_id, max_quantity if capped else total)
+        self._save(cart_key, lines)
+        return lines.get(line), capped
+
+    def set(self, cart_key, line, quantity):
+        lines = self.get(cart_key) or {}
+        if quantity <= 0:
+            lines.pop(line, None)
+        else:
+            lines[line] = CartLine((lines.get(line) or CartLine(str(uuid.uuid4()), 0)).item_id, quantity)
+        self._save(cart_key, lines)
+        return lines.get(line)
+
+    def clear(self, cart_key):
+        self._save(cart_key, {})
+
+    def discard(self, cart_key):
+        cache.delete(self.cart_key % cart_key)
+
+    def drain_dirty(self):
+        return set()
+
+    def mark_dirty(self, cart_keys):
+        pass
+
+    def should_flush(self):
+        return False
+
+_stores = {}
+_store_lock = threading.Lock()
+
+def _get_store(backend_path):
+    store = _stores.get(backend_path)
+    if store is None:
+        with _store_lock:
+            store = _stores.get(backend_path)
+            if store is None:
+                store = _stores[backend_path] = import_string(backend_path)()
+    return store
+
+def get_cart_store():
+    """Return the configured hot cart store (process-wide singleton), or None when carts live in the database."""
+    backend_path = getattr(settings, 'CART_STORE_BACKEND', '')
+    return _get_store(backend_path) if backend_path else None
+
+def get_guest_cart_store():
+    """Return the store guest carts live in: the hot cart store if configured, else GUEST_CART_STORE_BACKEND."""
+    return get_cart_store() or _get_store(
+        getattr(settings, 'GUEST_CART_STORE_BACKEND', 'apps.orders.cart_store.CacheCartStore')
+    )
+
+# Hydration
+def hydrate_items(cart, lines):
+    """
+    Unsaved CartItems for the store's lines, with products and variations
+    loaded the way pricing.cart_items_queryset() loads them. Lines whose
+    product or variation no longer exists are skipped.
+    """
+    from apps.products.models import Product, ProductVariation, ProductVariationAttribute
+    from apps.products.serializers import ProductListSerializer
+    from .models import CartItem
+
+    keys = {line: parse_line_key(line) for line in lines}
+    product_ids = {product_id for product_id, _ in keys.values()}
+    variation_ids = {variation_id for _, variation_id in keys.values() if variation_id}
+    products = {
+        str(product.pk): product
+        for product in ProductListSerializer.setup_eager_loading(Product.objects.filter(pk__in=product_ids))
+    } if product_ids else {}
+    variations = {
+        str(variation.pk): variation
+        for variation in ProductVariation.objects.filter(pk__in=variation_ids).prefetch_related(
+            Prefetch('attributes', queryset=ProductVariationAttribute.objects.select_related('attribute', 'value'))
+        )
+    } if variation_ids else {}
+
+    items = []
+    for line, (product_id, variation_id) in keys.items():
+        product = products.get(product_id)
+        variation = variations.get(variation_id) if variation_id else None
+        if product is None or (variation_id and variation is None):
+            continue
+        item_id, quantity = lines[line]
+        items.append(CartItem(
+            id=uuid.UUID(str(item_id)), cart=cart, product=product, variation=variation, quantity=quantity,
+            unit_price=variation.price if variation else product.price
+        ))
+    return items
+
+def cart_lines_from_db(cart):
+    return {
+        line_key(product_id, variation_id): CartLine(str(item_id), quantity)
+        for item_id, product_id, variation_id, quantity in cart.items.values_list(
+            'id', 'product_id', 'variation_id', 'quantity'
+        )
+    }
+
+def load_store_lines(store, cart_key, cart):
+    """The cart's lines from the store, seeding it from CartItem rows on a miss."""
+    lines = store.get(cart_key)
+    if lines is None:
+        lines = cart_lines_from_db(cart) if cart is not None else {}
+        store.load(cart_key, lines)
+        lines = store.get(cart_key) or lines
+    return lines
+
+# Write-behind persistence
+def persist_cart(cart_key, store=None):
+    """
+    Make the CartItem rows of a stored user cart match the store.
+
+    Reads the current rows and prices once, then applies one bulk_create,
+    one bulk_update and one DELETE. Returns the number of rows written.
+    """
+    from apps.products.models import Product, ProductVariation
+    from .models import CartItem, ShoppingCart
+
+    store = store or get_cart_store()
+    lines = store.get(cart_key)
+    kind, _, owner = cart_key.partition(':')
+    if lines is None or kind != 'user':
+        return 0
+
+    keys = {line: parse_line_key(line) for line in lines}
+    prices = dict(Product.objects.filter(
+        pk__in={product_id for product_id, _ in keys.values()}
+    ).values_list('id', 'price'))
+    prices.update(ProductVariation.objects.filter(
+        pk__in={variation_id for _, variation_id in keys.values() if variation_id}
+    ).values_list('id', 'price'))
+    prices = {str(pk): price for pk, price in prices.items()}
+
+    with transaction.atomic():
+        cart, _ = ShoppingCart.objects.get_or_create(user_id=owner)
+        existing = {
+            line_key(item.product_id, item.variation_id): item
+            for item in CartItem.objects.filter(cart=cart).select_for_update()
+        }
+        now = timezone.now()
+        create, update = [], []
+        for line, (product_id, variation_id) in keys.items():
+            price = prices.get(variation_id or product_id)
+            if price is None or product_id not in prices:
+                continue
+            item_id, quantity = lines[line]
+            item = existing.pop(line, None)
+            if item is None:
+                create.append(CartItem(
+                    id=item_id, cart=cart, product_id=product_id, variation_id=variation_id,
+                    quantity=quantity, unit_price=price
+                ))
+            elif (item.quantity, item.unit_price) != (quantity, price):
+                item.quantity, item.unit_price, item.updated_at = quantity, price, now
+                update.append(item)
+        CartItem.objects.bulk_create(create)
+        CartItem.objects.bulk_update(update, ['quantity', 'unit_price', 'updated_at'])
+        if existing:
+            CartItem.objects.filter(pk__in=[item.pk for item in existing.values()]).delete()
+    return len(create) + len(update) + len(existing)
+
+def flush_carts(store=None):
+    """Persist every dirty cart. Returns the number of carts flushed."""
+    store = store or get_cart_store()
+    if store is None:
+        return 0
+    flushed = 0
+    for cart_key in store.drain_dirty():
+        try:
+            persist_cart(cart_key, store)
+            flushed += 1
+        except Exception:
+            logger.exception('Could not persist cart %s', cart_key)
+            store.mark_dirty([cart_key])
+    return flushed
+
+def _flush_in_thread():
+    try:
+        flush_carts()
+    finally:
+        connection.close()
+
+def maybe_flush_carts(store):
+    """
+    Flush dirty carts when the flush interval has elapsed.
+
+    Runs in a background thread unless CART_STORE_PERSIST_ASYNC is False.
+    """
+    try:
+        if not store.should_flush():
+            return
+        if getattr(settings, 'CART_STORE_PERSIST_ASYNC', True):
+            threading.Thread(target=_flush_in_thread, daemon=True).start()
+        else:
+            flush_carts(store)
+    except Exception:
+        # Persistence is retried on the next flush; never fail the request.
+        logger.exception('Failed to flush carts')
@@ -0,0 +1,36 @@
+# apps/orders/checks.py
+from django.conf import settings
+from django.core.checks import Error, register
+
+from core.checks import cache_is_process_local, runs_multiple_workers
+
+PROCESS_LOCAL_STORES = ('apps.orders.cart_store.LocalCartStore',)
+
+@register()
+def check_cart_stores(app_configs, **kwargs):
+    """Carts kept in a store must live somewhere every worker can reach."""
+    if not runs_multiple_workers():
+        return []
+    errors = []
+    cart_backend = getattr(settings, 'CART_STORE_BACKEND', '')
+    guest_backend = cart_backend or getattr(
+        settings, 'GUEST_CART_STORE_BACKEND', 'apps.orders.cart_store.CacheCartStore'
+    )
+    if cart_backend in PROCESS_LOCAL_STORES:
+        errors.append(Error(
+            f'CART_STORE_BACKEND {cart_backend} keeps carts in one process, but WEB_CONCURRENCY '
+            'runs several workers.',
+            hint='Use apps.orders.cart_store.RedisCartStore.',
+            id='orders.E001',
+        ))
+    if guest_backend == 'apps.orders.cart_store.CacheCartStore' and cache_is_process_local():
+        errors.append(Error(
+            'Guest carts are kept in the default cache, which is local to each process, but '
+            'WEB_CONCURRENCY runs several workers.',
+            hint=(
+                'Set CACHE_URL to a shared Redis cache, or configure CART_STORE_BACKEND or '
+                'GUEST_CART_STORE_BACKEND with RedisCartStore.'
+            ),
+            id='orders.E002',
+        ))
+    return errors
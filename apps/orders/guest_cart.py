@@ -0,0 +1,87 @@
+# apps/orders/guest_cart.py
+import uuid
+
+from django.core import signing
+from django.db import transaction
+
+from .cart_store import (
+    bump_cart_version, get_cart_store, get_guest_cart_store, guest_cart_key, line_key, load_store_lines,
+    parse_line_key, user_cart_key
+)
+from .inventory import available_quantities
+
+CART_TOKEN_HEADER = 'HTTP_X_CART_TOKEN'
+CART_TOKEN_SALT = 'orders.guest_cart'
+
+def make_cart_token(guest_id):
+    return signing.dumps(str(guest_id), salt=CART_TOKEN_SALT)
+
+def read_cart_token(token):
+    """The guest cart id a token was signed for, or None if it is missing, forged or expired."""
+    if not token:
+        return None
+    try:
+        return uuid.UUID(signing.loads(token, salt=CART_TOKEN_SALT, max_age=get_guest_cart_store().ttl))
+    except (signing.BadSignature, ValueError):
+        return None
+
+def request_guest_id(request):
+    """The guest cart id of an anonymous request's X-Cart-Token header."""
+    return read_cart_token(request.META.get(CART_TOKEN_HEADER))
+
+def merge_guest_cart(user, guest_id):
+    """
+    Move a guest cart into the user's cart.
+
+    Quantities of lines in both carts are added and capped at the stock
+    available; unavailable lines are dropped. Without a hot cart store the
+    result is written with a single bulk upsert. Returns the number of
+    lines merged.
+    """
+    from .models import CartItem, ShoppingCart
+
+    guest_store = get_guest_cart_store()
+    guest_key = guest_cart_key(guest_id)
+    lines = guest_store.get(guest_key) or {}
+    available = available_quantities(lines)
+
+    store = get_cart_store()
+    if store is not None:
+        cart, _ = ShoppingCart.objects.get_or_create(user=user)
+        cart_key = user_cart_key(user.pk)
+        load_store_lines(store, cart_key, cart)
+        for line, (stock, _) in available.items():
+            if stock is None or stock > 0:
+                store.add(cart_key, line, lines[line].quantity, max_quantity=stock)
+        guest_store.discard(guest_key)
+        bump_cart_version(cart_key)
+        return len(available)
+
+    with transaction.atomic():
+        cart, _ = ShoppingCart.objects.get_or_create(user=user)
+        existing = {
+            line_key(item.product_id, item.variation_id): item
+            for item in CartItem.objects.filter(cart=cart)
+        }
+        items = []
+        for line, (stock, price) in available.items():
+            current = existing.get(line)
+            quantity = lines[line].quantity + (current.quantity if current else 0)
+            if stock is not None:
+                quantity = min(quantity, stock)
+            if quantity <= 0:
+                continue
+            product_id, variation_id = parse_line_key(line)
+            items.append(CartItem(
+                # Lines the user already has keep their row and conflict on it
+                id=current.pk if current else lines[line].item_id,
+                cart=cart, product_id=product_id, variation_id=variation_id,
+                quantity=quantity, unit_price=price
+            ))
+        CartItem.objects.bulk_create(
+            items, update_conflicts=True, unique_fields=['id'],
+            update_fields=['quantity', 'unit_price', 'updated_at']
+        )
+    guest_store.discard(guest_key)
+    bump_cart_version(user_cart_key(user.pk))
+    return len(items)
@@ -0,0 +1,89 @@
+# apps/orders/inventory.py
+from collections import Counter
+
+from django.db.models import BooleanField, Case, CharField, F, IntegerField, Value, When
+
+from apps.products.detail_cache import bump_product_versions
+from apps.products.stock import refresh_stock
+from .cart_store import parse_line_key
+
+def _by_pk(counts):
+    return Case(
+        *[When(pk=pk, then=Value(quantity)) for pk, quantity in counts.items()],
+        default=Value(0), output_field=IntegerField()
+    )
+
+def apply_stock_movements(lines, sign=-1):
+    """
+    Move stock and sales counts for order lines with set-based UPDATEs.
+
+    `lines` are cart or order items (anything with product, variation and
+    quantity). sign=-1 sells them, sign=1 puts them back. Variation lines
+    move variation stock; other lines move product stock when it is
+    managed. Runs three UPDATEs however many lines there are, then
+    recomputes the products' stock state.
+    """
+    from apps.products.models import Product, ProductVariation
+
+    variation_stock, product_stock, sales = Counter(), Counter(), Counter()
+    for line in lines:
+        if line.variation_id:
+            variation_stock[line.variation_id] += line.quantity
+        elif line.product.manage_stock:
+            product_stock[line.product_id] += line.quantity
+        sales[line.product_id] += line.quantity
+    if not sales:
+        return
+
+    if variation_stock:
+        ProductVariation.objects.filter(pk__in=list(variation_stock)).update(
+            stock_quantity=F('stock_quantity') + sign * _by_pk(variation_stock)
+        )
+    if product_stock:
+        Product.objects.filter(pk__in=list(product_stock)).update(
+            stock_quantity=F('stock_quantity') + sign * _by_pk(product_stock)
+        )
+    Product.objects.filter(pk__in=list(sales)).update(
+        sales_count=F('sales_count') - sign * _by_pk(sales)
+    )
+    # The UPDATEs bypass the save signals
+    refresh_stock(sales)
+    bump_product_versions(list(sales))
+
+def available_quantities(lines):
+    """
+    {line key: (units available, unit price)} for the cart lines that can be
+    bought; units are None when stock is not managed.
+
+    Reads products and variations with a single UNION query. Lines for
+    unpublished products, inactive variations or a variation of another
+    product are left out.
+    """
+    from apps.products.models import Product, ProductVariation
+
+    keys = {line: parse_line_key(line) for line in lines}
+    columns = ['kind', 'row_id', 'owner_id', 'stock', 'managed', 'unit_price']
+    products = Product.objects.filter(
+        pk__in={product_id for product_id, _ in keys.values()}, status='published'
+    ).annotate(
+        kind=Value('product', output_field=CharField()), row_id=F('pk'), owner_id=F('pk'),
+        stock=F('stock_quantity'), managed=F('manage_stock'), unit_price=F('price')
+    ).values_list(*columns).order_by()
+    variations = ProductVariation.objects.filter(
+        pk__in={variation_id for _, variation_id in keys.values() if variation_id},
+        is_active=True, product__status='published'
+    ).annotate(
+        kind=Value('variation', output_field=CharField()), row_id=F('pk'), owner_id=F('product_id'),
+        stock=F('stock_quantity'), managed=Value(True, output_field=BooleanField()), unit_price=F('price')
+    ).values_list(*columns).order_by()
+    found = {
+        (kind, str(pk)): (str(product_id), stock if manage_stock else None, price)
+        for kind, pk, product_id, stock, manage_stock, price in products.union(variations, all=True)
+    }
+
+    available = {}
+    for line, (product_id, variation_id) in keys.items():
+        row = found.get(('variation', variation_id) if variation_id else ('product', product_id))
+        if row is not None and row[0] == product_id:
+            available[line] = row[1:]
+    return available
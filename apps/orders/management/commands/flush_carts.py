@@ -0,0 +1,19 @@
+# apps/orders/management/commands/flush_carts.py
+from django.core.management.base import BaseCommand
+from apps.orders.cart_store import flush_carts, get_cart_store
+
+class Command(BaseCommand):
+    help = 'Write carts changed in the hot cart store to cart items'
+
+    def handle(self, *args, **options):
+        if get_cart_store() is None:
+            self.stdout.write('No cart store configured; carts are already in the database.')
+            return
+        
+        self.stdout.write('Flushing dirty carts...')
+        
+        flushed = flush_carts()
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully flushed {flushed} carts!')
+        )
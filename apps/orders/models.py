@@ -2,6 +2,7 @@
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.contrib.auth import get_user_model
+from django.utils.functional import cached_property
 from decimal import Decimal
 import uuid
 
@@ -24,24 +25,29 @@ class ShoppingCart(models.Model):
     def __str__(self):
         return f"Cart for {self.user.email if self.user else self.session_key}"
     
+    @cached_property
+    def pricing(self):
+        """Totals computed once per instance; load with pricing.cart_queryset() to avoid N+1."""
+        from .pricing import CartPricing
+        return CartPricing(self)
+    
+    @property
+    def lines(self):
+        """Items of the cart: hydrated from the hot cart store when loaded from it, else the saved rows."""
+        lines = getattr(self, '_lines', None)
+        return lines if lines is not None else list(self.items.all())
+    
     @property
     def total_items(self):
-        return self.items.aggregate(total=models.Sum('quantity'))['total'] or 0
+        return self.pricing.total_items
     
     @property
     def subtotal(self):
-        total = Decimal('0.00')
-        for item in self.items.all():
-            total += item.total_price
-        return total
+        return self.pricing.subtotal
     
     @property
     def total_weight(self):
-        weight = Decimal('0.00')
-        for item in self.items.all():
-            if item.product.weight:
-                weight += item.product.weight * item.quantity
-        return weight
+        return self.pricing.total_weight
 
 class CartItem(models.Model):
     """Items in shopping cart."""
@@ -233,6 +239,11 @@ class OrderItem(models.Model):
         db_table = 'order_items'
         verbose_name = 'Order Item'
         verbose_name_plural = 'Order Items'
+        indexes = [
+            # Vendor dashboards count and list items by status
+            models.Index(fields=['vendor', 'status'], name='order_items_vendor_status_idx'),
+            models.Index(fields=['vendor', '-created_at'], name='order_items_vendor_recent_idx'),
+        ]
     
     def __str__(self):
         return f"{self.product_name} x {self.quantity} - {self.order.order_number}"
@@ -0,0 +1,126 @@
+# apps/orders/pricing.py
+import uuid
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Prefetch
+
+ZERO = Decimal('0.00')
+# 18% GST
+DEFAULT_TAX_RATE = Decimal('0.18')
+
+def cart_items_queryset():
+    """Cart items with everything pricing and CartItemSerializer read."""
+    from apps.products.models import ProductVariationAttribute
+    from apps.products.serializers import ProductListSerializer
+    from .models import CartItem
+
+    return ProductListSerializer.setup_eager_loading(
+        CartItem.objects.select_related('product', 'variation'), prefix='product__'
+    ).prefetch_related(
+        Prefetch(
+            'variation__attributes',
+            queryset=ProductVariationAttribute.objects.select_related('attribute', 'value')
+        )
+    ).order_by('created_at')
+
+def cart_queryset():
+    from .models import ShoppingCart
+
+    return ShoppingCart.objects.prefetch_related(Prefetch('items', queryset=cart_items_queryset()))
+
+class CartPricing:
+    """
+    Totals of a cart, computed in one pass over its items.
+
+    Reads `cart.lines`, so a cart loaded with cart_queryset() or hydrated
+    from the hot cart store is priced without further queries.
+    """
+
+    def __init__(self, cart, tax_rate=None):
+        self.cart = cart
+        self.items = cart.lines
+        self.tax_rate = tax_rate if tax_rate is not None else getattr(
+            settings, 'ORDER_TAX_RATE', DEFAULT_TAX_RATE
+        )
+        self.total_items = 0
+        self.subtotal = ZERO
+        self.total_weight = ZERO
+        for item in self.items:
+            self.total_items += item.quantity
+            self.subtotal += item.total_price
+            weight = (item.variation and item.variation.weight) or item.product.weight
+            if weight:
+                self.total_weight += weight * item.quantity
+        self.tax_amount = self.subtotal * self.tax_rate
+
+    @property
+    def is_empty(self):
+        return not self.items
+
+    def shipping_cost(self, shipping_method):
+        if shipping_method is None:
+            return ZERO
+        return shipping_method.calculate_cost(weight=self.total_weight, order_total=self.subtotal)
+
+    def total(self, shipping_cost=ZERO, discount_amount=ZERO):
+        return self.subtotal + self.tax_amount + shipping_cost - discount_amount
+
+def load_cart(request, create=False, refresh=False):
+    """
+    The requesting user's cart with its items prefetched, or None.
+
+    The cart is loaded once per request and shared by every caller; pass
+    `refresh` after changing the cart to reload it. With a hot cart store
+    configured, the items come from the store instead of CartItem rows.
+    Anonymous requests get the guest cart named by their X-Cart-Token
+    header, an unsaved ShoppingCart whose items live in the guest store.
+    """
+    from .cart_store import (
+        get_cart_store, get_guest_cart_store, guest_cart_key, hydrate_items, load_store_lines, user_cart_key
+    )
+    from .guest_cart import request_guest_id
+    from .models import ShoppingCart
+
+    if not refresh and hasattr(request, '_cart'):
+        if request._cart is not None or not create:
+            return request._cart
+
+    if not request.user.is_authenticated:
+        guest_id = getattr(request, '_guest_id', None) or request_guest_id(request)
+        if guest_id is None and create:
+            guest_id = uuid.uuid4()
+        cart = None
+        if guest_id is not None:
+            request._guest_id = guest_id
+            store = get_guest_cart_store()
+            cart = ShoppingCart(id=guest_id, session_key=str(guest_id))
+            cart._lines = hydrate_items(cart, load_store_lines(store, guest_cart_key(guest_id), None))
+            request._cart_store = (store, guest_cart_key(guest_id))
+        request._cart = cart
+        return cart
+
+    store = get_cart_store()
+    if store is not None:
+        if create:
+            cart, _ = ShoppingCart.objects.get_or_create(user=request.user)
+        else:
+            cart = ShoppingCart.objects.filter(user=request.user).first()
+        if cart is not None:
+            cart._lines = hydrate_items(cart, load_store_lines(store, user_cart_key(request.user.pk), cart))
+        request._cart_store = (store, user_cart_key(request.user.pk))
+        request._cart = cart
+        return cart
+
+    request._cart_store = (None, None)
+    cart = cart_queryset().filter(user=request.user).first()
+    if cart is None and create:
+        cart, _ = ShoppingCart.objects.get_or_create(user=request.user)
+        cart = cart_queryset().get(pk=cart.pk)
+    request._cart = cart
+    return cart
+
+def get_cart_pricing(request):
+    """CartPricing of the requesting user's cart, memoized per request; None without a cart."""
+    cart = load_cart(request)
+    return cart.pricing if cart is not None else None
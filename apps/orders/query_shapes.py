@@ -0,0 +1,15 @@
+# apps/orders/query_shapes.py
+from apps.vendors.models import Vendor
+from core.query_audit import register, sample_pk
+
+from .models import OrderItem
+
+@register('vendor_items_by_status', expect_index='order_items_vendor_status_idx')
+def vendor_items_by_status():
+    """Per-status counts on the vendor dashboards."""
+    return OrderItem.objects.filter(vendor_id=sample_pk(Vendor), status='pending').order_by()
+
+@register('vendor_items_recent', expect_index='order_items_vendor_recent_idx')
+def vendor_items_recent():
+    """VendorOrderItemListView, first page."""
+    return OrderItem.objects.filter(vendor_id=sample_pk(Vendor)).order_by('-created_at')[:20]
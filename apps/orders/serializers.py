@@ -42,7 +42,7 @@ class CartItemSerializer(serializers.ModelSerializer):
 
 class ShoppingCartSerializer(serializers.ModelSerializer):
     """Serializer for shopping cart."""
-    items = CartItemSerializer(many=True, read_only=True)
+    items = CartItemSerializer(source='lines', many=True, read_only=True)
     total_items = serializers.IntegerField(read_only=True)
     subtotal = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
     total_weight = serializers.DecimalField(max_digits=8, decimal_places=2, read_only=True)
@@ -55,6 +55,26 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
 
+class CartItemLeanSerializer(serializers.ModelSerializer):
+    """Cart item referencing its product and variation by id."""
+    total_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    
+    class Meta:
+        model = CartItem
+        fields = ['id', 'product', 'variation', 'quantity', 'unit_price', 'total_price']
+        read_only_fields = fields
+
+class CartTotalsSerializer(serializers.Serializer):
+    """Totals of a shopping cart."""
+    total_items = serializers.IntegerField(read_only=True)
+    subtotal = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    total_weight = serializers.DecimalField(max_digits=8, decimal_places=2, read_only=True)
+
+class ShoppingCartLeanSerializer(CartTotalsSerializer):
+    """Shopping cart with lean items; products are fetched separately by id."""
+    id = serializers.UUIDField(read_only=True)
+    items = CartItemLeanSerializer(source='lines', many=True, read_only=True)
+
 class AddToCartSerializer(serializers.Serializer):
     """Serializer for adding items to cart."""
     product = serializers.UUIDField()
@@ -110,6 +130,41 @@ class UpdateCartItemSerializer(serializers.Serializer):
         
         return value
 
+class CartOperationSerializer(serializers.Serializer):
+    """One operation of a batch cart update."""
+    OPERATIONS = ['add', 'set', 'remove']
+    
+    op = serializers.ChoiceField(choices=OPERATIONS)
+    item = serializers.UUIDField(required=False)
+    product = serializers.UUIDField(required=False)
+    variation = serializers.UUIDField(required=False, allow_null=True)
+    quantity = serializers.IntegerField(min_value=0, required=False)
+    
+    def validate(self, attrs):
+        if attrs['op'] == 'add':
+            if not attrs.get('product'):
+                raise serializers.ValidationError("Adding an item requires a product")
+            if attrs.setdefault('quantity', 1) < 1:
+                raise serializers.ValidationError("Quantity must be at least 1")
+        else:
+            if not attrs.get('item') and not attrs.get('product'):
+                raise serializers.ValidationError("Identify the line by item or product")
+            if attrs['op'] == 'set' and 'quantity' not in attrs:
+                raise serializers.ValidationError("Setting a quantity requires quantity")
+        return attrs
+
+class CartBatchSerializer(serializers.Serializer):
+    """Serializer for batch cart updates, applied in order."""
+    operations = CartOperationSerializer(many=True, allow_empty=False)
+    
+    def validate_operations(self, value):
+        from django.conf import settings
+        
+        limit = getattr(settings, 'CART_BATCH_MAX_OPERATIONS', 100)
+        if len(value) > limit:
+            raise serializers.ValidationError(f"At most {limit} operations per request")
+        return value
+
 class ShippingMethodSerializer(serializers.ModelSerializer):
     """Serializer for shipping methods."""
     estimated_cost = serializers.SerializerMethodField()
@@ -273,7 +328,7 @@ class OrderDetailSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'order_number', 'status', 'payment_status', 'customer_email',
             'customer_phone', 'customer_first_name', 'customer_last_name',
-            'customer_full_name', 'shipping_address_line_1', 'shipping_address_line_2',
+            'customer_full_name', 'shipping_address', 'shipping_address_line_1', 'shipping_address_line_2',
             'shipping_city', 'shipping_state', 'shipping_postal_code', 'shipping_country',
             'billing_address_line_1', 'billing_address_line_2', 'billing_city',
             'billing_state', 'billing_postal_code', 'billing_country', 'subtotal',
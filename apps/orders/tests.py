@@ -1,3 +1,417 @@
-from django.test import TestCase
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from apps.products.models import Product, ProductVariation
+from apps.vendors.models import Vendor
+from . import cart_store
+from .cart_batch import CartBatch
+from .checks import check_cart_stores
+from .guest_cart import read_cart_token
+from .models import CartItem, Order, ShippingMethod, ShoppingCart
+from .pricing import cart_queryset
+
+User = get_user_model()
+
+@override_settings(PRODUCT_STOCK_NOTIFICATIONS_ASYNC=False)
+class CartTestCase(TestCase):
+    """A shopper, a vendor with five published products and a shipping method."""
+
+    @classmethod
+    def setUpTestData(cls):
+        vendor_user = User.objects.create_user(
+            email='vendor@example.com', password='password',
+            first_name='Test', last_name='Vendor', user_type='vendor'
+        )
+        cls.vendor = Vendor.objects.create(
+            user=vendor_user, business_name='Test Shop', business_type='individual',
+            business_email='vendor@example.com', business_phone='+919876543210',
+            address_line_1='1 Test Street', city='Pune', state='MH', postal_code='411001'
+        )
+        cls.products = [
+            Product.objects.create(
+                vendor=cls.vendor, name=f'Product {i}', description='A product',
+                price=Decimal('100.00') + i, stock_quantity=10, weight=Decimal('0.50'),
+                status='published'
+            )
+            for i in range(5)
+        ]
+        cls.variation = ProductVariation.objects.create(
+            product=cls.products[0], sku='P0-RED', price=Decimal('120.00'),
+            stock_quantity=3, weight=Decimal('2.00')
+        )
+        cls.shipping = ShippingMethod.objects.create(
+            name='Standard', base_cost=Decimal('40.00'), cost_per_kg=Decimal('10.00')
+        )
+        cls.user = User.objects.create_user(
+            email='shopper@example.com', password='password', first_name='Shop', last_name='Per'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def fill_cart(self, count):
+        cart, _ = ShoppingCart.objects.get_or_create(user=self.user)
+        for product in self.products[:count]:
+            CartItem.objects.create(cart=cart, product=product, quantity=2)
+        return cart
+
+    def count_queries(self, method, url, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data, format='json')
+        return response, len(queries)
+
+class CartPricingTests(CartTestCase):
+    def test_cart_endpoints_run_a_constant_number_of_queries(self):
+        CartItem.objects.create(
+            cart=self.fill_cart(1), product=self.products[0], variation=self.variation, quantity=1
+        )
+        small = {
+            url: self.count_queries('get', url)[1]
+            for url in ['/api/orders/cart/', '/api/orders/checkout/summary/', '/api/orders/shipping-methods/']
+        }
+        for product in self.products[1:]:
+            CartItem.objects.create(cart=ShoppingCart.objects.get(user=self.user), product=product, quantity=2)
+        for url, baseline in small.items():
+            self.assertEqual(self.count_queries('get', url)[1], baseline, url)
+
+    def test_totals_are_computed_in_one_pass(self):
+        cart = self.fill_cart(2)
+        CartItem.objects.create(cart=cart, product=self.products[0], variation=self.variation, quantity=1)
+
+        data = self.client.get('/api/orders/cart/').data['data']
+        self.assertEqual(data['total_items'], 5)
+        self.assertEqual(Decimal(data['subtotal']), Decimal('522.00'))  # 2*100 + 2*101 + 120
+        self.assertEqual(Decimal(data['total_weight']), Decimal('4.00'))  # 4*0.5 + 2.0
+
+        summary = self.client.get(
+            '/api/orders/checkout/summary/', {'shipping_method': self.shipping.pk}
+        ).data['data']
+        self.assertEqual(Decimal(summary['tax_amount']), Decimal('93.96'))
+        self.assertEqual(Decimal(summary['shipping_cost']), Decimal('80.00'))
+        self.assertEqual(Decimal(summary['total_amount']), Decimal('695.96'))
+
+    def test_create_order_moves_stock_in_bulk(self):
+        cart = self.fill_cart(3)
+        CartItem.objects.create(cart=cart, product=self.products[0], variation=self.variation, quantity=3)
+
+        response = self.client.post('/api/orders/checkout/create/', {
+            'shipping_address_line_1': '1 Road', 'shipping_city': 'Pune', 'shipping_state': 'MH',
+            'shipping_postal_code': '411001', 'shipping_method': str(self.shipping.pk),
+            'payment_method': 'cod',
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+        order = Order.objects.get(user=self.user)
+        self.assertEqual(order.items.count(), 4)
+        self.assertEqual(order.subtotal, Decimal('966.00'))
+        self.assertFalse(CartItem.objects.filter(cart=cart).exists())
+
+        first = Product.objects.get(pk=self.products[0].pk)
+        self.variation.refresh_from_db()
+        self.assertEqual((self.variation.stock_quantity, first.sales_count), (0, 5))
+        # The only variation sold out, so the product did too
+        self.assertEqual(first.stock_status, 'out_of_stock')
+        self.assertEqual(Product.objects.get(pk=self.products[1].pk).stock_quantity, 8)
+
+        self.client.post(f'/api/orders/{order.pk}/cancel/')
+        first.refresh_from_db()
+        self.assertEqual((first.available_quantity, first.stock_status, first.sales_count), (3, 'in_stock', 0))
+
+@override_settings(
+    CART_STORE_BACKEND='apps.orders.cart_store.LocalCartStore',
+    CART_STORE_PERSIST_ASYNC=False, CART_STORE_FLUSH_INTERVAL=3600
+)
+class CartStoreTests(CartTestCase):
+    def setUp(self):
+        super().setUp()
+        cart_store._stores.clear()
+
+    def cart_writes(self, queries):
+        return [
+            query['sql'] for query in queries
+            if 'cart_items' in query['sql'] and not query['sql'].startswith('SELECT')
+        ]
+
+    def test_mutations_stay_in_the_store_until_flushed(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post('/api/orders/cart/add/', {'product': str(self.products[0].pk), 'quantity': 2})
+            self.client.post('/api/orders/cart/add/', {
+                'product': str(self.products[0].pk), 'variation': str(self.variation.pk)
+            })
+            data = self.client.post(
+                '/api/orders/cart/add/?view=full', {'product': str(self.products[1].pk)}
+            ).data['data']
+            lines = {(item['product']['id'], item['variation'] and str(item['variation'])): str(item['id']) for item in data['items']}
+            self.client.put(
+                f"/api/orders/cart/items/{lines[(str(self.products[0].pk), None)]}/update/", {'quantity': 4}
+            )
+            data = self.client.delete(
+                f"/api/orders/cart/items/{lines[(str(self.products[1].pk), None)]}/remove/"
+            ).data['data']['totals']
+
+        self.assertEqual(self.cart_writes(queries), [])
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual((data['total_items'], Decimal(data['subtotal'])), (5, Decimal('520.00')))
+
+        self.assertEqual(cart_store.flush_carts(), 1)
+        saved = {
+            (item.product_id, item.variation_id): (str(item.pk), item.quantity, item.unit_price)
+            for item in CartItem.objects.all()
+        }
+        self.assertEqual(saved, {
+            (self.products[0].pk, None): (lines[(str(self.products[0].pk), None)], 4, Decimal('100.00')),
+            (self.products[0].pk, self.variation.pk): (
+                lines[(str(self.products[0].pk), str(self.variation.pk))], 1, Decimal('120.00')
+            ),
+        })
+
+        self.client.post('/api/orders/cart/clear/')
+        cart_store.flush_carts()
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_store_is_seeded_from_saved_items_and_caps_at_stock(self):
+        self.fill_cart(2)
+        response = self.client.post('/api/orders/cart/add/', {
+            'product': str(self.products[0].pk), 'quantity': 9
+        })
+        self.assertEqual(response.status_code, 400)
+
+        data = self.client.get('/api/orders/cart/').data['data']
+        self.assertEqual(
+            sorted(item['quantity'] for item in data['items']), [2, 10]
+        )
+        self.assertEqual(CartItem.objects.get(product=self.products[0]).quantity, 2)
+
+    def test_checkout_reads_the_store_and_clears_it(self):
+        self.fill_cart(1)
+        self.client.post('/api/orders/cart/add/', {'product': str(self.products[1].pk), 'quantity': 3})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/orders/checkout/create/', {
+                'shipping_address_line_1': '1 Road', 'shipping_city': 'Pune', 'shipping_state': 'MH',
+                'shipping_postal_code': '411001', 'shipping_method': str(self.shipping.pk),
+                'payment_method': 'cod',
+            }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(Order.objects.get(user=self.user).subtotal, Decimal('503.00'))  # 2*100 + 3*101
+
+        cart_store.flush_carts()
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(self.client.get('/api/orders/cart/').data['data']['items'], [])
+
+    def test_batch_keeps_quantities_added_since_the_cart_was_loaded(self):
+        self.client.post('/api/orders/cart/add/', {'product': str(self.products[0].pk), 'quantity': 2})
+        self.client.post('/api/orders/cart/add/', {'product': str(self.products[1].pk)})
+        store, key = cart_store.get_cart_store(), cart_store.user_cart_key(self.user.pk)
+        cart = ShoppingCart.objects.get(user=self.user)
+        cart._lines = cart_store.hydrate_items(cart, store.get(key))
+        batch = CartBatch(cart, [
+            {'op': 'set', 'product': self.products[0].pk, 'quantity': 5},
+            {'op': 'set', 'product': self.products[1].pk, 'quantity': 0},
+        ])
+
+        # Another request adds to both lines before the batch is written
+        store.add(key, cart_store.line_key(self.products[0].pk), 1)
+        store.add(key, cart_store.line_key(self.products[1].pk), 1)
+        batch.apply(store, key)
+        self.assertEqual(
+            {line: item.quantity for line, item in store.get(key).items()},
+            {cart_store.line_key(self.products[0].pk): 6}
+        )
+
+class GuestCartTests(CartTestCase):
+    def setUp(self):
+        super().setUp()
+        cart_store._stores.clear()
+        self.guest = APIClient()
+
+    def test_guests_build_a_cart_without_touching_users(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.guest.post('/api/orders/cart/add/', {'product': str(self.products[0].pk), 'quantity': 2})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertFalse([query['sql'] for query in queries if '"users"' in query['sql']])
+        self.assertFalse(ShoppingCart.objects.exists())
+
+        token = response.data['cart_token']
+        self.guest.credentials(HTTP_X_CART_TOKEN=token)
+        self.guest.post('/api/orders/cart/add/', {'product': str(self.products[1].pk)})
+        data = self.guest.get('/api/orders/cart/').data['data']
+        self.assertEqual((data['total_items'], Decimal(data['subtotal'])), (3, Decimal('301.00')))
+
+        self.guest.credentials(HTTP_X_CART_TOKEN=token[:-1] + 'x')
+        self.assertEqual(self.guest.get('/api/orders/cart/').data['data']['items'], [])
+
+    def test_capped_add_still_returns_the_cart_token(self):
+        token = self.guest.post('/api/orders/cart/add/', {
+            'product': str(self.products[0].pk), 'variation': str(self.variation.pk), 'quantity': 3
+        }).data['cart_token']
+        self.guest.credentials(HTTP_X_CART_TOKEN=token)
+        response = self.guest.post('/api/orders/cart/add/', {
+            'product': str(self.products[0].pk), 'variation': str(self.variation.pk)
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(read_cart_token(response.data['cart_token']), read_cart_token(token))
+
+    def test_guest_carts_need_a_shared_backend_with_several_workers(self):
+        with override_settings(WEB_CONCURRENCY=4):
+            self.assertEqual([error.id for error in check_cart_stores(None)], ['orders.E002'])
+            with override_settings(CART_STORE_BACKEND='apps.orders.cart_store.LocalCartStore'):
+                self.assertEqual([error.id for error in check_cart_stores(None)], ['orders.E001'])
+            with override_settings(GUEST_CART_STORE_BACKEND='apps.orders.cart_store.RedisCartStore'):
+                self.assertEqual(check_cart_stores(None), [])
+        self.assertEqual(check_cart_stores(None), [])
+
+    def test_merge_adds_quantities_capped_at_stock_in_one_upsert(self):
+        cart = self.fill_cart(1)
+        CartItem.objects.filter(cart=cart).update(quantity=8)
+        token = self.guest.post(
+            '/api/orders/cart/add/', {'product': str(self.products[0].pk), 'quantity': 5}
+        ).data['cart_token']
+        self.guest.credentials(HTTP_X_CART_TOKEN=token)
+        self.guest.post('/api/orders/cart/add/', {'product': str(self.products[1].pk)})
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/orders/cart/merge/', HTTP_X_CART_TOKEN=token)
+        self.assertEqual(response.status_code, 200, response.data)
+        writes = [query['sql'] for query in queries if query['sql'].startswith(('INSERT', 'UPDATE'))]
+        self.assertEqual(len([sql for sql in writes if 'cart_items' in sql]), 1)
+
+        quantities = dict(CartItem.objects.filter(cart=cart).values_list('product_id', 'quantity'))
+        self.assertEqual(quantities, {self.products[0].pk: 10, self.products[1].pk: 1})
+        # The guest cart is gone once merged
+        self.assertEqual(self.guest.get('/api/orders/cart/').data['data']['items'], [])
+
+class CartBatchTests(CartTestCase):
+    def test_batch_applies_every_operation_with_bulk_writes(self):
+        cart = self.fill_cart(3)
+        items = {item.product_id: item for item in CartItem.objects.filter(cart=cart)}
+        operations = [
+            {'op': 'add', 'product': str(self.products[3].pk), 'quantity': 2},
+            {'op': 'add', 'product': str(self.products[0].pk), 'variation': str(self.variation.pk)},
+            {'op': 'set', 'item': str(items[self.products[0].pk].pk), 'quantity': 5},
+            {'op': 'remove', 'product': str(self.products[1].pk)},
+            {'op': 'add', 'product': str(self.products[2].pk), 'quantity': 1},
+            {'op': 'set', 'product': str(self.products[3].pk), 'quantity': 4},
+        ]
+        response, queries = self.count_queries('patch', '/api/orders/cart/', {'operations': operations})
+        self.assertEqual(response.status_code, 200, response.data)
+        data = response.data['data']
+        self.assertEqual(data['totals']['total_items'], 13)
+        self.assertEqual(data['removed'], [str(items[self.products[1].pk].pk)])
+        self.assertEqual(len(data['lines']), 4)
+
+        quantities = {
+            (item.product_id, item.variation_id): item.quantity for item in CartItem.objects.filter(cart=cart)
+        }
+        self.assertEqual(quantities, {
+            (self.products[0].pk, None): 5, (self.products[0].pk, self.variation.pk): 1,
+            (self.products[2].pk, None): 3, (self.products[3].pk, None): 4,
+        })
+
+        # The same batch shape over a bigger cart costs the same queries
+        self.fill_cart(0)
+        operations = [
+            {'op': 'add', 'product': str(product.pk)} for product in self.products
+        ] + [{'op': 'remove', 'product': str(self.products[4].pk)}]
+        self.assertEqual(self.count_queries('patch', '/api/orders/cart/', {'operations': operations})[1], queries)
+
+    def test_batch_keeps_quantities_added_since_the_cart_was_loaded(self):
+        cart = self.fill_cart(2)
+        batch = CartBatch(cart_queryset().get(pk=cart.pk), [
+            {'op': 'set', 'product': self.products[0].pk, 'quantity': 5},
+            {'op': 'add', 'product': self.products[2].pk, 'quantity': 2},
+        ])
+
+        # Another request changes the cart before the batch is written
+        CartItem.objects.filter(cart=cart, product=self.products[0]).update(quantity=4)
+        CartItem.objects.create(cart=cart, product=self.products[2], quantity=1)
+        batch.apply()
+        self.assertEqual(dict(CartItem.objects.filter(cart=cart).values_list('product_id', 'quantity')), {
+            self.products[0].pk: 7, self.products[1].pk: 2, self.products[2].pk: 3,
+        })
+
+    def test_batches_from_the_same_snapshot_share_a_new_line(self):
+        cart = self.fill_cart(1)
+        operations = [{'op': 'add', 'product': self.products[3].pk, 'quantity': 2}]
+        first, second = (CartBatch(cart_queryset().get(pk=cart.pk), operations) for _ in range(2))
+        first.apply()
+        second.apply()
+        self.assertEqual(
+            list(CartItem.objects.filter(cart=cart, product=self.products[3]).values_list('quantity', flat=True)), [4]
+        )
+
+    def test_batch_is_rejected_whole_when_an_operation_fails(self):
+        cart = self.fill_cart(1)
+        response = self.client.patch('/api/orders/cart/', {'operations': [
+            {'op': 'add', 'product': str(self.products[1].pk)},
+            {'op': 'add', 'product': str(self.products[0].pk), 'variation': str(self.variation.pk), 'quantity': 4},
+            {'op': 'remove', 'item': str(self.variation.pk)},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2])
+        self.assertEqual(CartItem.objects.filter(cart=cart).count(), 1)
+
+class CartDeltaTests(CartTestCase):
+    def test_mutations_return_the_changed_line_totals_and_version(self):
+        cart = self.fill_cart(2)
+        version = self.client.get('/api/orders/cart/').data['data']['version']
+
+        data = self.client.post('/api/orders/cart/add/', {'product': str(self.products[0].pk)}).data['data']
+        self.assertEqual(set(data), {'lines', 'removed', 'totals', 'version'})
+        self.assertGreater(data['version'], version)
+        [line] = data['lines']
+        self.assertEqual((line['product'], line['quantity'], line['total_price']), (self.products[0].pk, 3, '300.00'))
+        self.assertEqual(data['totals'], {'total_items': 5, 'subtotal': '502.00', 'total_weight': '2.50'})
+
+        item = CartItem.objects.get(cart=cart, product=self.products[1])
+        removed = self.client.delete(f'/api/orders/cart/items/{item.pk}/remove/').data['data']
+        self.assertEqual((removed['lines'], removed['removed']), ([], [str(item.pk)]))
+        self.assertGreater(removed['version'], data['version'])
+        self.assertEqual(self.client.get('/api/orders/cart/').data['data']['version'], removed['version'])
+
+    def test_lean_and_full_views_are_opt_in(self):
+        self.fill_cart(1)
+        lean = self.client.post(
+            '/api/orders/cart/add/?view=lean', {'product': str(self.products[1].pk)}
+        ).data['data']
+        self.assertEqual(
+            [item['product'] for item in lean['items']], [self.products[0].pk, self.products[1].pk]
+        )
+        full = self.client.post(
+            '/api/orders/cart/add/?view=full', {'product': str(self.products[1].pk)}
+        ).data['data']
+        self.assertEqual(full['items'][1]['product']['name'], 'Product 1')
+
+class VendorOrderItemTests(CartTestCase):
+    def test_order_items_page_with_a_cursor(self):
+        self.fill_cart(3)
+        response = self.client.post('/api/orders/checkout/create/', {
+            'shipping_address_line_1': '1 Road', 'shipping_city': 'Pune', 'shipping_state': 'MH',
+            'shipping_postal_code': '411001', 'shipping_method': str(self.shipping.pk),
+            'payment_method': 'cod',
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.client.force_authenticate(self.vendor.user)
+
+        seen = []
+        params = {'cursor': '', 'page_size': 2}
+        while True:
+            response = self.client.get('/api/orders/vendor/items/', params)
+            self.assertEqual(response.status_code, 200, response.data)
+            seen.extend(item['id'] for item in response.data['results'])
+            if not response.data['next_cursor']:
+                break
+            params['cursor'] = response.data['next_cursor']
+        self.assertEqual(len(seen), 3)
+        self.assertEqual(len(set(seen)), 3)
+
+        response = self.client.get('/api/orders/vendor/items/')
+        self.assertEqual(response.data['count'], 3)
@@ -11,6 +11,7 @@ urlpatterns = [
     path('cart/items/<uuid:item_id>/update/', views.update_cart_item, name='update_cart_item'),
     path('cart/items/<uuid:item_id>/remove/', views.remove_from_cart, name='remove_from_cart'),
     path('cart/clear/', views.clear_cart, name='clear_cart'),
+    path('cart/merge/', views.merge_cart, name='merge_cart'),
     
     # Shipping
     path('shipping-methods/', views.get_shipping_methods, name='shipping_methods'),
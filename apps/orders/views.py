@@ -13,29 +13,134 @@ from .models import (
     Coupon, CouponUsage, ShippingMethod, Return
 )
 from .serializers import (
-    ShoppingCartSerializer, AddToCartSerializer, UpdateCartItemSerializer,
+    ShoppingCartSerializer, ShoppingCartLeanSerializer, CartItemLeanSerializer, CartTotalsSerializer,
+    AddToCartSerializer, UpdateCartItemSerializer, CartBatchSerializer,
     OrderSerializer, OrderCreateSerializer, OrderDetailSerializer,
     ShippingMethodSerializer, CouponSerializer, ApplyCouponSerializer,
     ReturnSerializer, CreateReturnSerializer, VendorOrderItemSerializer,
     VendorOrderStatsSerializer, CheckoutSummarySerializer, UpdateOrderStatusSerializer
 )
+from .cart_batch import CartBatch
+from .cart_store import (
+    bump_cart_version, get_cart_version, guest_cart_key, line_key, maybe_flush_carts, user_cart_key
+)
+from .guest_cart import make_cart_token, merge_guest_cart, request_guest_id
+from .inventory import apply_stock_movements
+from .pricing import get_cart_pricing, load_cart
+from core.pagination import HybridPagination
 from core.permissions import IsVendorOnly, IsOwnerOrReadOnly
 from apps.products.models import Product, ProductVariation
+from apps.vendors.models import Vendor
 
 # Shopping Cart Views
-@api_view(['GET'])
-@permission_classes([permissions.IsAuthenticated])
+def _find_item(cart, **lookup):
+    """Cart item matching `lookup`, read from the prefetched items."""
+    for item in cart.lines:
+        if all(getattr(item, field) == value for field, value in lookup.items()):
+            return item
+    return None
+
+def _cart_store(request):
+    """(store, cart key) holding the cart load_cart() returned; (None, None) for CartItem rows."""
+    return getattr(request, '_cart_store', (None, None))
+
+def _store_set(request, cart_item, quantity):
+    """Set a line's quantity in the cart's store; False when the cart lives in the database."""
+    store, cart_key = _cart_store(request)
+    if store is None:
+        return False
+    store.set(cart_key, line_key(cart_item.product_id, cart_item.variation_id), quantity)
+    maybe_flush_carts(store)
+    return True
+
+def _cart_key(request):
+    if getattr(request, '_guest_id', None):
+        return guest_cart_key(request._guest_id)
+    return user_cart_key(request.user.pk)
+
+def _cart_response(request, message=None, changed=(), removed=(), view='delta', bump=True):
+    """
+    The cart after a change, shaped by `?view=`.
+    
+    'delta' returns the changed lines, the ids of removed items and the
+    totals; 'lean' the whole cart with items referencing products by id;
+    'full' the cart with every product serialized. Each carries the cart
+    version, which `bump` advances and reloads the cart.
+    """
+    view = request.query_params.get('view', view)
+    cart_key = _cart_key(request)
+    version = bump_cart_version(cart_key) if bump else get_cart_version(cart_key)
+    cart = load_cart(request, refresh=bump)
+    
+    if view == 'full':
+        payload = ShoppingCartSerializer(cart).data
+    elif view == 'lean':
+        payload = ShoppingCartLeanSerializer(cart).data
+    else:
+        lines = {line_key(item.product_id, item.variation_id): item for item in cart.lines}
+        payload = {
+            'lines': CartItemLeanSerializer([lines[line] for line in changed if line in lines], many=True).data,
+            'removed': [str(pk) for pk in removed],
+            'totals': CartTotalsSerializer(cart).data,
+        }
+    payload['version'] = version
+    
+    data = {'success': True}
+    if message:
+        data['message'] = message
+    data['data'] = payload
+    if getattr(request, '_guest_id', None):
+        # Guests send this back as X-Cart-Token
+        data['cart_token'] = make_cart_token(request._guest_id)
+    return Response(data)
+
+@api_view(['GET', 'PATCH'])
+@permission_classes([permissions.AllowAny])
 def get_cart(request):
-    """Get user's shopping cart."""
-    cart, created = ShoppingCart.objects.get_or_create(user=request.user)
-    serializer = ShoppingCartSerializer(cart)
-    return Response({
-        'success': True,
-        'data': serializer.data
-    })
+    """Get user's shopping cart, or a guest's; PATCH applies a batch of operations."""
+    cart = load_cart(request, create=True)
+    if request.method == 'GET':
+        return _cart_response(request, view='full', bump=False)
+    
+    serializer = CartBatchSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response({
+            'success': False,
+            'errors': serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    # All or nothing: nothing is written unless every operation is valid
+    batch = CartBatch(cart, serializer.validated_data['operations'])
+    if not batch.is_valid:
+        return Response({
+            'success': False,
+            'message': 'Cart was not updated',
+            'errors': batch.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    batch.apply(*_cart_store(request))
+    return _cart_response(
+        request, 'Cart updated',
+        changed=[line for line in batch.changed if line in batch.quantities],
+        removed=[batch.items[line].pk for line in batch.changed if line not in batch.quantities]
+    )
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
+def merge_cart(request):
+    """Merge the guest cart named by X-Cart-Token into the user's cart."""
+    guest_id = request_guest_id(request)
+    if guest_id is None:
+        return Response({
+            'success': False,
+            'message': 'Invalid or missing cart token'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    merged = merge_guest_cart(request.user, guest_id)
+    return _cart_response(request, f'{merged} items merged into your cart', view='lean', bump=False)
+
+@api_view(['POST'])
+@permission_classes([permissions.AllowAny])
 def add_to_cart(request):
     """Add item to shopping cart."""
     serializer = AddToCartSerializer(data=request.data)
@@ -46,45 +151,47 @@ def add_to_cart(request):
         quantity = serializer.validated_data['quantity']
         
         # Get or create cart
-        cart, created = ShoppingCart.objects.get_or_create(user=request.user)
+        cart = load_cart(request, create=True)
         
         # Check if item already exists in cart
-        cart_item, item_created = CartItem.objects.get_or_create(
-            cart=cart,
-            product=product,
-            variation=variation,
-            defaults={'quantity': quantity}
+        cart_item = _find_item(cart, product_id=product.pk, variation_id=variation.pk if variation else None)
+        max_stock = variation.stock_quantity if variation else (
+            product.stock_quantity if product.manage_stock else 999999
         )
         
-        if not item_created:
+        line = line_key(product.pk, variation.pk if variation else None)
+        store, cart_key = _cart_store(request)
+        capped = False
+        if store is not None:
+            # One atomic add in the store, capped at the stock available
+            _, capped = store.add(cart_key, line, quantity, max_quantity=max_stock)
+            maybe_flush_carts(store)
+        elif cart_item is None:
+            CartItem.objects.create(cart=cart, product=product, variation=variation, quantity=quantity)
+        else:
             # Update quantity if item already exists
             cart_item.quantity += quantity
             
             # Check stock again after update
-            max_stock = variation.stock_quantity if variation else (
-                product.stock_quantity if product.manage_stock else 999999
-            )
-            
-            if cart_item.quantity > max_stock:
+            capped = cart_item.quantity > max_stock
+            if capped:
                 cart_item.quantity = max_stock
-                cart_item.save()
-                return Response({
-                    'success': False,
-                    'message': f'Only {max_stock} items available. Cart updated to maximum available quantity.'
-                }, status=status.HTTP_400_BAD_REQUEST)
-            
             cart_item.save()
-            message = 'Cart item quantity updated'
-        else:
-            message = 'Item added to cart successfully'
         
-        # Return updated cart
-        cart_serializer = ShoppingCartSerializer(cart)
-        return Response({
-            'success': True,
-            'message': message,
-            'data': cart_serializer.data
-        })
+        if capped:
+            bump_cart_version(_cart_key(request))
+            data = {
+                'success': False,
+                'message': f'Only {max_stock} items available. Cart updated to maximum available quantity.'
+            }
+            if getattr(request, '_guest_id', None):
+                # The cart may have just been created for a new guest
+                data['cart_token'] = make_cart_token(request._guest_id)
+            return Response(data, status=status.HTTP_400_BAD_REQUEST)
+        message = 'Item added to cart successfully' if cart_item is None else 'Cart item quantity updated'
+        
+        # Return the changed line
+        return _cart_response(request, message, changed=[line])
     
     return Response({
         'success': False,
@@ -92,13 +199,12 @@ def add_to_cart(request):
     }, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(['PUT'])
-@permission_classes([permissions.IsAuthenticated])
+@permission_classes([permissions.AllowAny])
 def update_cart_item(request, item_id):
     """Update cart item quantity."""
-    try:
-        cart = ShoppingCart.objects.get(user=request.user)
-        cart_item = CartItem.objects.get(id=item_id, cart=cart)
-    except (ShoppingCart.DoesNotExist, CartItem.DoesNotExist):
+    cart = load_cart(request)
+    cart_item = _find_item(cart, pk=item_id) if cart else None
+    if cart_item is None:
         return Response({
             'success': False,
             'message': 'Cart item not found'
@@ -113,20 +219,16 @@ def update_cart_item(request, item_id):
         quantity = serializer.validated_data['quantity']
         
         if quantity == 0:
-            cart_item.delete()
-            message = 'Item removed from cart'
-        else:
+            if not _store_set(request, cart_item, 0):
+                cart_item.delete()
+            return _cart_response(request, 'Item removed from cart', removed=[item_id])
+        
+        if not _store_set(request, cart_item, quantity):
             cart_item.quantity = quantity
             cart_item.save()
-            message = 'Cart item updated'
-        
-        # Return updated cart
-        cart_serializer = ShoppingCartSerializer(cart)
-        return Response({
-            'success': True,
-            'message': message,
-            'data': cart_serializer.data
-        })
+        return _cart_response(
+            request, 'Cart item updated', changed=[line_key(cart_item.product_id, cart_item.variation_id)]
+        )
     
     return Response({
         'success': False,
@@ -134,46 +236,41 @@ def update_cart_item(request, item_id):
     }, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(['DELETE'])
-@permission_classes([permissions.IsAuthenticated])
+@permission_classes([permissions.AllowAny])
 def remove_from_cart(request, item_id):
     """Remove item from cart."""
-    try:
-        cart = ShoppingCart.objects.get(user=request.user)
-        cart_item = CartItem.objects.get(id=item_id, cart=cart)
-        cart_item.delete()
-        
-        # Return updated cart
-        cart_serializer = ShoppingCartSerializer(cart)
-        return Response({
-            'success': True,
-            'message': 'Item removed from cart',
-            'data': cart_serializer.data
-        })
-    except (ShoppingCart.DoesNotExist, CartItem.DoesNotExist):
+    cart = load_cart(request)
+    cart_item = _find_item(cart, pk=item_id) if cart else None
+    if cart_item is None:
         return Response({
             'success': False,
             'message': 'Cart item not found'
         }, status=status.HTTP_404_NOT_FOUND)
+    
+    if not _store_set(request, cart_item, 0):
+        cart_item.delete()
+    
+    return _cart_response(request, 'Item removed from cart', removed=[item_id])
 
 @api_view(['POST'])
-@permission_classes([permissions.IsAuthenticated])
+@permission_classes([permissions.AllowAny])
 def clear_cart(request):
     """Clear all items from cart."""
-    try:
-        cart = ShoppingCart.objects.get(user=request.user)
-        cart.items.all().delete()
-        
-        cart_serializer = ShoppingCartSerializer(cart)
-        return Response({
-            'success': True,
-            'message': 'Cart cleared successfully',
-            'data': cart_serializer.data
-        })
-    except ShoppingCart.DoesNotExist:
+    cart = load_cart(request)
+    if cart is None:
         return Response({
             'success': False,
             'message': 'Cart not found'
         }, status=status.HTTP_404_NOT_FOUND)
+    
+    removed = [item.pk for item in cart.lines]
+    store, cart_key = _cart_store(request)
+    if store is not None:
+        store.clear(cart_key)
+        maybe_flush_carts(store)
+    else:
+        CartItem.objects.filter(cart=cart).delete()
+    return _cart_response(request, 'Cart cleared successfully', removed=removed)
 
 # Shipping Methods
 @api_view(['GET'])
@@ -183,13 +280,9 @@ def get_shipping_methods(request):
     country = request.query_params.get('country', 'India')
     
     # Get cart details for cost calculation
-    try:
-        cart = ShoppingCart.objects.get(user=request.user)
-        cart_total = cart.subtotal
-        cart_weight = cart.total_weight
-    except ShoppingCart.DoesNotExist:
-        cart_total = Decimal('0.00')
-        cart_weight = Decimal('0.00')
+    pricing = get_cart_pricing(request)
+    cart_total = pricing.subtotal if pricing else Decimal('0.00')
+    cart_weight = pricing.total_weight if pricing else Decimal('0.00')
     
     # Filter shipping methods available for country
     shipping_methods = ShippingMethod.objects.filter(is_active=True)
@@ -223,9 +316,8 @@ def apply_coupon(request):
         coupon = serializer.coupon
         
         # Get cart
-        try:
-            cart = ShoppingCart.objects.get(user=request.user)
-        except ShoppingCart.DoesNotExist:
+        cart = load_cart(request)
+        if cart is None:
             return Response({
                 'success': False,
                 'message': 'Cart is empty'
@@ -286,23 +378,16 @@ def remove_coupon(request):
 @permission_classes([permissions.IsAuthenticated])
 def checkout_summary(request):
     """Get checkout summary with all calculations."""
-    try:
-        cart = ShoppingCart.objects.get(user=request.user)
-    except ShoppingCart.DoesNotExist:
-        return Response({
-            'success': False,
-            'message': 'Cart is empty'
-        }, status=status.HTTP_400_BAD_REQUEST)
-    
-    if not cart.items.exists():
+    pricing = get_cart_pricing(request)
+    if pricing is None or pricing.is_empty:
         return Response({
             'success': False,
             'message': 'Cart is empty'
         }, status=status.HTTP_400_BAD_REQUEST)
     
     # Calculate totals
-    subtotal = cart.subtotal
-    tax_amount = subtotal * Decimal('0.18')  # 18% GST
+    subtotal = pricing.subtotal
+    tax_amount = pricing.tax_amount
     shipping_cost = Decimal('0.00')
     discount_amount = Decimal('0.00')
     
@@ -322,15 +407,12 @@ def checkout_summary(request):
     if shipping_method_id:
         try:
             shipping_method = ShippingMethod.objects.get(id=shipping_method_id, is_active=True)
-            shipping_cost = shipping_method.calculate_cost(
-                weight=cart.total_weight,
-                order_total=subtotal
-            )
+            shipping_cost = pricing.shipping_cost(shipping_method)
         except ShippingMethod.DoesNotExist:
             pass
     
     # Calculate final total
-    total_amount = subtotal + tax_amount + shipping_cost - discount_amount
+    total_amount = pricing.total(shipping_cost, discount_amount)
     
     summary_data = {
         'subtotal': subtotal,
@@ -338,18 +420,61 @@ def checkout_summary(request):
         'tax_amount': tax_amount,
         'discount_amount': discount_amount,
         'total_amount': total_amount,
-        'total_items': cart.total_items,
-        'applied_coupon': CouponSerializer(applied_coupon).data if applied_coupon else None,
-        'shipping_method': ShippingMethodSerializer(shipping_method).data if shipping_method else None
+        'total_items': pricing.total_items,
+        'applied_coupon': applied_coupon,
+        'shipping_method': shipping_method
     }
     
-    serializer = CheckoutSummarySerializer(summary_data)
+    serializer = CheckoutSummarySerializer(summary_data, context={
+        'cart_total': subtotal,
+        'cart_weight': pricing.total_weight
+    })
     return Response({
         'success': True,
         'data': serializer.data
     })
 
 # Order Management
+def _order_item(request, order, cart_item):
+    """Unsaved OrderItem snapshotting a cart item; reads only prefetched data."""
+    product, variation = cart_item.product, cart_item.variation
+    
+    # Store variation details
+    variation_details = {}
+    if variation:
+        variation_details = {
+            'sku': variation.sku,
+            'attributes': [
+                {
+                    'attribute': attr.attribute.name,
+                    'value': attr.value.value,
+                    'color_code': attr.value.color_code
+                }
+                for attr in variation.attributes.all()
+            ]
+        }
+    
+    # Get primary image URL
+    primary_image = next((image for image in product.images.all() if image.is_primary), None)
+    product_image_url = ''
+    if primary_image:
+        product_image_url = request.build_absolute_uri(primary_image.image.url)
+    
+    return OrderItem(
+        order=order,
+        vendor_id=product.vendor_id,
+        product=product,
+        product_name=product.name,
+        product_sku=product.sku,
+        product_image=product_image_url,
+        variation=variation,
+        variation_details=variation_details,
+        quantity=cart_item.quantity,
+        unit_price=cart_item.unit_price,
+        # bulk_create skips OrderItem.save()
+        total_price=cart_item.unit_price * cart_item.quantity,
+    )
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def create_order(request):
@@ -358,15 +483,8 @@ def create_order(request):
     
     if serializer.is_valid():
         # Get cart
-        try:
-            cart = ShoppingCart.objects.get(user=request.user)
-        except ShoppingCart.DoesNotExist:
-            return Response({
-                'success': False,
-                'message': 'Cart is empty'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        if not cart.items.exists():
+        pricing = get_cart_pricing(request)
+        if pricing is None or pricing.is_empty:
             return Response({
                 'success': False,
                 'message': 'Cart is empty'
@@ -414,16 +532,13 @@ def create_order(request):
                 })
             
             # Calculate totals
-            subtotal = cart.subtotal
-            tax_amount = subtotal * Decimal('0.18')  # 18% GST
+            subtotal = pricing.subtotal
+            tax_amount = pricing.tax_amount
             discount_amount = Decimal('0.00')
             
             # Handle shipping
             shipping_method = serializer.validated_data['shipping_method_obj']
-            shipping_cost = shipping_method.calculate_cost(
-                weight=cart.total_weight,
-                order_total=subtotal
-            )
+            shipping_cost = pricing.shipping_cost(shipping_method)
             
             # Handle coupon
             coupon = serializer.validated_data.get('coupon_obj')
@@ -438,7 +553,7 @@ def create_order(request):
                     }, status=status.HTTP_400_BAD_REQUEST)
             
             # Calculate final total
-            total_amount = subtotal + tax_amount + shipping_cost - discount_amount
+            total_amount = pricing.total(shipping_cost, discount_amount)
             
             order_data.update({
                 'subtotal': subtotal,
@@ -451,53 +566,13 @@ def create_order(request):
             # Create order
             order = Order.objects.create(**order_data)
             
-            # Create order items
-            for cart_item in cart.items.all():
-                # Store variation details
-                variation_details = {}
-                if cart_item.variation:
-                    variation_details = {
-                        'sku': cart_item.variation.sku,
-                        'attributes': [
-                            {
-                                'attribute': attr.attribute.name,
-                                'value': attr.value.value,
-                                'color_code': attr.value.color_code
-                            }
-                            for attr in cart_item.variation.attributes.all()
-                        ]
-                    }
-                
-                # Get primary image URL
-                primary_image = cart_item.product.images.filter(is_primary=True).first()
-                product_image_url = ''
-                if primary_image:
-                    product_image_url = request.build_absolute_uri(primary_image.image.url)
-                
-                OrderItem.objects.create(
-                    order=order,
-                    vendor=cart_item.product.vendor,
-                    product=cart_item.product,
-                    product_name=cart_item.product.name,
-                    product_sku=cart_item.product.sku,
-                    product_image=product_image_url,
-                    variation=cart_item.variation,
-                    variation_details=variation_details,
-                    quantity=cart_item.quantity,
-                    unit_price=cart_item.unit_price,
-                )
-                
-                # Update product stock
-                if cart_item.variation:
-                    cart_item.variation.stock_quantity -= cart_item.quantity
-                    cart_item.variation.save()
-                elif cart_item.product.manage_stock:
-                    cart_item.product.stock_quantity -= cart_item.quantity
-                    cart_item.product.save()
-                
-                # Update product sales count
-                cart_item.product.sales_count += cart_item.quantity
-                cart_item.product.save()
+            # Create order items from the prefetched cart
+            OrderItem.objects.bulk_create([
+                _order_item(request, order, cart_item) for cart_item in pricing.items
+            ])
+            
+            # Update product stock and sales counts
+            apply_stock_movements(pricing.items, sign=-1)
             
             # Create coupon usage record
             if coupon:
@@ -519,7 +594,11 @@ def create_order(request):
             )
             
             # Clear cart
-            cart.items.all().delete()
+            CartItem.objects.filter(cart=pricing.cart).delete()
+            store, cart_key = _cart_store(request)
+            if store is not None:
+                transaction.on_commit(lambda: store.clear(cart_key))
+            transaction.on_commit(lambda: bump_cart_version(user_cart_key(request.user.pk)))
             
             # Clear session data
             if 'applied_coupon' in request.session:
@@ -542,6 +621,7 @@ class UserOrderListView(generics.ListAPIView):
     """List user's orders."""
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = HybridPagination
     
     def get_queryset(self):
         return Order.objects.filter(user=self.request.user).order_by('-created_at')
@@ -578,18 +658,8 @@ def cancel_order(request, order_id):
         order.status = 'cancelled'
         order.save()
         
-        # Restore stock
-        for item in order.items.all():
-            if item.variation:
-                item.variation.stock_quantity += item.quantity
-                item.variation.save()
-            elif item.product.manage_stock:
-                item.product.stock_quantity += item.quantity
-                item.product.save()
-            
-            # Update product sales count
-            item.product.sales_count -= item.quantity
-            item.product.save()
+        # Restore stock and sales counts
+        apply_stock_movements(order.items.select_related('product'), sign=1)
         
         # Create status history
         OrderStatusHistory.objects.create(
@@ -615,16 +685,17 @@ class VendorOrderItemListView(generics.ListAPIView):
     """List vendor's order items."""
     serializer_class = VendorOrderItemSerializer
     permission_classes = [permissions.IsAuthenticated, IsVendorOnly]
+    pagination_class = HybridPagination
     
     def get_queryset(self):
-        vendor = get_object_or_404('vendors.Vendor', user=self.request.user)
+        vendor = get_object_or_404(Vendor, user=self.request.user)
         return OrderItem.objects.filter(vendor=vendor).select_related('order').order_by('-created_at')
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated, IsVendorOnly])
 def update_order_item_status(request, item_id):
     """Update order item status by vendor."""
-    vendor = get_object_or_404('vendors.Vendor', user=request.user)
+    vendor = get_object_or_404(Vendor, user=request.user)
     
     try:
         order_item = OrderItem.objects.get(id=item_id, vendor=vendor)
@@ -683,7 +754,7 @@ def update_order_item_status(request, item_id):
 @permission_classes([permissions.IsAuthenticated, IsVendorOnly])
 def vendor_order_stats(request):
     """Get vendor order statistics."""
-    vendor = get_object_or_404('vendors.Vendor', user=request.user)
+    vendor = get_object_or_404(Vendor, user=request.user)
     
     # Get order items for this vendor
     order_items = OrderItem.objects.filter(vendor=vendor)
@@ -797,7 +868,7 @@ class ReturnDetailView(generics.RetrieveAPIView):
 @permission_classes([permissions.IsAuthenticated, IsVendorOnly])
 def vendor_returns(request):
     """Get returns for vendor's products."""
-    vendor = get_object_or_404('vendors.Vendor', user=request.user)
+    vendor = get_object_or_404(Vendor, user=request.user)
     
     returns = Return.objects.filter(
         order_item__vendor=vendor
@@ -813,7 +884,7 @@ def vendor_returns(request):
 @permission_classes([permissions.IsAuthenticated, IsVendorOnly])
 def process_return(request, return_id):
     """Process a return request (approve/reject)."""
-    vendor = get_object_or_404('vendors.Vendor', user=request.user)
+    vendor = get_object_or_404(Vendor, user=request.user)
     
     try:
         return_obj = Return.objects.get(id=return_id, order_item__vendor=vendor)
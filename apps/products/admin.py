@@ -1,6 +1,9 @@
 # apps/products/admin.py
 from django.contrib import admin
+from django.db import transaction
 from django.utils.html import format_html
+from .detail_cache import bump_product_versions
+from .ratings import reconcile_ratings
 from .models import (
     Category, Brand, Product, ProductAttribute, ProductAttributeValue,
     ProductVariation, ProductVariationAttribute, ProductImage, ProductReview,
@@ -200,12 +203,22 @@ class ProductReviewAdmin(admin.ModelAdmin):
     actions = ['approve_reviews', 'disapprove_reviews']
     
     def approve_reviews(self, request, queryset):
-        updated = queryset.update(is_approved=True)
+        product_ids = set(queryset.values_list('product_id', flat=True))
+        with transaction.atomic():
+            updated = queryset.update(is_approved=True)
+            # Queryset updates bypass ProductReview.save()
+            reconcile_ratings(product_ids)
+            bump_product_versions(product_ids)
         self.message_user(request, f'{updated} reviews approved.')
     approve_reviews.short_description = 'Approve selected reviews'
     
     def disapprove_reviews(self, request, queryset):
-        updated = queryset.update(is_approved=False)
+        product_ids = set(queryset.values_list('product_id', flat=True))
+        with transaction.atomic():
+            updated = queryset.update(is_approved=False)
+            # Queryset updates bypass ProductReview.save()
+            reconcile_ratings(product_ids)
+            bump_product_versions(product_ids)
         self.message_user(request, f'{updated} reviews disapproved.')
     disapprove_reviews.short_description = 'Disapprove selected reviews'
 
@@ -0,0 +1,247 @@
+# apps/products/autocomplete.py
+import bisect
+import heapq
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .category_tree import VERSION_KEY as CATEGORY_TREE_VERSION_KEY
+from .detail_cache import GENERATION_KEY
+from .search import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Bumped only when a product field the suggestions read changes (see
+# Product.SUGGESTION_FIELDS), not on every product write.
+VERSION_KEY = 'products:autocomplete:version'
+
+# Shared keys whose change means the suggestion index is stale.
+SOURCE_KEYS = [VERSION_KEY, CATEGORY_TREE_VERSION_KEY, GENERATION_KEY]
+
+# Seconds between staleness checks, and the minimum age before a rebuild.
+CHECK_INTERVAL = 5.0
+MIN_REBUILD_INTERVAL = 60.0
+
+MIN_SIMILARITY = 0.45
+MAX_CANDIDATE_WORDS = 20
+
+def trigrams(word):
+    """Character trigrams of a word padded like pg_trgm ('  w', ' wo', ..., 'rd ')."""
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class Suggestion:
+    __slots__ = ['kind', 'id', 'name', 'slug', 'popularity', 'words']
+
+    def __init__(self, kind, pk, name, slug, popularity):
+        self.kind = kind
+        self.id = pk
+        self.name = name
+        self.slug = slug
+        self.popularity = popularity
+        self.words = set(tokenize(name))
+
+    def as_dict(self):
+        return {'id': str(self.id), 'name': self.name, 'slug': self.slug}
+
+class AutocompleteIndex:
+    """
+    In-memory, typo-tolerant suggestion index over product, brand and category
+    names.
+
+    Query words are matched to indexed words by trigram similarity (so
+    "samsng" finds "samsung") or by prefix (so "iphon" finds "iphone"), and
+    suggestions are ranked by how well all query words match, then popularity.
+    """
+
+    def __init__(self, entries):
+        self.entries = list(entries)
+        self.word_entries = defaultdict(list)
+        for index, entry in enumerate(self.entries):
+            for word in entry.words:
+                self.word_entries[word].append(index)
+        self.gram_words = defaultdict(list)
+        self.word_grams = {}
+        for word in self.word_entries:
+            grams = trigrams(word)
+            self.word_grams[word] = len(grams)
+            for gram in grams:
+                self.gram_words[gram].append(word)
+        self.sorted_words = sorted(self.word_entries)
+
+    def _prefix_words(self, token):
+        index = bisect.bisect_left(self.sorted_words, token)
+        words = []
+        while index < len(self.sorted_words) and len(words) < MAX_CANDIDATE_WORDS:
+            word = self.sorted_words[index]
+            if not word.startswith(token):
+                break
+            words.append(word)
+            index += 1
+        return words
+
+    def match_word(self, token):
+        """Return {indexed_word: similarity} for one query token."""
+        matches = {word: 1.0 if word == token else 0.9 for word in self._prefix_words(token)}
+
+        grams = trigrams(token)
+        shared = defaultdict(int)
+        for gram in grams:
+            for word in self.gram_words.get(gram, ()):
+                shared[word] += 1
+        for word, common in shared.items():
+            # Dice coefficient over trigram sets
+            similarity = 2.0 * common / (len(grams) + self.word_grams[word])
+            if similarity >= MIN_SIMILARITY and similarity > matches.get(word, 0):
+                matches[word] = similarity
+        if len(matches) > MAX_CANDIDATE_WORDS:
+            matches = dict(heapq.nlargest(MAX_CANDIDATE_WORDS, matches.items(), key=lambda item: item[1]))
+        return matches
+
+    def suggest(self, query, limit=8):
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return {}
+
+        scores = defaultdict(float)
+        matched = defaultdict(int)
+        for token in tokens:
+            best = {}
+            for word, similarity in self.match_word(token).items():
+                for index in self.word_entries[word]:
+                    if similarity > best.get(index, 0):
+                        best[index] = similarity
+            for index, similarity in best.items():
+                scores[index] += similarity
+                matched[index] += 1
+
+        # Every query word has to match something in the suggestion.
+        candidates = defaultdict(list)
+        for index in scores:
+            if matched[index] == len(tokens):
+                candidates[self.entries[index].kind].append(index)
+
+        # Rank each kind on its own, so popular products cannot crowd
+        # brands and categories out of the results.
+        results = defaultdict(list)
+        for kind, indexes in candidates.items():
+            for index in heapq.nlargest(
+                limit, indexes, key=lambda index: (scores[index], self.entries[index].popularity)
+            ):
+                results[kind].append(self.entries[index].as_dict())
+        return results
+
+def _load_entries():
+    from .models import Brand, Category, Product
+
+    for pk, name, slug, sales in Product.objects.filter(status='published').values_list(
+        'id', 'name', 'slug', 'sales_count'
+    ).iterator(chunk_size=5000):
+        yield Suggestion('products', pk, name, slug, sales)
+    for pk, name, slug, count in Brand.objects.filter(is_active=True).values_list(
+        'id', 'name', 'slug', 'published_product_count'
+    ):
+        yield Suggestion('brands', pk, name, slug, count)
+    for pk, name, slug, count in Category.objects.filter(is_active=True).values_list(
+        'id', 'name', 'slug', 'published_product_count'
+    ):
+        yield Suggestion('categories', pk, name, slug, count)
+
+def bump_autocomplete_version():
+    """Mark the suggestion index stale, now and again on commit."""
+    def _bump():
+        cache.set(VERSION_KEY, repr(time.time()), None)
+
+    _bump()
+    transaction.on_commit(_bump)
+
+_lock = threading.Lock()
+_state = {'index': None, 'stamps': None, 'checked_at': 0.0, 'built_at': 0.0}
+
+def _source_stamps():
+    stamps = cache.get_many(SOURCE_KEYS)
+    return tuple(stamps.get(key) for key in SOURCE_KEYS)
+
+def _rebuild(stamps, now):
+    _state['index'] = index = AutocompleteIndex(_load_entries())
+    _state['stamps'] = stamps
+    _state['built_at'] = now
+    return index
+
+def _rebuild_in_background(stamps, now):
+    """Rebuild in a thread that releases the lock held by its caller."""
+    try:
+        _rebuild(stamps, now)
+    except Exception:
+        # The stale index keeps serving; the next check retries.
+        logger.exception('Failed to rebuild the autocomplete index')
+    finally:
+        _lock.release()
+        connection.close()
+
+def get_autocomplete_index():
+    """
+    Return the process-local suggestion index.
+
+    Only the first index is built in the request that needs it. A stale
+    index keeps serving while a background thread rebuilds it (inline when
+    PRODUCT_AUTOCOMPLETE_REBUILD_ASYNC is off), so requests never wait on a
+    rebuild once the first index exists.
+    """
+    now = time.monotonic()
+    index = _state['index']
+    if index is not None and now - _state['checked_at'] < CHECK_INTERVAL:
+        return index
+
+    if not _lock.acquire(blocking=index is None):
+        return index
+    in_background = False
+    try:
+        index = _state['index']
+        _state['checked_at'] = now
+        stamps = _source_stamps()
+        if index is not None and (
+            stamps == _state['stamps'] or now - _state['built_at'] < MIN_REBUILD_INTERVAL
+        ):
+            return index
+        if index is None or not getattr(settings, 'PRODUCT_AUTOCOMPLETE_REBUILD_ASYNC', True):
+            return _rebuild(stamps, now)
+        threading.Thread(target=_rebuild_in_background, args=(stamps, now), daemon=True).start()
+        in_background = True
+        return index
+    finally:
+        # A background rebuild releases the lock when it is done
+        if not in_background:
+            _lock.release()
+
+def discard_autocomplete_index():
+    with _lock:
+        _state['index'] = None
+
+def record_search_miss(term):
+    """Count a query with no suggestions in today's SearchAnalytics row."""
+    from apps.analytics.models import SearchAnalytics
+
+    term = term.strip().lower()[:255]
+    today = timezone.localdate()
+    updated = SearchAnalytics.objects.filter(date=today, search_term=term).update(
+        search_count=F('search_count') + 1, no_results=True
+    )
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            SearchAnalytics.objects.create(
+                date=today, search_term=term, search_count=1, no_results=True
+            )
+    except IntegrityError:
+        SearchAnalytics.objects.filter(date=today, search_term=term).update(
+            search_count=F('search_count') + 1, no_results=True
+        )
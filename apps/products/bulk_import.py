@@ -0,0 +1,296 @@
+# apps/products/bulk_import.py
+import codecs
+import csv
+import io
+import json
+import logging
+import threading
+from itertools import islice
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Prefetch, Q
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .autocomplete import bump_autocomplete_version
+from .counters import rebuild_catalog_counters
+from .detail_cache import bump_product_versions
+from .models import Brand, Category, Product, ProductImportJob, ProductTagAssignment
+from .search import schedule_reindex
+from .serializers import ProductImportRowSerializer
+from .stock import refresh_stock
+from .tagging import set_product_tags
+
+logger = logging.getLogger(__name__)
+
+# Columns shared by import and export, in export order.
+COLUMNS = [
+    'sku', 'name', 'category', 'brand', 'product_type', 'short_description',
+    'description', 'specifications', 'price', 'compare_price', 'cost_price',
+    'stock_quantity', 'low_stock_threshold', 'manage_stock', 'weight', 'length',
+    'width', 'height', 'requires_shipping', 'shipping_class', 'is_featured',
+    'is_digital', 'meta_title', 'meta_description', 'meta_keywords', 'tags',
+]
+MODEL_FIELDS = [column for column in COLUMNS if column not in ('sku', 'category', 'brand', 'tags')]
+
+MAX_STORED_ERRORS = 500
+
+class RowError(Exception):
+    pass
+
+def iter_rows(fileobj, file_format):
+    """Stream (line_number, dict) pairs from a binary CSV or JSON-lines file."""
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    if file_format == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, RowError(f'Invalid JSON: {e}')
+            continue
+        if not isinstance(row, dict):
+            yield line_number, RowError('Each line must be a JSON object.')
+            continue
+        yield line_number, row
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _lookup(model, keys):
+    """Resolve slugs or names to objects with one query."""
+    keys = set(keys)
+    if not keys:
+        return {}
+    found = {}
+    for obj in model.objects.filter(Q(slug__in=keys) | Q(name__in=keys)):
+        found[obj.slug] = obj
+        found.setdefault(obj.name, obj)
+    return found
+
+class ProductImporter:
+    """
+    Validates and writes a stream of rows chunk by chunk.
+
+    Per chunk: rows are validated without touching the database, then
+    categories, brands, tags and existing products are resolved with one
+    query each, and the chunk is written with bulk_create / bulk_update in a
+    single transaction.
+    """
+
+    def __init__(self, vendor, chunk_size=None, on_progress=None):
+        self.vendor = vendor
+        self.chunk_size = chunk_size or getattr(settings, 'PRODUCT_IMPORT_CHUNK_SIZE', 500)
+        self.on_progress = on_progress
+        self.processed = 0
+        self.created = 0
+        self.updated = 0
+        self.errors = []
+        self.error_count = 0
+        self.seen_skus = set()
+
+    def add_error(self, line, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_STORED_ERRORS:
+            self.errors.append({'line': line, 'errors': errors})
+
+    def run(self, rows):
+        for chunk in _chunks(rows, self.chunk_size):
+            created, updated, errors = self.import_chunk(chunk)
+            self.processed += len(chunk)
+            self.created += created
+            self.updated += updated
+            if self.on_progress:
+                self.on_progress(self, len(chunk), created, updated, errors)
+        return self
+
+    def _validate(self, chunk):
+        valid = []
+        errors = []
+        for line, row in chunk:
+            if isinstance(row, RowError):
+                errors.append((line, {'non_field_errors': [str(row)]}))
+                continue
+            serializer = ProductImportRowSerializer(data=row)
+            if not serializer.is_valid():
+                errors.append((line, serializer.errors))
+                continue
+            data = serializer.validated_data
+            if data['sku'] in self.seen_skus:
+                errors.append((line, {'sku': ['SKU appears more than once in the file.']}))
+                continue
+            self.seen_skus.add(data['sku'])
+            valid.append((line, data))
+        return valid, errors
+
+    def import_chunk(self, chunk):
+        valid, errors = self._validate(chunk)
+
+        categories = _lookup(Category, [data['category'] for _, data in valid if 'category' in data])
+        brands = _lookup(Brand, [data['brand'] for _, data in valid if 'brand' in data])
+        existing = {
+            product.sku: product
+            for product in Product.objects.filter(sku__in=[data['sku'] for _, data in valid])
+        }
+
+        to_create, to_update, tag_rows = [], [], []
+        for line, data in valid:
+            try:
+                product = self._build(data, existing.get(data['sku']), categories, brands)
+            except RowError as e:
+                errors.append((line, {'non_field_errors': [str(e)]}))
+                continue
+            (to_create if product._state.adding else to_update).append(product)
+            if 'tags' in data:
+                tag_rows.append((product, data['tags']))
+
+        affected = [
+            (product._import_old_state, (product.category_id, product.brand_id))
+            for product in to_update
+        ]
+        with transaction.atomic():
+            Product.objects.bulk_create(to_create, batch_size=self.chunk_size)
+            if to_update:
+                Product.objects.bulk_update(
+                    to_update, MODEL_FIELDS + ['category', 'brand', 'updated_at'],
+                    batch_size=self.chunk_size
+                )
+            self._write_tags(tag_rows)
+            self._sync_side_effects(to_update, affected)
+            refresh_stock([product.pk for product in to_create + to_update])
+
+        for line, error in errors:
+            self.add_error(line, error)
+        return len(to_create), len(to_update), len(errors)
+
+    def _build(self, data, product, categories, brands):
+        if product is not None and product.vendor_id != self.vendor.pk:
+            raise RowError(f"SKU {data['sku']} belongs to another vendor.")
+        if product is None:
+            missing = [field for field in ProductImportRowSerializer.REQUIRED_FOR_CREATE if field not in data]
+            if missing:
+                raise RowError(f"New products require: {', '.join(missing)}.")
+            product = Product(
+                vendor=self.vendor, sku=data['sku'],
+                slug=slugify(f"{data['name']}-{data['sku']}")[:255]
+            )
+        else:
+            product._import_old_state = (product.category_id, product.brand_id)
+
+        for field in MODEL_FIELDS:
+            if field in data:
+                setattr(product, field, data[field])
+        for field, lookup in (('category', categories), ('brand', brands)):
+            if field in data:
+                obj = lookup.get(data[field])
+                if obj is None:
+                    raise RowError(f"Unknown {field} '{data[field]}'.")
+                setattr(product, field, obj)
+        product.updated_at = timezone.now()
+        return product
+
+    def _write_tags(self, tag_rows):
+        set_product_tags({product.pk: names for product, names in tag_rows})
+
+    def _sync_side_effects(self, updated, affected):
+        """Bulk writes bypass Product.save() and signals; replay their effects."""
+        if not updated:
+            return
+        published = [product for product in updated if product.status == 'published']
+        if published:
+            category_ids, brand_ids = set(), set()
+            for old, new in affected:
+                category_ids.update([old[0], new[0]])
+                brand_ids.update([old[1], new[1]])
+            rebuild_catalog_counters(category_ids=category_ids, brand_ids=brand_ids)
+            schedule_reindex([product.pk for product in published])
+        bump_autocomplete_version()
+        bump_product_versions([product.pk for product in updated])
+
+def run_import_job(job_id):
+    """Process an import job, recording progress on the job row after every chunk."""
+    job = ProductImportJob.objects.select_related('vendor').get(pk=job_id)
+    ProductImportJob.objects.filter(pk=job.pk).update(status='running', started_at=timezone.now())
+
+    def on_progress(importer, rows, created, updated, errors):
+        ProductImportJob.objects.filter(pk=job.pk).update(
+            processed_rows=F('processed_rows') + rows,
+            created_count=F('created_count') + created,
+            updated_count=F('updated_count') + updated,
+            error_count=F('error_count') + errors,
+            errors=importer.errors,
+        )
+
+    importer = ProductImporter(job.vendor, on_progress=on_progress)
+    try:
+        with job.file.open('rb') as fileobj:
+            importer.run(iter_rows(fileobj, job.file_format))
+    except Exception as e:
+        logger.exception('Product import %s failed', job.pk)
+        importer.add_error(None, {'non_field_errors': [f'Import aborted: {e}']})
+        ProductImportJob.objects.filter(pk=job.pk).update(
+            status='failed', errors=importer.errors, finished_at=timezone.now()
+        )
+        return
+    ProductImportJob.objects.filter(pk=job.pk).update(status='completed', finished_at=timezone.now())
+
+def _run_in_thread(job_id):
+    try:
+        run_import_job(job_id)
+    finally:
+        connection.close()
+
+def start_import_job(job):
+    """Run the import in a background thread once the job row is committed."""
+    def _start():
+        if getattr(settings, 'PRODUCT_IMPORT_RUN_ASYNC', True):
+            close_old_connections()
+            threading.Thread(target=_run_in_thread, args=(job.pk,), daemon=True).start()
+        else:
+            run_import_job(job.pk)
+
+    transaction.on_commit(_start)
+
+# Export
+def _export_rows(vendor):
+    queryset = Product.objects.filter(vendor=vendor).select_related('category', 'brand').prefetch_related(
+        Prefetch('tag_assignments', queryset=ProductTagAssignment.objects.select_related('tag'))
+    ).order_by('created_at', 'id')
+    for product in queryset.iterator(chunk_size=1000):
+        row = {field: getattr(product, field) for field in MODEL_FIELDS}
+        row['sku'] = product.sku
+        row['category'] = product.category.slug if product.category else None
+        row['brand'] = product.brand.slug if product.brand else None
+        row['tags'] = [assignment.tag.name for assignment in product.tag_assignments.all()]
+        yield row
+
+class _Echo:
+    def write(self, value):
+        return value
+
+def export_csv(vendor):
+    """Yield the vendor's catalog as CSV text, one row at a time."""
+    writer = csv.writer(_Echo())
+    yield codecs.BOM_UTF8.decode('utf-8') + writer.writerow(COLUMNS)
+    for row in _export_rows(vendor):
+        row['tags'] = ','.join(row['tags'])
+        row['specifications'] = json.dumps(row['specifications'])
+        yield writer.writerow(['' if row[column] is None else row[column] for column in COLUMNS])
+
+def export_jsonl(vendor):
+    """Yield the vendor's catalog as JSON lines, one product per line."""
+    from django.core.serializers.json import DjangoJSONEncoder
+
+    for row in _export_rows(vendor):
+        yield json.dumps({column: row[column] for column in COLUMNS}, cls=DjangoJSONEncoder) + '\n'
@@ -0,0 +1,129 @@
+# apps/products/category_tree.py
+import threading
+import time
+
+from django.core.cache import cache
+
+VERSION_KEY = 'products:category_tree:version'
+
+# How often (seconds) a process re-checks the shared version key. Writes made
+# in the current process invalidate the local snapshot immediately.
+CHECK_INTERVAL = 1.0
+
+class CategoryNode:
+    """Lightweight, read-only view of a category row."""
+    __slots__ = ['id', 'name', 'slug', 'icon', 'parent_id', 'is_active', 'sort_order']
+
+    def __init__(self, **values):
+        for attr in self.__slots__:
+            setattr(self, attr, values[attr])
+
+class CategoryTree:
+    """
+    Immutable snapshot of the whole category hierarchy.
+
+    Built from a single query; ancestors, full paths and descendant sets are
+    precomputed so every lookup is a dict access.
+    """
+
+    def __init__(self, rows):
+        self.nodes = {}
+        self.by_slug = {}
+        self.children = {}
+        for row in rows:
+            node = CategoryNode(**row)
+            self.nodes[node.id] = node
+            self.by_slug[node.slug] = node
+            self.children.setdefault(node.parent_id, []).append(node.id)
+
+        for child_ids in self.children.values():
+            child_ids.sort(key=lambda pk: (self.nodes[pk].sort_order, self.nodes[pk].name))
+
+        self.ancestors = {}
+        self.full_paths = {}
+        self.descendants = {}
+        # Walk top-down from the roots; orphaned parents are treated as roots.
+        roots = [pk for pk, node in self.nodes.items() if node.parent_id not in self.nodes]
+        stack = [(pk, ()) for pk in roots]
+        while stack:
+            pk, ancestors = stack.pop()
+            if pk in self.ancestors:
+                continue  # guards against cycles
+            self.ancestors[pk] = ancestors
+            self.full_paths[pk] = ' > '.join(
+                [self.nodes[a].name for a in ancestors] + [self.nodes[pk].name]
+            )
+            for child_id in self.children.get(pk, []):
+                stack.append((child_id, ancestors + (pk,)))
+
+        for pk in sorted(self.ancestors, key=lambda pk: len(self.ancestors[pk]), reverse=True):
+            descendants = set()
+            for child_id in self.children.get(pk, []):
+                descendants.add(child_id)
+                descendants |= self.descendants.get(child_id, frozenset())
+            self.descendants[pk] = frozenset(descendants)
+
+    def get(self, pk):
+        return self.nodes.get(pk)
+
+    def full_path(self, pk):
+        return self.full_paths.get(pk)
+
+    def ancestor_ids(self, pk):
+        return self.ancestors.get(pk, ())
+
+    def descendant_ids(self, pk):
+        return self.descendants.get(pk, frozenset())
+
+    def subtree_ids(self, pk):
+        """The category itself plus all of its descendants."""
+        return self.descendant_ids(pk) | {pk}
+
+    def child_nodes(self, pk, active_only=True):
+        nodes = [self.nodes[child_id] for child_id in self.children.get(pk, [])]
+        if active_only:
+            nodes = [node for node in nodes if node.is_active]
+        return nodes
+
+    def root_nodes(self, active_only=True):
+        return self.child_nodes(None, active_only=active_only)
+
+_lock = threading.Lock()
+_state = {'tree': None, 'version': None, 'checked_at': 0.0}
+
+def _load():
+    from .models import Category
+
+    rows = Category.objects.values(*CategoryNode.__slots__)
+    return CategoryTree(rows)
+
+def get_category_tree():
+    """Return the current process-local category tree snapshot."""
+    now = time.monotonic()
+    with _lock:
+        tree = _state['tree']
+        if tree is not None and now - _state['checked_at'] < CHECK_INTERVAL:
+            return tree
+
+        version = cache.get(VERSION_KEY, 0)
+        _state['checked_at'] = now
+        if tree is not None and version == _state['version']:
+            return tree
+
+        _state['tree'] = tree = _load()
+        _state['version'] = version
+        return tree
+
+def discard_local_tree():
+    """Drop this process's snapshot so the next lookup reloads it."""
+    with _lock:
+        _state['tree'] = None
+
+def invalidate_category_tree():
+    """Drop the local snapshot and bump the shared version for other processes."""
+    discard_local_tree()
+    cache.add(VERSION_KEY, 0, None)
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        pass
@@ -0,0 +1,79 @@
+# apps/products/counters.py
+from django.db.models import Count, F
+
+def _counted(state):
+    """Return (category_id, brand_id) a product contributes to, or None."""
+    if state is None or state[0] != 'published':
+        return None
+    return state[1], state[2]
+
+def update_catalog_counters(old_state, new_state):
+    """
+    Apply the published-product counter delta for one product change.
+
+    States are (status, category_id, brand_id) tuples; None means the product
+    did not exist. Must run inside the transaction that writes the product.
+    """
+    from .models import Category, Brand
+
+    old = _counted(old_state)
+    new = _counted(new_state)
+    if old == new:
+        return
+
+    for position, model in ((0, Category), (1, Brand)):
+        old_id = old[position] if old else None
+        new_id = new[position] if new else None
+        if old_id == new_id:
+            continue
+        if old_id is not None:
+            model.objects.filter(pk=old_id, published_product_count__gt=0).update(
+                published_product_count=F('published_product_count') - 1
+            )
+        if new_id is not None:
+            model.objects.filter(pk=new_id).update(
+                published_product_count=F('published_product_count') + 1
+            )
+
+def rebuild_catalog_counters(category_ids=None, brand_ids=None, dry_run=False):
+    """
+    Recompute published-product counters from the products table.
+
+    Limits the work to the given category/brand IDs when provided. Returns a
+    dict mapping 'categories' and 'brands' to lists of (object, stored, actual)
+    for every counter that was out of date.
+    """
+    from .models import Category, Brand, Product
+
+    published = Product.objects.filter(status='published')
+    mismatches = {}
+
+    for key, model, field, ids in (
+        ('categories', Category, 'category', category_ids),
+        ('brands', Brand, 'brand', brand_ids),
+    ):
+        counts_qs = published.filter(**{f'{field}__isnull': False})
+        objects = model.objects.only('id', 'name', 'published_product_count')
+        if ids is not None:
+            ids = [pk for pk in ids if pk is not None]
+            counts_qs = counts_qs.filter(**{f'{field}__in': ids})
+            objects = objects.filter(id__in=ids)
+
+        actual = dict(
+            counts_qs.order_by().values_list(field).annotate(total=Count('id'))
+        )
+
+        stale = []
+        for obj in objects.iterator(chunk_size=2000):
+            count = actual.get(obj.id, 0)
+            if obj.published_product_count != count:
+                stale.append((obj, obj.published_product_count, count))
+                obj.published_product_count = count
+
+        if stale and not dry_run:
+            model.objects.bulk_update(
+                [obj for obj, _, _ in stale], ['published_product_count'], batch_size=1000
+            )
+        mismatches[key] = stale
+
+    return mismatches
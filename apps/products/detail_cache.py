@@ -0,0 +1,126 @@
+# apps/products/detail_cache.py
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+VERSION_KEY = 'products:detail:version:%s'
+GENERATION_KEY = 'products:detail:generation'
+RESPONSE_KEY = 'products:detail:response:%s:%s'
+
+def _stamp():
+    return repr(time.time())
+
+def _bump_now(product_ids):
+    stamp = _stamp()
+    cache.set_many({VERSION_KEY % pk: stamp for pk in product_ids}, None)
+
+def bump_product_versions(product_ids):
+    """
+    Invalidate cached detail responses for the given products.
+
+    Bumps immediately and again on commit, so a response rendered from
+    uncommitted data cannot outlive the transaction.
+    """
+    product_ids = [str(pk) for pk in product_ids if pk is not None]
+    if not product_ids:
+        return
+    _bump_now(product_ids)
+    transaction.on_commit(lambda: _bump_now(product_ids))
+
+def bump_product_version(product_id):
+    bump_product_versions([product_id])
+
+def bump_catalog_generation():
+    """Invalidate every cached detail response (shared category/brand/vendor data)."""
+    def _bump():
+        cache.set(GENERATION_KEY, _stamp(), None)
+
+    _bump()
+    transaction.on_commit(_bump)
+
+def _current_stamps(product_id):
+    stamps = cache.get_many([VERSION_KEY % product_id, GENERATION_KEY])
+    return stamps.get(VERSION_KEY % product_id), stamps.get(GENERATION_KEY, '0')
+
+def product_stamps(product_id, started):
+    """
+    (version, generation) of a product for caching data derived from it.
+
+    Products never bumped get a version as of just before `started`, the
+    time.time() at which reading the product began.
+    """
+    product_id = str(product_id)
+    version, generation = _current_stamps(product_id)
+    if version is None:
+        version = repr(started - 0.001)
+        if not cache.add(VERSION_KEY % product_id, version, None):
+            version = cache.get(VERSION_KEY % product_id) or version
+    return version, generation
+
+class CachedDetail:
+    """A rendered product detail payload with its validators."""
+    __slots__ = ['product_id', 'data', 'etag', 'last_modified']
+
+    def __init__(self, product_id, data, etag, last_modified):
+        self.product_id = product_id
+        self.data = data
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def not_modified(self, request):
+        """Evaluate If-None-Match / If-Modified-Since against this payload."""
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            return '*' in tags or self.etag in tags or f'W/{self.etag}' in tags
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        return if_modified_since is not None and int(self.last_modified) <= if_modified_since
+
+    def apply_headers(self, response):
+        response['ETag'] = self.etag
+        response['Last-Modified'] = http_date(self.last_modified)
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+def _response_key(slug, request):
+    # Image URLs are absolute, so responses depend on the requested host.
+    host = hashlib.blake2b(request.get_host().encode('utf-8'), digest_size=6).hexdigest()
+    return RESPONSE_KEY % (slug, host)
+
+def get_cached_detail(slug, request):
+    """Return the cached detail for a slug if it matches the current version."""
+    cached = cache.get(_response_key(slug, request))
+    if cached is None:
+        return None
+    version, generation = _current_stamps(cached['product_id'])
+    if (version, generation) != cached['stamps']:
+        return None
+    return CachedDetail(cached['product_id'], cached['data'], cached['etag'], cached['last_modified'])
+
+def cache_detail(slug, request, product_id, data, started):
+    """
+    Store a freshly rendered detail payload and return it with validators.
+
+    `started` is the time.time() at which rendering began; if the product was
+    bumped after that the payload may predate the change, so it is returned
+    but not stored.
+    """
+    product_id = str(product_id)
+    version, generation = product_stamps(product_id, started)
+    digest = hashlib.sha1(f'{product_id}:{version}:{generation}'.encode('utf-8')).hexdigest()
+    detail = CachedDetail(
+        product_id, data, quote_etag(digest), max(float(version), float(generation))
+    )
+    if detail.last_modified < started:
+        cache.set(_response_key(slug, request), {
+            'product_id': product_id,
+            'stamps': (version, generation),
+            'data': data,
+            'etag': detail.etag,
+            'last_modified': detail.last_modified,
+        }, getattr(settings, 'PRODUCT_DETAIL_CACHE_TIMEOUT', 60 * 60))
+    return detail
@@ -0,0 +1,89 @@
+# apps/products/facets.py
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Count, Q
+
+from .category_tree import get_category_tree
+
+DEFAULT_PRICE_BUCKETS = [0, 500, 1000, 5000, 10000, 50000]
+RATING_THRESHOLDS = [4, 3, 2, 1]
+
+def _price_ranges():
+    bounds = [Decimal(str(bound)) for bound in getattr(
+        settings, 'PRODUCT_FACET_PRICE_BUCKETS', DEFAULT_PRICE_BUCKETS
+    )]
+    return list(zip(bounds, bounds[1:] + [None]))
+
+def compute_facets(queryset):
+    """
+    Compute brand, category, price, rating and availability counts for a
+    filtered product queryset.
+
+    Runs two queries regardless of the number of facet values: one conditional
+    aggregate for the numeric facets and one GROUP BY (brand, category) that is
+    folded into both term facets.
+    """
+    from .models import Product
+
+    # Re-select by primary key so joins in the source queryset (tags, search
+    # ranking) cannot inflate the counts.
+    products = Product.objects.filter(pk__in=queryset.order_by().values('pk'))
+
+    price_ranges = _price_ranges()
+    aggregates = {'total': Count('pk')}
+    for index, (low, high) in enumerate(price_ranges):
+        condition = Q(price__gte=low)
+        if high is not None:
+            condition &= Q(price__lt=high)
+        aggregates[f'price_{index}'] = Count('pk', filter=condition)
+    for threshold in RATING_THRESHOLDS:
+        aggregates[f'rating_{threshold}'] = Count('pk', filter=Q(average_rating__gte=threshold))
+    aggregates['in_stock'] = Count('pk', filter=~Q(stock_status='out_of_stock'))
+    totals = products.aggregate(**aggregates)
+
+    brands = {}
+    categories = {}
+    groups = products.order_by().values('brand_id', 'brand__name', 'category_id').annotate(
+        count=Count('pk')
+    )
+    for group in groups:
+        if group['brand_id'] is not None:
+            brand = brands.setdefault(
+                group['brand_id'],
+                {'id': str(group['brand_id']), 'name': group['brand__name'], 'count': 0}
+            )
+            brand['count'] += group['count']
+        if group['category_id'] is not None:
+            category = categories.setdefault(group['category_id'], {'count': 0})
+            category['count'] += group['count']
+
+    tree = get_category_tree()
+    category_facets = []
+    for category_id, values in categories.items():
+        node = tree.get(category_id)
+        category_facets.append({
+            'id': str(category_id),
+            'name': node.name if node else '',
+            'slug': node.slug if node else '',
+            'count': values['count'],
+        })
+
+    by_count = lambda facet: (-facet['count'], facet['name'])
+    return {
+        'total': totals['total'],
+        'brands': sorted(brands.values(), key=by_count),
+        'categories': sorted(category_facets, key=by_count),
+        'price_ranges': [
+            {'min': low, 'max': high, 'count': totals[f'price_{index}']}
+            for index, (low, high) in enumerate(price_ranges)
+        ],
+        'ratings': [
+            {'min_rating': threshold, 'count': totals[f'rating_{threshold}']}
+            for threshold in RATING_THRESHOLDS
+        ],
+        'availability': {
+            'in_stock': totals['in_stock'],
+            'out_of_stock': totals['total'] - totals['in_stock'],
+        },
+    }
@@ -1,7 +1,10 @@
 # apps/products/filters.py
 import django_filters
 from django.db import models
+from rest_framework import filters
 from .models import Product, Category, Brand
+from .search import search_queryset
+from .category_tree import get_category_tree
 
 class ProductFilter(django_filters.FilterSet):
     """Advanced filters for product listing."""
@@ -13,9 +16,12 @@ class ProductFilter(django_filters.FilterSet):
     # Rating filter
     min_rating = django_filters.NumberFilter(field_name='average_rating', lookup_expr='gte')
     
-    # Category filters
-    category = django_filters.ModelChoiceFilter(queryset=Category.objects.filter(is_active=True))
-    category_slug = django_filters.CharFilter(field_name='category__slug')
+    # Category filters (include subcategories)
+    category = django_filters.ModelChoiceFilter(
+        queryset=Category.objects.filter(is_active=True),
+        method='filter_category'
+    )
+    category_slug = django_filters.CharFilter(method='filter_category_slug')
     
     # Brand filters
     brand = django_filters.ModelChoiceFilter(queryset=Brand.objects.filter(is_active=True))
@@ -62,18 +68,28 @@ class ProductFilter(django_filters.FilterSet):
     def filter_in_stock(self, queryset, name, value):
         """Filter products based on stock availability."""
         if value:
-            return queryset.filter(stock_quantity__gt=0)
-        return queryset.filter(stock_quantity=0)
+            return queryset.exclude(stock_status='out_of_stock')
+        return queryset.filter(stock_status='out_of_stock')
+    
+    def filter_category(self, queryset, name, value):
+        """Filter by a category and all of its subcategories."""
+        if value:
+            return queryset.filter(category_id__in=get_category_tree().subtree_ids(value.pk))
+        return queryset
+    
+    def filter_category_slug(self, queryset, name, value):
+        """Filter by category slug, including subcategories."""
+        if value:
+            node = get_category_tree().by_slug.get(value)
+            if node is None:
+                return queryset.none()
+            return queryset.filter(category_id__in=get_category_tree().subtree_ids(node.id))
+        return queryset
     
     def filter_search(self, queryset, name, value):
-        """Search in product name, description, and SKU."""
+        """Search in product name, description, and SKU via the search index."""
         if value:
-            return queryset.filter(
-                models.Q(name__icontains=value) |
-                models.Q(description__icontains=value) |
-                models.Q(short_description__icontains=value) |
-                models.Q(sku__icontains=value)
-            )
+            return search_queryset(queryset, value)
         return queryset
     
     def filter_tags(self, queryset, name, value):
@@ -83,4 +99,15 @@ class ProductFilter(django_filters.FilterSet):
             return queryset.filter(
                 tag_assignments__tag__name__in=tag_names
             ).distinct()
-        return queryset
\ No newline at end of file
+        return queryset
+
+class SearchRankOrderingFilter(filters.OrderingFilter):
+    """Order search results by relevance unless an explicit ordering is requested."""
+    
+    def filter_queryset(self, request, queryset, view):
+        if (
+            'search_rank' in queryset.query.annotations and
+            not request.query_params.get(self.ordering_param)
+        ):
+            return queryset.order_by('search_rank')
+        return super().filter_queryset(request, queryset, view)
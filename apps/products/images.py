@@ -0,0 +1,282 @@
+# apps/products/images.py
+import io
+import logging
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models import Count, Max, Q
+
+logger = logging.getLogger(__name__)
+
+def sync_product_images(product, images_data):
+    """
+    Make a product's gallery match ``images_data``, in order.
+
+    Items carrying the ``id`` of an existing image keep that row; items with a
+    new ``image`` file are inserted; existing images left out of the list are
+    deleted. The first item becomes the primary image. Only rows whose order,
+    primary flag or alt text actually change are written. Returns True when
+    anything changed.
+    """
+    from .models import ProductImage
+
+    existing = {image.pk: image for image in product.images.all()}
+    keep, create, update = set(), [], []
+    for position, data in enumerate(images_data):
+        values = {'sort_order': position, 'is_primary': position == 0}
+        if 'alt_text' in data:
+            values['alt_text'] = data['alt_text']
+
+        image = existing.get(data.get('id'))
+        if image is None:
+            create.append((data['image'], values))
+            continue
+        keep.add(image.pk)
+        if any(getattr(image, field) != value for field, value in values.items()):
+            for field, value in values.items():
+                setattr(image, field, value)
+            update.append(image)
+
+    removed = [pk for pk in existing if pk not in keep]
+    if removed:
+        ProductImage.objects.filter(pk__in=removed).delete()
+    if update:
+        ProductImage.objects.bulk_update(update, ['sort_order', 'is_primary', 'alt_text'])
+    if create:
+        names = store_uploads([file for file, _ in create])
+        created = ProductImage.objects.bulk_create([
+            ProductImage(product=product, image=name, **values)
+            for name, (_, values) in zip(names, create)
+        ])
+        schedule_renditions([image.pk for image in created])
+    return bool(removed or update or create)
+
+def inspect_image(file):
+    """
+    Check that an upload decodes as an image without decoding the pixels.
+
+    Returns (is_valid, message) like core.utils.validate_image_file.
+    """
+    from PIL import Image
+
+    try:
+        with Image.open(file) as image:
+            image.verify()
+    except Exception:
+        return False, 'File is not a readable image'
+    finally:
+        file.seek(0)
+    return True, 'Image is valid'
+
+def _upload_names(files):
+    """Storage names for a batch of uploads, unique within the batch."""
+    from .models import ProductImage
+
+    field = ProductImage._meta.get_field('image')
+    names, seen = [], set()
+    for file in files:
+        name = field.generate_filename(None, file.name)
+        root, ext = posixpath.splitext(name)
+        candidate, counter = name, 1
+        while candidate in seen:
+            candidate = f'{root}_{counter}{ext}'
+            counter += 1
+        seen.add(candidate)
+        names.append(candidate)
+    return names
+
+def store_uploads(files):
+    """
+    Write uploaded files to storage concurrently and return their stored names.
+
+    Writes run in a pool of at most PRODUCT_IMAGE_UPLOAD_CONCURRENCY threads, so
+    a batch on remote storage takes about as long as its slowest file. If any
+    write fails, files already written are removed and the error is raised.
+    """
+    from .models import ProductImage
+
+    storage = ProductImage._meta.get_field('image').storage
+    names = _upload_names(files)
+    workers = min(len(files), getattr(settings, 'PRODUCT_IMAGE_UPLOAD_CONCURRENCY', 5)) or 1
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='product-uploads') as executor:
+        futures = [executor.submit(storage.save, name, file) for name, file in zip(names, files)]
+    stored, error = [], None
+    for future in futures:
+        try:
+            stored.append(future.result())
+        except Exception as e:
+            error = error or e
+    if error is not None:
+        for name in stored:
+            storage.delete(name)
+        raise error
+    return stored
+
+def add_product_images(product, files):
+    """
+    Append uploaded files to a product's gallery.
+
+    Files are stored in parallel, then all rows are inserted with one
+    bulk_create after the gallery's current state is read once. The first
+    new image becomes primary only if the product has none yet.
+    """
+    from .detail_cache import bump_product_version
+    from .models import ProductImage
+
+    names = store_uploads(files)
+    try:
+        with transaction.atomic():
+            state = product.images.aggregate(
+                last_order=Max('sort_order'), primaries=Count('id', filter=Q(is_primary=True))
+            )
+            start = 0 if state['last_order'] is None else state['last_order'] + 1
+            images = ProductImage.objects.bulk_create([
+                ProductImage(
+                    product=product, image=name, sort_order=start + i,
+                    is_primary=(i == 0 and not state['primaries'])
+                )
+                for i, name in enumerate(names)
+            ])
+            # bulk_create bypasses the post_save signals
+            bump_product_version(product.pk)
+            schedule_renditions([image.pk for image in images])
+    except Exception:
+        storage = ProductImage._meta.get_field('image').storage
+        for name in names:
+            storage.delete(name)
+        raise
+    return images
+
+# Renditions
+RENDITION_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+def rendition_name(image_name, size):
+    """Storage path prefix of a rendition: products/renditions/<stem>_<size>."""
+    directory, filename = posixpath.split(image_name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(directory, 'renditions', f'{stem}_{size}')
+
+def render_renditions(image_field, storage=None):
+    """
+    Write a WebP and a JPEG copy of the image for every THUMBNAIL_SIZES entry.
+
+    Images are shrunk to fit the box, never enlarged. Returns
+    {size: {format: storage path}}.
+    """
+    from PIL import Image, ImageOps
+
+    storage = storage or image_field.storage
+    with image_field.open('rb') as source:
+        original = Image.open(source)
+        original = ImageOps.exif_transpose(original)
+        original.load()
+
+    has_alpha = original.mode in ('RGBA', 'LA') or 'transparency' in original.info
+    renditions = {}
+    for size, box in settings.THUMBNAIL_SIZES.items():
+        resized = original.copy()
+        resized.thumbnail(box, Image.LANCZOS)
+        prefix = rendition_name(image_field.name, size)
+        paths = {}
+        for fmt, (pillow_format, options) in RENDITION_FORMATS.items():
+            if fmt == 'jpeg' or not has_alpha:
+                frame = resized.convert('RGB')
+            else:
+                frame = resized.convert('RGBA')
+            buffer = io.BytesIO()
+            frame.save(buffer, pillow_format, **options)
+            name = f'{prefix}.{fmt}'
+            if storage.exists(name):
+                storage.delete(name)
+            paths[fmt] = storage.save(name, ContentFile(buffer.getvalue()))
+        renditions[size] = paths
+    return renditions
+
+def generate_renditions(image_id):
+    """Render and record the renditions of one ProductImage."""
+    from .detail_cache import bump_product_version
+    from .models import ProductImage
+
+    image = ProductImage.objects.filter(pk=image_id).only('id', 'product_id', 'image').first()
+    if image is None or not image.image:
+        return None
+    try:
+        renditions = render_renditions(image.image)
+    except Exception:
+        logger.exception('Could not render renditions for product image %s', image_id)
+        ProductImage.objects.filter(pk=image_id, image=image.image.name).update(rendition_status='failed')
+        return None
+
+    # Skip the write if the file was replaced while rendering
+    updated = ProductImage.objects.filter(pk=image_id, image=image.image.name).update(
+        renditions=renditions, rendition_status='ready'
+    )
+    if updated:
+        bump_product_version(image.product_id)
+    return renditions
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'PRODUCT_IMAGE_WORKERS', 2),
+                thread_name_prefix='product-images'
+            )
+        return _executor
+
+def _render_in_worker(image_id):
+    try:
+        generate_renditions(image_id)
+    finally:
+        connection.close()
+
+def schedule_renditions(image_ids):
+    """
+    Render the images once the current transaction commits.
+
+    Work is handed to a bounded thread pool; Pillow releases the GIL while
+    decoding, resizing and encoding. PRODUCT_IMAGE_RENDITIONS_ASYNC=False
+    renders inline.
+    """
+    image_ids = list(image_ids)
+    if not image_ids:
+        return
+
+    def _submit():
+        if getattr(settings, 'PRODUCT_IMAGE_RENDITIONS_ASYNC', True):
+            executor = _get_executor()
+            for image_id in image_ids:
+                executor.submit(_render_in_worker, image_id)
+        else:
+            for image_id in image_ids:
+                generate_renditions(image_id)
+
+    transaction.on_commit(_submit)
+
+def rendition_url(image, size, fmt='webp'):
+    """Storage URL of a rendition, or of the original while renditions are pending."""
+    path = (image.renditions or {}).get(size, {}).get(fmt)
+    if path:
+        return image.image.storage.url(path)
+    return image.image.url if image.image else None
+
+def rendition_references():
+    """Stored rendition paths, for the media garbage collector."""
+    from .models import ProductImage
+
+    for renditions in ProductImage.objects.exclude(renditions={}).values_list(
+        'renditions', flat=True
+    ).iterator(chunk_size=5000):
+        for paths in renditions.values():
+            yield from paths.values()
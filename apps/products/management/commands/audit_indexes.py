@@ -0,0 +1,108 @@
+# apps/products/management/commands/audit_indexes.py
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from core.query_audit import (
+    IndexComparisonUnsupported, audit, audit_without_indexes, get_query_shapes, load_captured_queries
+)
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the hot query shapes and flag full scans and sort steps'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--shape',
+            action='append',
+            default=[],
+            help='Only audit this registered shape (repeatable)',
+        )
+        parser.add_argument(
+            '--captured',
+            help='JSON lines file of captured SQL ({"sql", "params", "name"}) to replay as well',
+        )
+        parser.add_argument(
+            '--compare',
+            action='store_true',
+            help=(
+                'Also show each plan without the index it expects. The indexes are dropped in a '
+                'transaction that is rolled back afterwards, which locks their tables against all '
+                'reads and writes until the audit ends; only allowed with DEBUG or --i-know-this-locks'
+            ),
+        )
+        parser.add_argument(
+            '--i-know-this-locks',
+            action='store_true',
+            dest='allow_locking',
+            help='Allow --compare outside DEBUG, accepting that it blocks traffic to the audited tables',
+        )
+        parser.add_argument(
+            '--benchmark',
+            type=int,
+            default=0,
+            metavar='N',
+            help='Run every query N times and report the median time',
+        )
+        parser.add_argument(
+            '--fail-on-issues',
+            action='store_true',
+            help='Exit with an error if any query scans a table or sorts',
+        )
+
+    def handle(self, *args, **options):
+        if options['compare'] and not (settings.DEBUG or options['allow_locking']):
+            raise CommandError(
+                '--compare drops indexes inside a transaction, locking their tables until it ends; '
+                'run it with DEBUG or pass --i-know-this-locks'
+            )
+        shapes = get_query_shapes()
+        unknown = set(options['shape']) - set(shapes)
+        if unknown:
+            raise CommandError(f"Unknown shapes: {', '.join(sorted(unknown))}")
+        shapes = [shapes[name] for name in options['shape'] or sorted(shapes)]
+        captured = []
+        if options['captured']:
+            with open(options['captured']) as fileobj:
+                captured = load_captured_queries(fileobj)
+
+        reports = audit(shapes, captured, options['benchmark'])
+        before = {}
+        if options['compare']:
+            indexes = {shape.expect_index for shape in shapes if shape.expect_index}
+            try:
+                previous, missing = audit_without_indexes(indexes, shapes, captured, options['benchmark'])
+            except IndexComparisonUnsupported as e:
+                raise CommandError(str(e))
+            if missing:
+                self.stdout.write(self.style.WARNING(f"Indexes not declared on any model: {', '.join(missing)}"))
+            before = {report.name: report for report in previous}
+
+        for report in reports:
+            self.stdout.write(self.style.MIGRATE_HEADING(report.name))
+            if report.name in before:
+                self._write_plan('before', before[report.name])
+                self._write_plan('after', report)
+            else:
+                self._write_plan('plan', report)
+
+        issues = [report.name for report in reports if not report.ok]
+        if issues:
+            message = f"{len(issues)} of {len(reports)} queries scan or sort: {', '.join(issues)}"
+            if options['fail_on_issues']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'All {len(reports)} queries are served by indexes'))
+
+    def _write_plan(self, label, report):
+        notes = []
+        if report.full_scans:
+            notes.append(f"full scan of {', '.join(report.full_scans)}")
+        if report.sorts:
+            notes.append('sort step')
+        if not report.uses_expected_index:
+            notes.append(f'{report.expect_index} not used')
+        if report.seconds is not None:
+            notes.append(f'{report.seconds * 1000:.2f} ms')
+        style = self.style.SUCCESS if report.ok else self.style.WARNING
+        self.stdout.write(f"  {label}: {style('; '.join(notes) or 'ok')}")
+        for line in report.plan.splitlines():
+            self.stdout.write(f'    {line}')
@@ -1,11 +1,11 @@
 # apps/products/management/commands/cleanup_unused_images.py
-import os
+from datetime import timedelta
+
 from django.core.management.base import BaseCommand
-from django.conf import settings
-from apps.products.models import ProductImage
+from core.media_gc import MediaGarbageCollector
 
 class Command(BaseCommand):
-    help = 'Clean up unused product images'
+    help = 'Clean up image files that no database row refers to'
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -13,56 +13,47 @@ class Command(BaseCommand):
             action='store_true',
             help='Show what would be deleted without actually deleting',
         )
+        parser.add_argument(
+            '--grace-hours',
+            type=float,
+            default=24,
+            help='Never delete files modified within this many hours (default: 24)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Concurrent storage operations (default: 8)',
+        )
 
     def handle(self, *args, **options):
         dry_run = options['dry_run']
+        verbose = options['verbosity'] > 1
         
         if dry_run:
             self.stdout.write('DRY RUN - No files will be deleted')
         
-        self.stdout.write('Finding unused product images...')
+        self.stdout.write('Finding unused images...')
         
-        # Get all image files in the products directory
-        products_dir = os.path.join(settings.MEDIA_ROOT, 'products')
+        def report(name):
+            if dry_run or verbose:
+                self.stdout.write(f"{'Would delete' if dry_run else 'Deleting'}: {name}")
         
-        if not os.path.exists(products_dir):
-            self.stdout.write('Products directory does not exist')
-            return
-        
-        # Get all database image paths
-        db_images = set()
-        for img in ProductImage.objects.all():
-            if img.image:
-                db_images.add(os.path.basename(img.image.name))
-        
-        # Get all files in the directory
-        file_count = 0
-        deleted_count = 0
-        
-        for root, dirs, files in os.walk(products_dir):
-            for file in files:
-                file_count += 1
-                if file not in db_images:
-                    file_path = os.path.join(root, file)
-                    if dry_run:
-                        self.stdout.write(f'Would delete: {file_path}')
-                    else:
-                        try:
-                            os.remove(file_path)
-                            self.stdout.write(f'Deleted: {file_path}')
-                        except OSError as e:
-                            self.stdout.write(f'Error deleting {file_path}: {e}')
-                    deleted_count += 1
+        collector = MediaGarbageCollector(
+            grace_period=timedelta(hours=options['grace_hours']),
+            workers=options['workers'],
+            dry_run=dry_run,
+            on_orphan=report,
+        )
+        stats = collector.run()
         
+        summary = (
+            f"{stats['orphaned']} unused files out of {stats['scanned']} total files "
+            f"({stats['recent']} recent files skipped)"
+        )
         if dry_run:
-            self.stdout.write(
-                self.style.WARNING(
-                    f'DRY RUN: Found {deleted_count} unused files out of {file_count} total files'
-                )
-            )
+            self.stdout.write(self.style.WARNING(f'DRY RUN: Found {summary}'))
         else:
-            self.stdout.write(
-                self.style.SUCCESS(
-                    f'Deleted {deleted_count} unused files out of {file_count} total files'
-                )
-            )
\ No newline at end of file
+            if stats['errors']:
+                self.stdout.write(self.style.ERROR(f"{stats['errors']} files could not be deleted"))
+            self.stdout.write(self.style.SUCCESS(f"Deleted {stats['deleted']} of {summary}"))
@@ -0,0 +1,25 @@
+# apps/products/management/commands/flush_product_views.py
+from django.core.management.base import BaseCommand, CommandError
+from apps.products.view_counter import LocalViewCounter, flush_view_counts, get_view_counter
+
+class Command(BaseCommand):
+    help = (
+        'Write buffered product views to products and daily product analytics. '
+        'Needs a shared PRODUCT_VIEW_COUNTER_BACKEND such as RedisViewCounter; '
+        'the in-process counter is only flushed by the web workers holding it.'
+    )
+
+    def handle(self, *args, **options):
+        if isinstance(get_view_counter(), LocalViewCounter):
+            raise CommandError(
+                'LocalViewCounter buffers views inside each web worker; '
+                'configure a shared PRODUCT_VIEW_COUNTER_BACKEND to flush from a command'
+            )
+        
+        self.stdout.write('Flushing buffered product views...')
+        
+        written = flush_view_counts()
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully flushed {written} product views!')
+        )
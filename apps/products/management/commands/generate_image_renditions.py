@@ -0,0 +1,49 @@
+# apps/products/management/commands/generate_image_renditions.py
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from apps.products.images import generate_renditions
+from apps.products.models import ProductImage
+
+def _render(image_id):
+    try:
+        return generate_renditions(image_id) is not None
+    finally:
+        connection.close()
+
+class Command(BaseCommand):
+    help = 'Render missing thumbnail renditions for product images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Re-render every image, e.g. after THUMBNAIL_SIZES changed',
+        )
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='Also retry images whose rendering failed before',
+        )
+
+    def handle(self, *args, **options):
+        images = ProductImage.objects.all()
+        if not options['all']:
+            statuses = ['pending', 'failed'] if options['retry_failed'] else ['pending']
+            images = images.filter(rendition_status__in=statuses)
+        image_ids = list(images.values_list('id', flat=True))
+        
+        self.stdout.write(f'Rendering {len(image_ids)} product images...')
+        
+        workers = getattr(settings, 'PRODUCT_IMAGE_WORKERS', 2)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            rendered = sum(executor.map(_render, image_ids))
+        
+        failed = len(image_ids) - rendered
+        if failed:
+            self.stdout.write(self.style.WARNING(f'{failed} images could not be rendered'))
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully rendered {rendered} product images!')
+        )
@@ -0,0 +1,40 @@
+# apps/products/management/commands/rebuild_product_counts.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from apps.products.counters import rebuild_catalog_counters
+
+class Command(BaseCommand):
+    help = 'Rebuild and verify published product counts on categories and brands'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Report stale counters without updating them',
+        )
+
+    def handle(self, *args, **options):
+        verify = options['verify']
+        
+        if verify:
+            self.stdout.write('VERIFY ONLY - No counters will be updated')
+        
+        self.stdout.write('Checking published product counts...')
+        
+        with transaction.atomic():
+            mismatches = rebuild_catalog_counters(dry_run=verify)
+        
+        labels = {'categories': 'Category', 'brands': 'Brand'}
+        total = 0
+        for key, stale in mismatches.items():
+            for obj, stored, actual in stale:
+                self.stdout.write(f'{labels[key]} {obj.name}: {stored} -> {actual}')
+            total += len(stale)
+        
+        if verify:
+            style = self.style.WARNING if total else self.style.SUCCESS
+            self.stdout.write(style(f'Found {total} stale counters'))
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(f'Successfully rebuilt {total} stale counters!')
+            )
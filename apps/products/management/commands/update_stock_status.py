@@ -1,32 +1,21 @@
 # apps/products/management/commands/update_stock_status.py
 from django.core.management.base import BaseCommand
-from apps.products.models import Product
+from apps.products.stock import reconcile_stock
 
 class Command(BaseCommand):
-    help = 'Update product stock status based on quantity'
+    help = 'Repair derived stock status and available quantity of every product'
 
-    def handle(self, *args, **options):
-        self.stdout.write('Updating stock status...')
-        
-        # Update out of stock products
-        out_of_stock = Product.objects.filter(
-            stock_quantity=0,
-            manage_stock=True
-        ).exclude(stock_status='out_of_stock')
-        
-        out_of_stock_count = out_of_stock.update(stock_status='out_of_stock')
-        
-        # Update in stock products
-        in_stock = Product.objects.filter(
-            stock_quantity__gt=0,
-            manage_stock=True
-        ).exclude(stock_status='in_stock')
-        
-        in_stock_count = in_stock.update(stock_status='in_stock')
-        
-        self.stdout.write(
-            self.style.SUCCESS(
-                f'Updated {out_of_stock_count} products to out of stock and '
-                f'{in_stock_count} products to in stock!'
-            )
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--notify',
+            action='store_true',
+            help='Send back-in-stock and low-stock notifications for repaired products'
         )
+
+    def handle(self, *args, **options):
+        # Stock state is maintained on every write; this only fixes rows
+        # changed behind the ORM's back (raw SQL, restores).
+        self.stdout.write('Reconciling stock status...')
+        changed = reconcile_stock(batch_size=options['batch_size'], emit=options['notify'])
+        self.stdout.write(self.style.SUCCESS(f'Updated stock state of {changed} products!'))
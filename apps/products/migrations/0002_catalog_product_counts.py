@@ -0,0 +1,35 @@
+# Generated by Django 5.1.4 on 2026-10-17 01:47
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_counts(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    published = Product.objects.filter(status='published').order_by()
+    for model_name, field in (('Category', 'category'), ('Brand', 'brand')):
+        model = apps.get_model('products', model_name)
+        counts = published.filter(**{f'{field}__isnull': False}).values_list(field).annotate(total=Count('id'))
+        for pk, total in counts:
+            model.objects.filter(pk=pk).update(published_product_count=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='brand',
+            name='published_product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='published_product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_counts, migrations.RunPython.noop),
+    ]
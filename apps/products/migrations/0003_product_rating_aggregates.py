@@ -0,0 +1,65 @@
+# Generated by Django 5.1.4 on 2026-10-17 03:12
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def populate_rating_aggregates(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductReview = apps.get_model('products', 'ProductReview')
+    rows = ProductReview.objects.filter(is_approved=True).order_by().values('product_id').annotate(
+        total=Count('id'),
+        rating_total=Sum('rating'),
+        **{f'stars_{star}': Count('id', filter=Q(rating=star)) for star in range(1, 6)}
+    )
+    for row in rows.iterator():
+        Product.objects.filter(pk=row['product_id']).update(
+            review_count=row['total'],
+            rating_sum=row['rating_total'],
+            average_rating=round(row['rating_total'] / row['total'], 2),
+            **{f'rating_{star}_count': row[f'stars_{star}'] for star in range(1, 6)}
+        )
+    Product.objects.exclude(
+        id__in=ProductReview.objects.filter(is_approved=True).values('product_id')
+    ).update(review_count=0, average_rating=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_catalog_product_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.1.4 on 2026-10-17 03:40
+
+import math
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Q
+
+
+def populate_helpfulness_scores(apps, schema_editor):
+    ProductReview = apps.get_model('products', 'ProductReview')
+    z = 1.96
+    batch = []
+    voted = ProductReview.objects.filter(Q(helpful_count__gt=0) | Q(not_helpful_count__gt=0))
+    for review in voted.only('id', 'helpful_count', 'not_helpful_count').iterator(chunk_size=2000):
+        h = review.helpful_count
+        n = h + review.not_helpful_count
+        review.helpfulness_score = (
+            h + z * z / 2 - z * math.sqrt(h * (n - h) / n + z * z / 4)
+        ) / (n + z * z)
+        batch.append(review)
+        if len(batch) >= 2000:
+            ProductReview.objects.bulk_update(batch, ['helpfulness_score'])
+            batch = []
+    if batch:
+        ProductReview.objects.bulk_update(batch, ['helpfulness_score'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_product_rating_aggregates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productreview',
+            name='helpfulness_score',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='ReviewVote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_helpful', models.BooleanField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('review', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='votes', to='products.productreview')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='review_votes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'product_review_votes',
+                'unique_together': {('review', 'user')},
+            },
+        ),
+        migrations.RunPython(populate_helpfulness_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.4 on 2026-10-17 05:02
+
+from django.db import migrations, models
+from django.db.models import Case, Exists, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+
+def populate_stock_state(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductVariation = apps.get_model('products', 'ProductVariation')
+    active = ProductVariation.objects.filter(product=OuterRef('pk'), is_active=True)
+    variation_stock = Subquery(
+        active.order_by().values('product').annotate(total=Sum('stock_quantity')).values('total'),
+        output_field=IntegerField()
+    )
+
+    Product.objects.update(available_quantity=F('stock_quantity'))
+    Product.objects.filter(Exists(active)).update(available_quantity=Coalesce(variation_stock, 0))
+    Product.objects.filter(Q(manage_stock=True) | Exists(active)).update(stock_status=Case(
+        When(available_quantity__gt=0, then=Value('in_stock')),
+        default=Value('out_of_stock'),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_image_renditions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='available_quantity',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_stock_state, migrations.RunPython.noop),
+    ]
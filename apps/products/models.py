@@ -1,10 +1,14 @@
 # apps/products/models.py
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils.text import slugify
 from django.contrib.auth import get_user_model
 import uuid
 
+from .category_tree import get_category_tree
+from .counters import update_catalog_counters
+from .ratings import update_rating_aggregates
+
 User = get_user_model()
 
 class Category(models.Model):
@@ -35,6 +39,9 @@ class Category(models.Model):
     is_featured = models.BooleanField(default=False)
     sort_order = models.PositiveIntegerField(default=0)
     
+    # Denormalized count of published products, maintained by Product.save()
+    published_product_count = models.PositiveIntegerField(default=0, editable=False)
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -56,16 +63,19 @@ class Category(models.Model):
     @property
     def full_path(self):
         """Get full category path."""
+        path = get_category_tree().full_path(self.pk)
+        if path is not None:
+            return path
         if self.parent:
             return f"{self.parent.full_path} > {self.name}"
         return self.name
     
     def get_all_children(self):
         """Get all descendant categories."""
-        children = list(self.children.all())
-        for child in self.children.all():
-            children.extend(child.get_all_children())
-        return children
+        descendant_ids = get_category_tree().descendant_ids(self.pk)
+        if not descendant_ids:
+            return []
+        return list(Category.objects.filter(id__in=descendant_ids))
 
 class Brand(models.Model):
     """Product brands."""
@@ -79,6 +89,9 @@ class Brand(models.Model):
     is_active = models.BooleanField(default=True)
     is_featured = models.BooleanField(default=False)
     
+    # Denormalized count of published products, maintained by Product.save()
+    published_product_count = models.PositiveIntegerField(default=0, editable=False)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -139,6 +152,8 @@ class Product(models.Model):
     stock_quantity = models.PositiveIntegerField(default=0)
     low_stock_threshold = models.PositiveIntegerField(default=5)
     manage_stock = models.BooleanField(default=True)
+    # Sellable units: stock_quantity, or the total of active variation stock
+    available_quantity = models.PositiveIntegerField(default=0, editable=False)
     stock_status = models.CharField(
         max_length=20,
         choices=[
@@ -181,6 +196,13 @@ class Product(models.Model):
         validators=[MinValueValidator(0), MaxValueValidator(5)]
     )
     review_count = models.PositiveIntegerField(default=0)
+    # Running aggregates over approved reviews, maintained by ProductReview.save()
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_1_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_2_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_3_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_4_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_5_count = models.PositiveIntegerField(default=0, editable=False)
     
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
@@ -195,29 +217,117 @@ class Product(models.Model):
             models.Index(fields=['category', 'status']),
             models.Index(fields=['vendor', 'status']),
             models.Index(fields=['slug']),
+            # Storefront sort orders, keyed like the keyset cursor (sort
+            # column, then primary key) so a page of published products is
+            # read straight off the index without a sort step
+            models.Index(fields=['status', '-created_at', '-id'], name='products_status_created_idx'),
+            models.Index(fields=['status', 'price', 'id'], name='products_status_price_idx'),
+            models.Index(fields=['status', '-average_rating', '-id'], name='products_status_rating_idx'),
+            models.Index(fields=['status', '-sales_count', '-id'], name='products_status_sales_idx'),
+            # Category pages only ever list published products
+            models.Index(
+                fields=['category', '-created_at'], name='products_pub_category_idx',
+                condition=models.Q(status='published')
+            ),
         ]
     
     def __str__(self):
         return self.name
     
+    # Columns kept current by set-based UPDATEs elsewhere. A full save() only
+    # writes them when they were changed on the instance, so saving a stale
+    # copy of a product cannot roll them back.
+    MAINTAINED_FIELDS = (
+        'available_quantity', 'stock_status', 'view_count', 'review_count',
+        'average_rating', 'rating_sum', 'rating_1_count', 'rating_2_count',
+        'rating_3_count', 'rating_4_count', 'rating_5_count',
+    )
+    # Inputs of the derived stock state (see apps.products.stock)
+    STOCK_FIELDS = ('stock_quantity', 'manage_stock', 'low_stock_threshold', 'stock_status')
+    # Fields the autocomplete index reads (see apps.products.autocomplete)
+    SUGGESTION_FIELDS = ('name', 'slug', 'status')
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = instance._tracked_values()
+        return instance
+    
+    def _tracked_values(self):
+        return {
+            name: self.__dict__[name]
+            for name in set(self.MAINTAINED_FIELDS + self.STOCK_FIELDS + self.SUGGESTION_FIELDS)
+            if name in self.__dict__
+        }
+    
+    def _fields_changed(self, names):
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return True
+        # A field that is still deferred was neither loaded nor written
+        return any(
+            name in self.__dict__ and (name not in loaded or self.__dict__[name] != loaded[name])
+            for name in names
+        )
+    
+    def stock_fields_changed(self):
+        """Whether a stock input differs from the loaded row (True if unknown)."""
+        return self._fields_changed(self.STOCK_FIELDS)
+    
+    def suggestion_fields_changed(self):
+        """Whether a field of the autocomplete index differs from the loaded row (True if unknown)."""
+        return self._fields_changed(self.SUGGESTION_FIELDS)
+    
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
         if not self.sku:
             self.sku = f"SKU{uuid.uuid4().hex[:8].upper()}"
-        super().save(*args, **kwargs)
+        
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is not None and not self._state.adding and kwargs.get('update_fields') is None \
+                and not kwargs.get('force_insert'):
+            # Deferred fields were never loaded, so there is nothing to write
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in deferred and not (
+                    field.name in self.MAINTAINED_FIELDS
+                    and field.name in loaded and self.__dict__.get(field.name) == loaded[field.name]
+                )
+            ]
+        
+        try:
+            self._save_with_counters(*args, **kwargs)
+        finally:
+            self._loaded_values = self._tracked_values()
+    
+    def _save_with_counters(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not {'status', 'category', 'category_id', 'brand', 'brand_id'} & set(update_fields):
+            super().save(*args, **kwargs)
+            return
+        
+        adding = self._state.adding
+        with transaction.atomic():
+            # Read the stored state under a row lock rather than trusting the
+            # values this instance was loaded with, so concurrent saves of the
+            # same product apply their counter deltas one after the other.
+            old_state = None if adding else Product.objects.select_for_update().filter(
+                pk=self.pk
+            ).values_list('status', 'category_id', 'brand_id').first()
+            super().save(*args, **kwargs)
+            update_catalog_counters(old_state, (self.status, self.category_id, self.brand_id))
     
     @property
     def is_in_stock(self):
-        if not self.manage_stock:
-            return True
-        return self.stock_quantity > 0
+        return self.stock_status != 'out_of_stock'
     
     @property
     def is_low_stock(self):
         if not self.manage_stock:
             return False
-        return self.stock_quantity <= self.low_stock_threshold
+        return self.available_quantity <= self.low_stock_threshold
     
     @property
     def discount_percentage(self):
@@ -346,6 +456,12 @@ class ProductVariationAttribute(models.Model):
 
 class ProductImage(models.Model):
     """Product images gallery."""
+    RENDITION_STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
+    
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(upload_to='products/')
@@ -353,6 +469,12 @@ class ProductImage(models.Model):
     is_primary = models.BooleanField(default=False)
     sort_order = models.PositiveIntegerField(default=0)
     
+    # Resized copies per THUMBNAIL_SIZES entry: {size: {format: storage path}}
+    renditions = models.JSONField(default=dict, blank=True, editable=False)
+    rendition_status = models.CharField(
+        max_length=20, choices=RENDITION_STATUS_CHOICES, default='pending', editable=False
+    )
+    
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -362,6 +484,12 @@ class ProductImage(models.Model):
     def __str__(self):
         return f"{self.product.name} - Image {self.sort_order}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_image_name = instance.__dict__.get('image')
+        return instance
+    
     def save(self, *args, **kwargs):
         # Ensure only one primary image per product
         if self.is_primary:
@@ -369,7 +497,13 @@ class ProductImage(models.Model):
                 product=self.product, 
                 is_primary=True
             ).exclude(id=self.id).update(is_primary=False)
+        # A replaced file needs new renditions
+        loaded = getattr(self, '_loaded_image_name', None)
+        if loaded is not None and self.image.name != loaded:
+            self.renditions = {}
+            self.rendition_status = 'pending'
         super().save(*args, **kwargs)
+        self._loaded_image_name = self.image.name
 
 class ProductReview(models.Model):
     """Product reviews and ratings."""
@@ -384,6 +518,8 @@ class ProductReview(models.Model):
     # Helpful votes
     helpful_count = models.PositiveIntegerField(default=0)
     not_helpful_count = models.PositiveIntegerField(default=0)
+    # Wilson lower bound of the helpful ratio, maintained with the vote counters
+    helpfulness_score = models.FloatField(default=0, editable=False)
     
     # Status
     is_verified_purchase = models.BooleanField(default=False)
@@ -400,6 +536,37 @@ class ProductReview(models.Model):
     
     def __str__(self):
         return f"{self.product.name} - {self.rating} stars by {self.user.email}"
+    
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not {'product', 'product_id', 'rating', 'is_approved'} & set(update_fields):
+            super().save(*args, **kwargs)
+            return
+        
+        adding = self._state.adding
+        with transaction.atomic():
+            # The stored state under a row lock, as in Product._save_with_counters
+            old_state = None if adding else ProductReview.objects.select_for_update().filter(
+                pk=self.pk
+            ).values_list('product_id', 'rating', 'is_approved').first()
+            super().save(*args, **kwargs)
+            update_rating_aggregates(old_state, (self.product_id, self.rating, self.is_approved))
+
+class ReviewVote(models.Model):
+    """One user's helpful / not helpful vote on a review."""
+    review = models.ForeignKey(ProductReview, on_delete=models.CASCADE, related_name='votes')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='review_votes')
+    is_helpful = models.BooleanField()
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'product_review_votes'
+        unique_together = ['review', 'user']
+    
+    def __str__(self):
+        return f"{self.user.email} - {'helpful' if self.is_helpful else 'not helpful'}"
 
 class ProductTag(models.Model):
     """Product tags for better organization and search."""
@@ -450,4 +617,42 @@ class Wishlist(models.Model):
         ordering = ['-created_at']
     
     def __str__(self):
-        return f"{self.user.email} - {self.product.name}"
\ No newline at end of file
+        return f"{self.user.email} - {self.product.name}"
+
+class ProductImportJob(models.Model):
+    """Background bulk import of a vendor's product file."""
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('jsonl', 'JSON Lines'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    vendor = models.ForeignKey('vendors.Vendor', on_delete=models.CASCADE, related_name='product_imports')
+    file = models.FileField(upload_to='product_imports/')
+    file_format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    
+    # Progress
+    processed_rows = models.PositiveIntegerField(default=0)
+    created_count = models.PositiveIntegerField(default=0)
+    updated_count = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'product_import_jobs'
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.vendor} import {self.id} ({self.status})"
@@ -0,0 +1,39 @@
+# apps/products/query_shapes.py
+from core.query_audit import register, sample_pk
+
+from .models import Category, Product
+
+PAGE = 20
+
+def _published():
+    return Product.objects.filter(status='published')
+
+@register('product_list_newest', expect_index='products_status_created_idx')
+def product_list_newest():
+    """Default storefront listing, one keyset page."""
+    return _published().order_by('-created_at', '-pk')[:PAGE]
+
+@register('product_list_price', expect_index='products_status_price_idx')
+def product_list_price():
+    """?ordering=price"""
+    return _published().order_by('price', 'pk')[:PAGE]
+
+@register('product_list_rating', expect_index='products_status_rating_idx')
+def product_list_rating():
+    """?ordering=-average_rating"""
+    return _published().order_by('-average_rating', '-pk')[:PAGE]
+
+@register('product_list_bestsellers', expect_index='products_status_sales_idx')
+def product_list_bestsellers():
+    """?ordering=-sales_count"""
+    return _published().order_by('-sales_count', '-pk')[:PAGE]
+
+@register('product_list_category', expect_index='products_pub_category_idx')
+def product_list_category():
+    """Category browsing, newest first."""
+    return _published().filter(category_id=sample_pk(Category)).order_by('-created_at')[:PAGE]
+
+@register('product_list_in_stock', expect_index='products_status_created_idx')
+def product_list_in_stock():
+    """?in_stock=true"""
+    return _published().exclude(stock_status='out_of_stock').order_by('-created_at')[:PAGE]
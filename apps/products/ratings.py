@@ -0,0 +1,118 @@
+# apps/products/ratings.py
+from decimal import Decimal
+
+from django.db import connection
+from django.db.models import DecimalField, ExpressionWrapper, F, FloatField, Value
+from django.db.models.functions import Cast, Coalesce, NullIf, Round
+
+STARS = range(1, 6)
+HISTOGRAM_FIELDS = {star: f'rating_{star}_count' for star in STARS}
+
+def _counted(state):
+    """Return (product_id, rating) a review contributes, or None if unapproved."""
+    if state is None or not state[2]:
+        return None
+    return state[0], state[1]
+
+def _average(total, count):
+    """SQL expression for round(total / count, 2), or 0 when count is 0."""
+    quotient = ExpressionWrapper(
+        Cast(total, FloatField()) / NullIf(count, 0), output_field=FloatField()
+    )
+    return Coalesce(
+        Round(Cast(quotient, DecimalField(max_digits=10, decimal_places=4)), 2),
+        Value(Decimal('0')),
+        output_field=DecimalField()
+    )
+
+def _apply(product_id, sum_delta, count_delta, histogram_deltas):
+    from .models import Product
+
+    updates = {
+        'rating_sum': F('rating_sum') + sum_delta,
+        'review_count': F('review_count') + count_delta,
+        # Every F() here reads the pre-update row, so the average is computed
+        # from the new totals in the same statement.
+        'average_rating': _average(F('rating_sum') + sum_delta, F('review_count') + count_delta),
+    }
+    for star, delta in histogram_deltas.items():
+        if delta:
+            field = HISTOGRAM_FIELDS[star]
+            updates[field] = F(field) + delta
+    Product.objects.filter(pk=product_id).update(**updates)
+
+def update_rating_aggregates(old_state, new_state):
+    """
+    Apply the rating delta for one review change with a single UPDATE per
+    affected product.
+
+    States are (product_id, rating, is_approved) tuples; None means the review
+    did not exist. Must run inside the transaction that writes the review.
+    """
+    old = _counted(old_state)
+    new = _counted(new_state)
+    if old == new:
+        return
+
+    if old and new and old[0] == new[0]:
+        _apply(old[0], new[1] - old[1], 0, {old[1]: -1, new[1]: 1} if old[1] != new[1] else {})
+        return
+    if old:
+        _apply(old[0], -old[1], -1, {old[1]: -1})
+    if new:
+        _apply(new[0], new[1], 1, {new[1]: 1})
+
+def reconcile_ratings(product_ids=None):
+    """
+    Recompute rating aggregates from the reviews table, for every product or
+    only the given IDs.
+
+    One UPDATE ... FROM (SELECT ... GROUP BY) rewrites the products whose stored
+    aggregates drifted, and one UPDATE zeroes products left without approved
+    reviews. Returns the number of products changed.
+    """
+    from .models import Product, ProductReview
+
+    qn = connection.ops.quote_name
+    products = qn(Product._meta.db_table)
+    reviews = qn(ProductReview._meta.db_table)
+    fields = ['review_count', 'rating_sum'] + list(HISTOGRAM_FIELDS.values())
+    histogram = ', '.join(
+        f'SUM(CASE WHEN rating = {star} THEN 1 ELSE 0 END) AS {qn(field)}'
+        for star, field in HISTOGRAM_FIELDS.items()
+    )
+    average = 'ROUND(r.rating_sum * 1.0 / r.review_count, 2)'
+    assignments = ', '.join(f'{qn(field)} = r.{qn(field)}' for field in fields)
+    drifted = ' OR '.join(f'{products}.{qn(field)} <> r.{qn(field)}' for field in fields)
+    scope, params = '', []
+    if product_ids is not None:
+        product_ids = [Product._meta.pk.get_db_prep_value(pk, connection) for pk in product_ids]
+        if not product_ids:
+            return 0
+        scope = f" AND product_id IN ({', '.join(['%s'] * len(product_ids))})"
+        params = product_ids
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {products} SET {assignments}, average_rating = {average} '
+            f'FROM (SELECT product_id, COUNT(*) AS review_count, SUM(rating) AS rating_sum, '
+            f'{histogram} FROM {reviews} WHERE is_approved{scope} GROUP BY product_id) r '
+            f'WHERE {products}.id = r.product_id '
+            f'AND ({drifted} OR {products}.average_rating <> {average})',
+            params
+        )
+        changed = cursor.rowcount
+
+    approved = ProductReview.objects.filter(is_approved=True).values('product_id')
+    stale = Product.objects.exclude(id__in=approved)
+    if product_ids is not None:
+        stale = stale.filter(id__in=product_ids)
+    stale = stale.exclude(
+        review_count=0, rating_sum=0, average_rating=0,
+        **{field: 0 for field in HISTOGRAM_FIELDS.values()}
+    )
+    changed += stale.update(
+        review_count=0, rating_sum=0, average_rating=0,
+        **{field: 0 for field in HISTOGRAM_FIELDS.values()}
+    )
+    return changed
@@ -0,0 +1,90 @@
+# apps/products/review_votes.py
+import math
+
+from django.db import IntegrityError, transaction
+from django.db.models import ExpressionWrapper, F, FloatField, Value
+from django.db.models.functions import Cast, Coalesce, NullIf, Sqrt
+from django.utils import timezone
+
+from .detail_cache import bump_product_versions
+
+# 95% confidence for the Wilson score lower bound
+Z = 1.96
+
+COUNTER_FIELDS = {True: 'helpful_count', False: 'not_helpful_count'}
+
+def wilson_lower_bound(helpful, total):
+    """
+    Python twin of helpfulness_expression(), for scores computed outside SQL.
+
+    Migration 0004 backfills with its own copy of the formula, as migrations
+    must not import application code; keep the two in step.
+    """
+    if not total:
+        return 0.0
+    return (
+        helpful + Z * Z / 2 - Z * math.sqrt(helpful * (total - helpful) / total + Z * Z / 4)
+    ) / (total + Z * Z)
+
+def helpfulness_expression(helpful, not_helpful):
+    """
+    SQL expression for the Wilson score lower bound of helpful / total.
+
+    Ranks a review with 90 of 100 helpful votes above one with 2 of 2, so new
+    reviews with a couple of votes do not jump to the top.
+    """
+    h = Cast(helpful, FloatField())
+    n = Cast(helpful + not_helpful, FloatField())
+    spread = Sqrt(ExpressionWrapper(
+        h * (n - h) / NullIf(n, Value(0.0)) + Value(Z * Z / 4), output_field=FloatField()
+    ))
+    return Coalesce(
+        ExpressionWrapper(
+            (h + Value(Z * Z / 2) - Value(Z) * spread) / (n + Value(Z * Z)),
+            output_field=FloatField()
+        ),
+        Value(0.0)
+    )
+
+def _apply_deltas(review_id, deltas):
+    from .models import ProductReview
+
+    helpful = F('helpful_count') + deltas.get('helpful_count', 0)
+    not_helpful = F('not_helpful_count') + deltas.get('not_helpful_count', 0)
+    # All F() references read the pre-update row, so the score is computed
+    # from the new counts in the same statement.
+    ProductReview.objects.filter(pk=review_id).update(
+        helpful_count=helpful,
+        not_helpful_count=not_helpful,
+        helpfulness_score=helpfulness_expression(helpful, not_helpful)
+    )
+
+def record_review_vote(review_id, user, is_helpful):
+    """
+    Record a user's vote on a review.
+
+    Each user has at most one vote per review: repeating a vote is a no-op and
+    switching it moves the count between the two counters. Counters change
+    through a single F() UPDATE, so concurrent votes never overwrite each other.
+    Cached detail responses embedding the review are invalidated. Returns True
+    if the counters changed.
+    """
+    from .models import ProductReview, ReviewVote
+
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                ReviewVote.objects.create(review_id=review_id, user=user, is_helpful=is_helpful)
+            deltas = {COUNTER_FIELDS[is_helpful]: 1}
+        except IntegrityError:
+            switched = ReviewVote.objects.filter(
+                review_id=review_id, user=user, is_helpful=not is_helpful
+            ).update(is_helpful=is_helpful, updated_at=timezone.now())
+            if not switched:
+                return False
+            deltas = {COUNTER_FIELDS[is_helpful]: 1, COUNTER_FIELDS[not is_helpful]: -1}
+        _apply_deltas(review_id, deltas)
+        bump_product_versions(
+            ProductReview.objects.filter(pk=review_id).values_list('product_id', flat=True)
+        )
+    return True
@@ -0,0 +1,350 @@
+# apps/products/search.py
+import bisect
+import logging
+import math
+import re
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Field weights used when building a product's term frequencies.
+INDEXED_FIELDS = {
+    'name': 3.0,
+    'sku': 3.0,
+    'short_description': 2.0,
+    'description': 1.0,
+}
+
+def tokenize(text):
+    """Split text into lowercase word tokens."""
+    if not text:
+        return []
+    return TOKEN_RE.findall(str(text).lower())
+
+class BaseSearchBackend:
+    """Interface for product search backends."""
+
+    def search(self, query, limit=None):
+        """Return a list of (product_id, score) tuples, best match first."""
+        raise NotImplementedError
+
+    def index_product(self, product):
+        """Add or refresh a single product in the index."""
+        raise NotImplementedError
+
+    def remove_product(self, product_id):
+        """Drop a product from the index."""
+        raise NotImplementedError
+
+    def reindex_products(self, product_ids):
+        """Refresh a batch of products from the database."""
+        raise NotImplementedError
+
+    def rebuild(self):
+        """Rebuild the whole index from the database."""
+        raise NotImplementedError
+
+    def warm(self):
+        """Prepare the index ahead of the first search."""
+
+class InvertedIndexSearchBackend(BaseSearchBackend):
+    """
+    Process-local inverted index over published products with BM25 ranking.
+
+    Postings map each term to {product_id: weighted term frequency}. Query
+    terms are expanded to every indexed term sharing their prefix, so the
+    cost of a search depends on the matching postings, not the catalog size.
+    Writes in any process are published to the cache as a change log so the
+    other worker processes can apply them incrementally on their next search.
+    That needs a cache shared by all workers (CACHE_URL; see core.E001);
+    with a process-local cache, changes made in one worker are never seen by
+    the others.
+
+    The index is built by warm_search_index() when a worker starts; a search
+    arriving before that finishes waits for the build instead of starting
+    its own.
+    """
+    k1 = 1.2
+    b = 0.75
+    prefix_weight = 0.6
+    max_prefix_expansions = 50
+    version_key = 'products:search:version'
+    change_key = 'products:search:change:%s'
+    change_timeout = 60 * 60
+    max_replay = 500
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+        self._loaded = False
+
+    def _reset(self):
+        self.postings = defaultdict(dict)
+        self.terms = []
+        self.doc_terms = {}
+        self.doc_lengths = {}
+        self.total_length = 0.0
+        self.version = 0
+
+    # Index maintenance
+    def _document_terms(self, values):
+        frequencies = defaultdict(float)
+        for field, weight in INDEXED_FIELDS.items():
+            for token in tokenize(values.get(field)):
+                frequencies[token] += weight
+        return frequencies
+
+    def _add_document(self, product_id, values):
+        self._remove_document(product_id)
+        frequencies = self._document_terms(values)
+        if not frequencies:
+            return
+        for term, frequency in frequencies.items():
+            if term not in self.postings:
+                bisect.insort(self.terms, term)
+            self.postings[term][product_id] = frequency
+        length = sum(frequencies.values())
+        self.doc_terms[product_id] = list(frequencies)
+        self.doc_lengths[product_id] = length
+        self.total_length += length
+
+    def _remove_document(self, product_id):
+        terms = self.doc_terms.pop(product_id, None)
+        if terms is None:
+            return
+        self.total_length -= self.doc_lengths.pop(product_id, 0.0)
+        for term in terms:
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(product_id, None)
+            if not postings:
+                del self.postings[term]
+                index = bisect.bisect_left(self.terms, term)
+                if index < len(self.terms) and self.terms[index] == term:
+                    del self.terms[index]
+
+    def _published_values(self, product_ids=None):
+        from .models import Product
+
+        queryset = Product.objects.filter(status='published')
+        if product_ids is not None:
+            queryset = queryset.filter(id__in=product_ids)
+        return queryset.values('id', *INDEXED_FIELDS).iterator()
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.rebuild()
+
+    def warm(self):
+        with self._lock:
+            self._ensure_loaded()
+
+    def rebuild(self):
+        version = cache.get(self.version_key, 0)
+        with self._lock:
+            self._reset()
+            for values in self._published_values():
+                self._add_document(str(values['id']), values)
+            self.version = version
+            self._loaded = True
+
+    def index_product(self, product):
+        with self._lock:
+            if not self._loaded:
+                return
+            if product.status == 'published':
+                values = {field: getattr(product, field) for field in INDEXED_FIELDS}
+                self._add_document(str(product.pk), values)
+            else:
+                self._remove_document(str(product.pk))
+
+    def remove_product(self, product_id):
+        with self._lock:
+            if self._loaded:
+                self._remove_document(str(product_id))
+
+    def reindex_products(self, product_ids):
+        product_ids = {str(product_id) for product_id in product_ids}
+        if not product_ids:
+            return
+        with self._lock:
+            if not self._loaded:
+                return
+            found = set()
+            for values in self._published_values(product_ids):
+                product_id = str(values['id'])
+                self._add_document(product_id, values)
+                found.add(product_id)
+            for product_id in product_ids - found:
+                self._remove_document(product_id)
+
+    # Cross-process change log
+    def publish_change(self, product_id):
+        """
+        Record a product change, already applied locally, so other processes
+        can replay it. Returns the change's version, or None if not recorded.
+        """
+        cache.add(self.version_key, 0, None)
+        try:
+            version = cache.incr(self.version_key)
+        except ValueError:
+            return None
+        cache.set(self.change_key % version, str(product_id), self.change_timeout)
+        with self._lock:
+            # Skip replaying our own change. After a gap, other processes'
+            # changes come first, so the replay has to cover ours too.
+            if self._loaded and version == self.version + 1:
+                self.version = version
+        return version
+
+    def _sync(self):
+        current = cache.get(self.version_key, 0)
+        if current == self.version:
+            return
+        missing = current - self.version
+        if missing < 0 or missing > self.max_replay:
+            self.rebuild()
+            return
+        keys = [self.change_key % v for v in range(self.version + 1, current + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            self.rebuild()
+            return
+        self.reindex_products(set(changes.values()))
+        self.version = current
+
+    # Querying
+    def _expand(self, token):
+        """Return [(term, weight)] for the exact term and its prefix matches."""
+        expansions = []
+        if token in self.postings:
+            expansions.append((token, 1.0))
+        index = bisect.bisect_left(self.terms, token)
+        while index < len(self.terms) and len(expansions) < self.max_prefix_expansions:
+            term = self.terms[index]
+            if not term.startswith(token):
+                break
+            if term != token:
+                expansions.append((term, self.prefix_weight))
+            index += 1
+        return expansions
+
+    def search(self, query, limit=None):
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+
+        with self._lock:
+            self._ensure_loaded()
+            self._sync()
+
+            doc_count = len(self.doc_lengths)
+            if not doc_count:
+                return []
+            avg_length = self.total_length / doc_count
+
+            scores = None
+            for token in tokens:
+                token_scores = defaultdict(float)
+                for term, weight in self._expand(token):
+                    postings = self.postings[term]
+                    idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for product_id, frequency in postings.items():
+                        norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[product_id] / avg_length)
+                        token_scores[product_id] += (
+                            weight * idf * frequency * (self.k1 + 1) / (frequency + norm)
+                        )
+                # Every query token has to match (AND semantics).
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {
+                        product_id: score + token_scores[product_id]
+                        for product_id, score in scores.items()
+                        if product_id in token_scores
+                    }
+                if not scores:
+                    return []
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        if limit is not None:
+            ranked = ranked[:limit]
+        return ranked
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_search_backend():
+    """Return the configured product search backend (process-wide singleton)."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                backend_path = getattr(
+                    settings, 'PRODUCT_SEARCH_BACKEND',
+                    'apps.products.search.InvertedIndexSearchBackend'
+                )
+                _backend = import_string(backend_path)()
+    return _backend
+
+def search_queryset(queryset, query, limit=None):
+    """
+    Restrict a product queryset to search matches, annotated with `search_rank`
+    (0 is the best match) so callers can order by relevance.
+    """
+    from django.db.models import Case, IntegerField, Value, When
+
+    if limit is None:
+        limit = getattr(settings, 'PRODUCT_SEARCH_MAX_RESULTS', 1000)
+    results = get_search_backend().search(query, limit=limit)
+    if not results:
+        return queryset.none()
+
+    product_ids = [product_id for product_id, _ in results]
+    return queryset.filter(id__in=product_ids).annotate(
+        search_rank=Case(
+            *[When(id=product_id, then=Value(rank)) for rank, product_id in enumerate(product_ids)],
+            output_field=IntegerField()
+        )
+    )
+
+def schedule_reindex(product_ids):
+    """Refresh products in the index once the current transaction commits."""
+    product_ids = list(product_ids)
+
+    def _reindex():
+        backend = get_search_backend()
+        backend.reindex_products(product_ids)
+        for product_id in product_ids:
+            backend.publish_change(product_id)
+
+    transaction.on_commit(_reindex)
+
+def warm_search_index():
+    """
+    Build the index in a background thread at worker startup, so the first
+    search does not pay for a full-catalog rebuild. Called from the WSGI and
+    ASGI entry points when PRODUCT_SEARCH_WARM_ON_STARTUP is set.
+    """
+    if not getattr(settings, 'PRODUCT_SEARCH_WARM_ON_STARTUP', True):
+        return
+
+    def _build():
+        try:
+            get_search_backend().warm()
+        except Exception:
+            # The first search retries the build.
+            logger.exception('Failed to build the product search index')
+        finally:
+            connection.close()
+
+    threading.Thread(target=_build, daemon=True).start()
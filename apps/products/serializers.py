@@ -1,16 +1,27 @@
 # apps/products/serializers.py
+import json
+from decimal import Decimal
+
 from rest_framework import serializers
+from django.conf import settings
 from django.db import transaction
+from django.db.models import Prefetch
+from core.serializers import ExpandableFieldsMixin
+from .category_tree import get_category_tree
+from .detail_cache import bump_product_versions
+from .images import rendition_url, sync_product_images
 from .models import (
     Category, Brand, Product, ProductAttribute, ProductAttributeValue,
     ProductVariation, ProductVariationAttribute, ProductImage, ProductReview,
-    ProductTag, ProductTagAssignment, Wishlist
+    ProductTag, ProductTagAssignment, Wishlist, ProductImportJob
 )
+from .tagging import set_product_tags
+from .variations import resolve_attribute_values
 
 class CategorySerializer(serializers.ModelSerializer):
     """Serializer for product categories."""
     children = serializers.SerializerMethodField()
-    product_count = serializers.SerializerMethodField()
+    product_count = serializers.IntegerField(source='published_product_count', read_only=True)
     full_path = serializers.CharField(read_only=True)
     
     class Meta:
@@ -23,27 +34,30 @@ class CategorySerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'slug', 'created_at']
     
     def get_children(self, obj):
-        if obj.children.exists():
-            return CategorySerializer(obj.children.filter(is_active=True), many=True).data
-        return []
-    
-    def get_product_count(self, obj):
-        return obj.products.filter(status='published').count()
+        tree = get_category_tree()
+        child_ids = [node.id for node in tree.child_nodes(obj.pk)]
+        if not child_ids:
+            return []
+        # The outermost category loads its whole subtree with one query;
+        # nested serializers share it through the context.
+        subtree = self.context.get('category_subtree')
+        if subtree is None or any(pk not in subtree for pk in child_ids):
+            subtree = Category.objects.in_bulk(tree.descendant_ids(obj.pk))
+        children = [subtree[pk] for pk in child_ids if pk in subtree]
+        context = {**self.context, 'category_subtree': subtree}
+        return CategorySerializer(children, many=True, context=context).data
 
 class CategoryListSerializer(serializers.ModelSerializer):
     """Simplified category serializer for lists."""
-    product_count = serializers.SerializerMethodField()
+    product_count = serializers.IntegerField(source='published_product_count', read_only=True)
     
     class Meta:
         model = Category
         fields = ['id', 'name', 'slug', 'image', 'icon', 'product_count']
-    
-    def get_product_count(self, obj):
-        return obj.products.filter(status='published').count()
 
 class BrandSerializer(serializers.ModelSerializer):
     """Serializer for product brands."""
-    product_count = serializers.SerializerMethodField()
+    product_count = serializers.IntegerField(source='published_product_count', read_only=True)
     
     class Meta:
         model = Brand
@@ -52,16 +66,53 @@ class BrandSerializer(serializers.ModelSerializer):
             'is_active', 'is_featured', 'product_count', 'created_at'
         ]
         read_only_fields = ['id', 'slug', 'created_at']
-    
-    def get_product_count(self, obj):
-        return obj.products.filter(status='published').count()
+
+class CategorySummarySerializer(serializers.ModelSerializer):
+    """Flat category reference embedded in product lists."""
+    class Meta:
+        model = Category
+        fields = ['id', 'name', 'slug', 'icon']
+
+class BrandSummarySerializer(serializers.ModelSerializer):
+    """Flat brand reference embedded in product lists."""
+    class Meta:
+        model = Brand
+        fields = ['id', 'name', 'slug', 'logo']
 
 class ProductImageSerializer(serializers.ModelSerializer):
-    """Serializer for product images."""
+    """
+    Serializer for product images.
+    
+    `url` points at the WebP rendition of `size` (the original until renditions
+    are ready); `renditions` lists every size in WebP and JPEG for srcset use.
+    """
+    url = serializers.SerializerMethodField()
+    renditions = serializers.SerializerMethodField()
+    
     class Meta:
         model = ProductImage
-        fields = ['id', 'image', 'alt_text', 'is_primary', 'sort_order']
+        fields = ['id', 'image', 'url', 'renditions', 'alt_text', 'is_primary', 'sort_order']
         read_only_fields = ['id']
+    
+    def __init__(self, *args, size='large', **kwargs):
+        self.size = size
+        super().__init__(*args, **kwargs)
+    
+    def _absolute(self, url):
+        request = self.context.get('request')
+        if url and request is not None:
+            return request.build_absolute_uri(url)
+        return url
+    
+    def get_url(self, obj):
+        return self._absolute(rendition_url(obj, self.size))
+    
+    def get_renditions(self, obj):
+        storage = obj.image.storage
+        return {
+            size: {fmt: self._absolute(storage.url(path)) for fmt, path in paths.items()}
+            for size, paths in (obj.renditions or {}).items()
+        }
 
 class ProductTagSerializer(serializers.ModelSerializer):
     """Serializer for product tags."""
@@ -111,19 +162,33 @@ class ProductReviewSerializer(serializers.ModelSerializer):
         model = ProductReview
         fields = [
             'id', 'user', 'user_name', 'user_avatar', 'rating', 'title',
-            'comment', 'helpful_count', 'not_helpful_count',
+            'comment', 'helpful_count', 'not_helpful_count', 'helpfulness_score',
             'is_verified_purchase', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'user', 'helpful_count', 'not_helpful_count', 'is_verified_purchase']
+        read_only_fields = [
+            'id', 'user', 'helpful_count', 'not_helpful_count', 'helpfulness_score',
+            'is_verified_purchase'
+        ]
 
-class ProductListSerializer(serializers.ModelSerializer):
-    """Serializer for product list view."""
-    images = ProductImageSerializer(many=True, read_only=True)
-    category_detail = CategorySerializer(source='category', read_only=True)
-    brand_detail = BrandSerializer(source='brand', read_only=True)
+class ProductListSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    """
+    Serializer for product list view.
+    
+    Category and brand are flat summaries read from `select_related`; the full
+    nested representations are opt-in with `?expand=category,brand,tags`.
+    """
+    images = ProductImageSerializer(many=True, read_only=True, size=settings.PRODUCT_LIST_IMAGE_SIZE)
+    category_detail = CategorySummarySerializer(source='category', read_only=True)
+    brand_detail = BrandSummarySerializer(source='brand', read_only=True)
     discount_percentage = serializers.DecimalField(max_digits=5, decimal_places=2, read_only=True)
     is_in_stock = serializers.BooleanField(read_only=True)
     
+    expandable_fields = {
+        'category': ('category_detail', CategorySerializer, {'source': 'category', 'read_only': True}),
+        'brand': ('brand_detail', BrandSerializer, {'source': 'brand', 'read_only': True}),
+        'tags': ('tags', serializers.SerializerMethodField, {'method_name': 'get_tags'}),
+    }
+    
     class Meta:
         model = Product
         fields = [
@@ -138,12 +203,32 @@ class ProductListSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at', 'published_at',
             'images', 'category_detail', 'brand_detail', 'discount_percentage', 'is_in_stock'
         ]
+    
+    @staticmethod
+    def setup_eager_loading(queryset, prefix=''):
+        """Load everything the list representation reads in a fixed number of queries."""
+        return queryset.select_related(
+            f'{prefix}category', f'{prefix}brand'
+        ).prefetch_related(
+            f'{prefix}images',
+            Prefetch(
+                f'{prefix}tag_assignments',
+                queryset=ProductTagAssignment.objects.select_related('tag')
+            )
+        )
+    
+    def get_tags(self, obj):
+        # Reads the `tag_assignments` prefetch from setup_eager_loading()
+        return ProductTagSerializer(
+            [assignment.tag for assignment in obj.tag_assignments.all()], many=True
+        ).data
 
 class ProductDetailSerializer(serializers.ModelSerializer):
     """Serializer for product detail view."""
     images = ProductImageSerializer(many=True, read_only=True)
     variations = ProductVariationSerializer(many=True, read_only=True)
-    reviews = ProductReviewSerializer(many=True, read_only=True)
+    reviews = serializers.SerializerMethodField()
+    review_summary = serializers.SerializerMethodField()
     tags = serializers.SerializerMethodField()
     category = CategorySerializer(read_only=True)
     brand = BrandSerializer(read_only=True)
@@ -159,22 +244,63 @@ class ProductDetailSerializer(serializers.ModelSerializer):
             'id', 'name', 'slug', 'sku', 'barcode', 'category', 'brand',
             'product_type', 'short_description', 'description', 'specifications',
             'price', 'compare_price', 'discount_percentage', 'stock_quantity',
-            'low_stock_threshold', 'stock_status', 'is_in_stock', 'is_low_stock',
+            'available_quantity', 'low_stock_threshold', 'stock_status', 'is_in_stock', 'is_low_stock',
             'weight', 'length', 'width', 'height', 'requires_shipping',
             'shipping_class', 'status', 'is_featured', 'is_digital',
             'average_rating', 'review_count', 'view_count', 'sales_count',
             'vendor_name', 'vendor_id', 'images', 'variations', 'reviews',
-            'tags', 'created_at', 'updated_at', 'published_at'
+            'review_summary', 'tags', 'created_at', 'updated_at', 'published_at'
         ]
     
+    # Only the most helpful reviews are embedded; the full list is paginated
+    # by ProductReviewListView.
+    top_reviews_limit = 5
+    
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Load everything the detail payload renders in a fixed number of queries."""
+        return queryset.select_related('category', 'brand', 'vendor').prefetch_related(
+            'images',
+            'variations__attributes__attribute',
+            'variations__attributes__value',
+            Prefetch('tag_assignments', queryset=ProductTagAssignment.objects.select_related('tag')),
+        )
+    
+    def get_reviews(self, obj):
+        reviews = ProductReview.objects.filter(product=obj, is_approved=True).select_related(
+            'user'
+        ).order_by('-helpfulness_score', '-helpful_count', '-created_at')[:self.top_reviews_limit]
+        return ProductReviewSerializer(reviews, many=True, context=self.context).data
+    
+    def get_review_summary(self, obj):
+        histogram = {
+            str(star): getattr(obj, f'rating_{star}_count') for star in range(1, 6)
+        }
+        return {
+            'count': obj.review_count,
+            'average_rating': obj.average_rating,
+            'histogram': histogram,
+        }
+    
     def get_tags(self, obj):
-        tags = ProductTag.objects.filter(product_assignments__product=obj)
+        tags = [assignment.tag for assignment in obj.tag_assignments.all()]
         return ProductTagSerializer(tags, many=True).data
 
+class ProductImageInputSerializer(serializers.Serializer):
+    """Gallery item of a product write: an existing image by id, or a new file."""
+    id = serializers.UUIDField(required=False)
+    image = serializers.ImageField(required=False)
+    alt_text = serializers.CharField(max_length=255, required=False, allow_blank=True)
+    
+    def validate(self, attrs):
+        if 'id' not in attrs and 'image' not in attrs:
+            raise serializers.ValidationError('Provide the id of an existing image or a new image file.')
+        return attrs
+
 class ProductCreateUpdateSerializer(serializers.ModelSerializer):
     """Serializer for creating and updating products."""
-    images = ProductImageSerializer(many=True, required=False)
-    tags = serializers.ListField(child=serializers.CharField(), required=False)
+    images = ProductImageInputSerializer(many=True, required=False)
+    tags = serializers.ListField(child=serializers.CharField(max_length=50), required=False)
     
     class Meta:
         model = Product
@@ -188,6 +314,16 @@ class ProductCreateUpdateSerializer(serializers.ModelSerializer):
             'images', 'tags'
         ]
     
+    def validate_images(self, value):
+        existing = set(self.instance.images.values_list('id', flat=True)) if self.instance else set()
+        for item in value:
+            if 'id' in item and item['id'] not in existing:
+                raise serializers.ValidationError(f"Image {item['id']} does not belong to this product.")
+        return value
+    
+    def validate_tags(self, value):
+        return list(dict.fromkeys(name.strip() for name in value if name.strip()))
+    
     def create(self, validated_data):
         images_data = validated_data.pop('images', [])
         tags_data = validated_data.pop('tags', [])
@@ -198,19 +334,10 @@ class ProductCreateUpdateSerializer(serializers.ModelSerializer):
         with transaction.atomic():
             product = Product.objects.create(**validated_data)
             
-            # Create images
-            for i, image_data in enumerate(images_data):
-                ProductImage.objects.create(
-                    product=product,
-                    sort_order=i,
-                    is_primary=(i == 0),
-                    **image_data
-                )
-            
-            # Create tags
-            for tag_name in tags_data:
-                tag, created = ProductTag.objects.get_or_create(name=tag_name)
-                ProductTagAssignment.objects.create(product=product, tag=tag)
+            if images_data:
+                sync_product_images(product, images_data)
+            if tags_data:
+                set_product_tags({product.pk: tags_data})
             
             return product
     
@@ -220,27 +347,21 @@ class ProductCreateUpdateSerializer(serializers.ModelSerializer):
         
         with transaction.atomic():
             # Update product fields
-            for attr, value in validated_data.items():
-                setattr(instance, attr, value)
-            instance.save()
+            if validated_data:
+                for attr, value in validated_data.items():
+                    setattr(instance, attr, value)
+                instance.save()
             
-            # Update images if provided
+            # Images and tags are diffed against what is stored; unchanged rows are not touched
+            changed = False
             if images_data is not None:
-                instance.images.all().delete()
-                for i, image_data in enumerate(images_data):
-                    ProductImage.objects.create(
-                        product=instance,
-                        sort_order=i,
-                        is_primary=(i == 0),
-                        **image_data
-                    )
-            
-            # Update tags if provided
+                changed = sync_product_images(instance, images_data) or changed
             if tags_data is not None:
-                instance.tag_assignments.all().delete()
-                for tag_name in tags_data:
-                    tag, created = ProductTag.objects.get_or_create(name=tag_name)
-                    ProductTagAssignment.objects.create(product=instance, tag=tag)
+                changed = bool(set_product_tags({instance.pk: tags_data})) or changed
+            
+            # Bulk writes bypass the signals that invalidate the detail cache
+            if changed:
+                bump_product_versions([instance.pk])
             
             return instance
 
@@ -261,26 +382,53 @@ class ProductVariationCreateSerializer(serializers.ModelSerializer):
         product = self.context['product']
         
         with transaction.atomic():
+            attributes, values, missing = resolve_attribute_values(
+                {name: [value] for name, value in attributes_data.items()}
+            )
+            if missing:
+                raise serializers.ValidationError(f"Attribute '{missing[0]}' does not exist")
+            
             variation = ProductVariation.objects.create(product=product, **validated_data)
             
             # Create variation attributes
-            for attr_name, value_name in attributes_data.items():
-                try:
-                    attribute = ProductAttribute.objects.get(name=attr_name)
-                    value, created = ProductAttributeValue.objects.get_or_create(
-                        attribute=attribute,
-                        value=value_name
-                    )
-                    ProductVariationAttribute.objects.create(
-                        variation=variation,
-                        attribute=attribute,
-                        value=value
-                    )
-                except ProductAttribute.DoesNotExist:
-                    raise serializers.ValidationError(f"Attribute '{attr_name}' does not exist")
+            ProductVariationAttribute.objects.bulk_create([
+                ProductVariationAttribute(
+                    variation=variation,
+                    attribute=attributes[attr_name],
+                    value=values[(attributes[attr_name].pk, value_name)]
+                )
+                for attr_name, value_name in attributes_data.items()
+            ])
             
             return variation
 
+class ProductVariationGenerateSerializer(serializers.Serializer):
+    """Attribute values whose cartesian product becomes new variations."""
+    attributes = serializers.DictField(
+        child=serializers.ListField(child=serializers.CharField(max_length=200), allow_empty=False),
+        allow_empty=False
+    )
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0'), required=False)
+    compare_price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=Decimal('0'), required=False, allow_null=True
+    )
+    cost_price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=Decimal('0'), required=False, allow_null=True
+    )
+    stock_quantity = serializers.IntegerField(min_value=0, default=0)
+    is_active = serializers.BooleanField(default=True)
+    
+    def validate_attributes(self, value):
+        combinations = 1
+        for values in value.values():
+            combinations *= len(set(values))
+        limit = settings.PRODUCT_VARIATION_MAX_COMBINATIONS
+        if combinations > limit:
+            raise serializers.ValidationError(
+                f"{combinations} combinations requested; at most {limit} can be generated at once"
+            )
+        return value
+
 class ProductAttributeSerializer(serializers.ModelSerializer):
     """Serializer for product attributes."""
     values = ProductAttributeValueSerializer(many=True, read_only=True)
@@ -336,6 +484,9 @@ class ProductSearchSerializer(serializers.Serializer):
         required=False,
         default='-created_at'
     )
+    facets = serializers.BooleanField(
+        required=False, default=False, help_text="Include facet counts for the result set"
+    )
 
 class ProductBulkUpdateSerializer(serializers.Serializer):
     """Serializer for bulk product operations."""
@@ -351,6 +502,101 @@ class ProductBulkUpdateSerializer(serializers.Serializer):
             raise serializers.ValidationError("Cannot process more than 100 products at once")
         return value
 
+class TagListField(serializers.Field):
+    """Tag names given as a list (JSON lines) or a comma-separated string (CSV)."""
+    
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            data = data.split(',')
+        if not isinstance(data, list):
+            raise serializers.ValidationError('Expected a list or comma-separated string of tags.')
+        names = [str(name).strip() for name in data]
+        return list(dict.fromkeys(name for name in names if name))
+    
+    def to_representation(self, value):
+        return list(value)
+
+class ProductImportRowSerializer(serializers.Serializer):
+    """
+    One row of a bulk product import.
+
+    Rows are matched to the vendor's products by SKU. Blank values are treated
+    as "not provided", so updates only touch the columns a row fills in.
+    """
+    REQUIRED_FOR_CREATE = ['name', 'description', 'price']
+    
+    sku = serializers.CharField(max_length=100)
+    name = serializers.CharField(max_length=255, required=False)
+    category = serializers.CharField(required=False, help_text="Category slug or name")
+    brand = serializers.CharField(required=False, help_text="Brand slug or name")
+    product_type = serializers.ChoiceField(choices=Product.PRODUCT_TYPE_CHOICES, required=False)
+    short_description = serializers.CharField(max_length=500, required=False)
+    description = serializers.CharField(required=False)
+    specifications = serializers.JSONField(required=False, binary=True)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0'), required=False)
+    compare_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0'), required=False)
+    cost_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0'), required=False)
+    stock_quantity = serializers.IntegerField(min_value=0, required=False)
+    low_stock_threshold = serializers.IntegerField(min_value=0, required=False)
+    manage_stock = serializers.BooleanField(required=False)
+    weight = serializers.DecimalField(max_digits=8, decimal_places=2, required=False)
+    length = serializers.DecimalField(max_digits=8, decimal_places=2, required=False)
+    width = serializers.DecimalField(max_digits=8, decimal_places=2, required=False)
+    height = serializers.DecimalField(max_digits=8, decimal_places=2, required=False)
+    requires_shipping = serializers.BooleanField(required=False)
+    shipping_class = serializers.CharField(max_length=100, required=False)
+    is_featured = serializers.BooleanField(required=False)
+    is_digital = serializers.BooleanField(required=False)
+    meta_title = serializers.CharField(max_length=255, required=False)
+    meta_description = serializers.CharField(required=False)
+    meta_keywords = serializers.CharField(max_length=500, required=False)
+    tags = TagListField(required=False)
+    
+    def to_internal_value(self, data):
+        data = {
+            key: value.strip() if isinstance(value, str) else value
+            for key, value in data.items()
+            if key in self.fields and value is not None
+        }
+        data = {key: value for key, value in data.items() if value != ''}
+        if isinstance(data.get('specifications'), dict):
+            data['specifications'] = json.dumps(data['specifications'])
+        return super().to_internal_value(data)
+    
+    def validate_specifications(self, value):
+        if not isinstance(value, dict):
+            raise serializers.ValidationError('Specifications must be a JSON object.')
+        return value
+
+class ProductImportSerializer(serializers.Serializer):
+    """Upload that starts a bulk product import."""
+    file = serializers.FileField()
+    file_format = serializers.ChoiceField(choices=ProductImportJob.FORMAT_CHOICES, required=False)
+    
+    def validate(self, attrs):
+        if 'file_format' not in attrs:
+            name = attrs['file'].name.lower()
+            if name.endswith('.csv'):
+                attrs['file_format'] = 'csv'
+            elif name.endswith(('.jsonl', '.ndjson')):
+                attrs['file_format'] = 'jsonl'
+            else:
+                raise serializers.ValidationError(
+                    {'file_format': 'Could not detect the format; use csv or jsonl.'}
+                )
+        return attrs
+
+class ProductImportJobSerializer(serializers.ModelSerializer):
+    """Progress of a bulk product import."""
+    class Meta:
+        model = ProductImportJob
+        fields = [
+            'id', 'file_format', 'status', 'processed_rows', 'created_count',
+            'updated_count', 'error_count', 'errors', 'created_at',
+            'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
+
 class ProductStatsSerializer(serializers.Serializer):
     """Serializer for product statistics."""
     total_products = serializers.IntegerField()
@@ -364,7 +610,12 @@ class ProductStatsSerializer(serializers.Serializer):
     average_rating = serializers.DecimalField(max_digits=3, decimal_places=2)
 
 class CategoryTreeSerializer(serializers.ModelSerializer):
-    """Serializer for category tree structure."""
+    """
+    Serializer for category tree structure.
+    
+    Accepts Category instances or CategoryNode snapshots; children always come
+    from the cached category tree, so rendering does not query per node.
+    """
     children = serializers.SerializerMethodField()
     
     class Meta:
@@ -372,5 +623,5 @@ class CategoryTreeSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'slug', 'icon', 'children']
     
     def get_children(self, obj):
-        children = obj.children.filter(is_active=True).order_by('sort_order', 'name')
+        children = get_category_tree().child_nodes(obj.id)
         return CategoryTreeSerializer(children, many=True).data
\ No newline at end of file
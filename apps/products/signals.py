@@ -0,0 +1,149 @@
+# apps/products/signals.py
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from apps.vendors.models import Vendor
+from .autocomplete import bump_autocomplete_version
+from .category_tree import discard_local_tree, invalidate_category_tree
+from .counters import update_catalog_counters
+from .detail_cache import bump_catalog_generation, bump_product_version, bump_product_versions
+from .images import schedule_renditions
+from .models import (
+    Category, Brand, Product, ProductAttribute, ProductAttributeValue, ProductImage,
+    ProductReview, ProductTag, ProductTagAssignment, ProductVariation, ProductVariationAttribute
+)
+from .ratings import update_rating_aggregates
+from .search import get_search_backend
+from .stock import dispatch_stock_notifications, refresh_stock, stock_changed
+
+@receiver(post_save, sender=Product)
+def index_product_on_save(sender, instance, **kwargs):
+    """Keep the search index in sync with product writes."""
+    def _index():
+        backend = get_search_backend()
+        backend.index_product(instance)
+        backend.publish_change(instance.pk)
+
+    transaction.on_commit(_index)
+
+@receiver(post_save, sender=Product)
+def bump_autocomplete_on_save(sender, instance, created, **kwargs):
+    """Only name, slug and status changes reach the suggestion index."""
+    if created or instance.suggestion_fields_changed():
+        bump_autocomplete_version()
+
+@receiver(post_delete, sender=Product)
+def remove_product_from_index(sender, instance, **kwargs):
+    """Drop deleted products from the search index."""
+    product_id = instance.pk
+
+    def _remove():
+        backend = get_search_backend()
+        backend.remove_product(product_id)
+        backend.publish_change(product_id)
+
+    transaction.on_commit(_remove)
+    bump_autocomplete_version()
+
+@receiver(pre_delete, sender=Product)
+def decrement_catalog_counters(sender, instance, **kwargs):
+    """
+    Release the deleted product's slot in its category and brand counters.
+
+    Reads the stored row under a lock, since the instance may be stale; runs
+    inside the deletion's transaction.
+    """
+    update_catalog_counters(
+        Product.objects.select_for_update().filter(pk=instance.pk).values_list(
+            'status', 'category_id', 'brand_id'
+        ).first(),
+        None
+    )
+
+@receiver(pre_delete, sender=ProductReview)
+def remove_review_from_ratings(sender, instance, **kwargs):
+    """Take the deleted review, as stored and locked, out of its product's rating aggregates."""
+    update_rating_aggregates(
+        ProductReview.objects.select_for_update().filter(pk=instance.pk).values_list(
+            'product_id', 'rating', 'is_approved'
+        ).first(),
+        None
+    )
+
+@receiver(post_save, sender=Product)
+def refresh_stock_on_product_save(sender, instance, created, **kwargs):
+    """Derive available quantity and stock status when a stock input changes."""
+    if created or instance.stock_fields_changed():
+        for change in refresh_stock([instance.pk]):
+            instance.available_quantity = change.new_quantity
+            instance.stock_status = change.new_status
+
+@receiver(post_save, sender=ProductVariation)
+@receiver(post_delete, sender=ProductVariation)
+def refresh_stock_on_variation_write(sender, instance, **kwargs):
+    """Variation stock rolls up into the product's available quantity."""
+    refresh_stock([instance.product_id])
+
+@receiver(stock_changed)
+def notify_stock_transitions(sender, changes, **kwargs):
+    """Back-in-stock notices for wishlists and low-stock alerts for vendors."""
+    dispatch_stock_notifications(changes)
+
+@receiver(post_save, sender=ProductImage)
+def render_image_on_save(sender, instance, **kwargs):
+    """New or replaced image files get their thumbnail renditions rendered."""
+    if instance.rendition_status == 'pending':
+        schedule_renditions([instance.pk])
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_tree_on_write(sender, **kwargs):
+    """Any category write makes the cached tree snapshot stale."""
+    discard_local_tree()
+    transaction.on_commit(invalidate_category_tree)
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=ProductVariation)
+@receiver(post_delete, sender=ProductVariation)
+@receiver(post_save, sender=ProductReview)
+@receiver(post_delete, sender=ProductReview)
+@receiver(post_save, sender=ProductTagAssignment)
+@receiver(post_delete, sender=ProductTagAssignment)
+def bump_detail_version(sender, instance, **kwargs):
+    """Invalidate the cached detail response of the affected product."""
+    bump_product_version(instance.pk if sender is Product else instance.product_id)
+
+@receiver(post_save, sender=ProductVariationAttribute)
+@receiver(post_delete, sender=ProductVariationAttribute)
+def bump_detail_version_for_variation(sender, instance, **kwargs):
+    product_id = ProductVariation.objects.filter(
+        pk=instance.variation_id
+    ).values_list('product_id', flat=True).first()
+    bump_product_version(product_id)
+
+@receiver(post_save, sender=ProductTag)
+def bump_detail_versions_for_tag(sender, instance, created, **kwargs):
+    if not created:
+        bump_product_versions(
+            instance.product_assignments.values_list('product_id', flat=True)
+        )
+
+@receiver(post_save, sender=Vendor)
+def bump_detail_versions_for_vendor(sender, instance, **kwargs):
+    bump_product_versions(instance.products.values_list('id', flat=True))
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+@receiver(post_save, sender=ProductAttribute)
+@receiver(post_delete, sender=ProductAttribute)
+@receiver(post_save, sender=ProductAttributeValue)
+@receiver(post_delete, sender=ProductAttributeValue)
+def bump_detail_generation(sender, **kwargs):
+    """Shared catalog data is embedded in every detail response."""
+    bump_catalog_generation()
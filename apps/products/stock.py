@@ -0,0 +1,188 @@
+# apps/products/stock.py
+import logging
+import threading
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.dispatch import Signal
+
+from .detail_cache import bump_product_versions
+
+logger = logging.getLogger(__name__)
+
+# Sent on commit with `changes`, a list of StockChange, whenever the stored
+# stock state of products changes.
+stock_changed = Signal()
+
+class StockChange(namedtuple('StockChange', [
+    'product_id', 'old_status', 'new_status', 'old_quantity', 'new_quantity', 'low_stock_threshold'
+])):
+    __slots__ = ()
+
+    @property
+    def back_in_stock(self):
+        return self.old_status == 'out_of_stock' and self.new_status == 'in_stock'
+
+    @property
+    def out_of_stock(self):
+        return self.old_status != 'out_of_stock' and self.new_status == 'out_of_stock'
+
+    @property
+    def became_low(self):
+        """Crossed down to the low-stock threshold while still in stock."""
+        return (
+            self.new_status == 'in_stock'
+            and 0 < self.new_quantity <= self.low_stock_threshold < self.old_quantity
+        )
+
+def stock_state(stock_quantity, manage_stock, stock_status, has_variations, variation_stock):
+    """
+    Derived (available_quantity, stock_status) of a product.
+
+    Products with active variations sell variation stock; otherwise the
+    product's own quantity counts, and the status follows it when stock is
+    managed. Unmanaged products keep the status their vendor set.
+    """
+    if has_variations:
+        quantity = variation_stock
+    else:
+        quantity = stock_quantity
+        if not manage_stock:
+            return quantity, stock_status
+    return quantity, 'in_stock' if quantity > 0 else 'out_of_stock'
+
+def _with_variation_stock(queryset):
+    from .models import ProductVariation
+
+    active = ProductVariation.objects.filter(product=OuterRef('pk'), is_active=True)
+    return queryset.annotate(
+        has_variations=Exists(active),
+        variation_stock=Coalesce(
+            Subquery(
+                active.order_by().values('product').annotate(total=Sum('stock_quantity')).values('total'),
+                output_field=IntegerField()
+            ),
+            0
+        ),
+    )
+
+def refresh_stock(product_ids, emit=True):
+    """
+    Recompute available_quantity and stock_status for the given products.
+
+    Reads the products and their variation totals in one locking query and
+    writes the rows that changed with one bulk UPDATE. Changed products get
+    their cached detail responses invalidated, and when `emit` is set a
+    stock_changed event carrying the transitions is sent after commit.
+    Returns the list of StockChange.
+    """
+    from .models import Product
+
+    product_ids = {pk for pk in product_ids if pk is not None}
+    if not product_ids:
+        return []
+
+    changes, changed = [], []
+    with transaction.atomic():
+        rows = _with_variation_stock(
+            Product.objects.filter(pk__in=product_ids).select_for_update()
+        ).only(
+            'id', 'stock_quantity', 'manage_stock', 'stock_status',
+            'available_quantity', 'low_stock_threshold'
+        )
+        for product in rows:
+            quantity, status = stock_state(
+                product.stock_quantity, product.manage_stock, product.stock_status,
+                product.has_variations, product.variation_stock
+            )
+            if (quantity, status) == (product.available_quantity, product.stock_status):
+                continue
+            changes.append(StockChange(
+                product.pk, product.stock_status, status,
+                product.available_quantity, quantity, product.low_stock_threshold
+            ))
+            product.available_quantity = quantity
+            product.stock_status = status
+            changed.append(product)
+
+        if changed:
+            Product.objects.bulk_update(changed, ['available_quantity', 'stock_status'])
+            bump_product_versions([product.pk for product in changed])
+            if emit:
+                transaction.on_commit(lambda: stock_changed.send(sender=Product, changes=changes))
+    return changes
+
+def reconcile_stock(batch_size=1000, emit=False):
+    """Refresh every product in batches; returns the number changed."""
+    from .models import Product
+
+    changed = 0
+    last = None
+    while True:
+        batch = Product.objects.order_by('pk')
+        if last is not None:
+            batch = batch.filter(pk__gt=last)
+        ids = list(batch.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return changed
+        changed += len(refresh_stock(ids, emit=emit))
+        last = ids[-1]
+
+# Stock notifications
+def send_back_in_stock_notifications(product_ids):
+    """Tell users who wishlisted a published product that it is available again."""
+    from apps.notifications.services import notify_product_back_in_stock
+    from .models import Product, Wishlist
+
+    products = Product.objects.in_bulk(list(product_ids))
+    watchers = {}
+    for entry in Wishlist.objects.filter(
+        product_id__in=list(products), product__status='published'
+    ).select_related('user'):
+        watchers.setdefault(entry.product_id, []).append(entry.user)
+    for product_id, users in watchers.items():
+        notify_product_back_in_stock(products[product_id], users)
+
+def send_low_stock_alerts(product_ids):
+    """Alert vendors that products dropped to their low-stock threshold."""
+    from apps.notifications.services import notify_vendor_low_stock
+    from .models import Product
+
+    for product in Product.objects.filter(pk__in=list(product_ids)).select_related('vendor__user'):
+        notify_vendor_low_stock(product.vendor, product)
+
+def _send_notifications(back_in_stock, low_stock):
+    try:
+        if back_in_stock:
+            send_back_in_stock_notifications(back_in_stock)
+        if low_stock:
+            send_low_stock_alerts(low_stock)
+    except Exception:
+        logger.exception('Could not send stock notifications')
+
+def _send_in_thread(back_in_stock, low_stock):
+    try:
+        _send_notifications(back_in_stock, low_stock)
+    finally:
+        connection.close()
+
+def dispatch_stock_notifications(changes):
+    """
+    Send the notifications a batch of stock transitions calls for.
+
+    Runs in a background thread unless PRODUCT_STOCK_NOTIFICATIONS_ASYNC is
+    False, since email and SMS delivery must not hold up the request.
+    """
+    back_in_stock = [change.product_id for change in changes if change.back_in_stock]
+    low_stock = [change.product_id for change in changes if change.became_low]
+    if not back_in_stock and not low_stock:
+        return
+    if getattr(settings, 'PRODUCT_STOCK_NOTIFICATIONS_ASYNC', True):
+        threading.Thread(
+            target=_send_in_thread, args=(back_in_stock, low_stock), daemon=True
+        ).start()
+    else:
+        _send_notifications(back_in_stock, low_stock)
@@ -0,0 +1,78 @@
+# apps/products/tagging.py
+from django.db.models import Q
+from django.utils.text import slugify
+
+def resolve_tags(names):
+    """
+    Return {name: ProductTag} for the given tag names.
+
+    Missing tags are created with a single INSERT; names that race with a
+    concurrent insert, or differ from an existing tag only by case, resolve to
+    the stored tag through its slug.
+    """
+    from .models import ProductTag
+
+    slugs = {name: slugify(name)[:50] for name in set(names)}
+    if not slugs:
+        return {}
+    lookup = Q(name__in=slugs) | Q(slug__in=[slug for slug in slugs.values() if slug])
+    tags = list(ProductTag.objects.filter(lookup))
+    known = {tag.name for tag in tags} | {tag.slug for tag in tags}
+    missing = [
+        name for name, slug in slugs.items() if name not in known and slug not in known
+    ]
+    if missing:
+        ProductTag.objects.bulk_create(
+            [ProductTag(name=name, slug=slugs[name]) for name in missing], ignore_conflicts=True
+        )
+        tags = list(ProductTag.objects.filter(lookup))
+
+    by_name = {tag.name: tag for tag in tags}
+    by_slug = {tag.slug: tag for tag in tags}
+    resolved = {}
+    for name, slug in slugs.items():
+        tag = by_name.get(name) or by_slug.get(slug)
+        if tag is not None:
+            resolved[name] = tag
+    return resolved
+
+def set_product_tags(product_tags):
+    """
+    Make each product's tag assignments match the given names.
+
+    ``product_tags`` maps product IDs to lists of tag names. Only the
+    assignments that differ are deleted or inserted, so unchanged rows (and
+    their created_at) are left alone. Returns the IDs of products whose tags
+    changed.
+    """
+    from .models import ProductTagAssignment
+
+    if not product_tags:
+        return set()
+    tags = resolve_tags(name for names in product_tags.values() for name in names)
+    wanted = {
+        product_id: {tags[name].pk for name in names if name in tags}
+        for product_id, names in product_tags.items()
+    }
+
+    stale, changed = [], set()
+    current = {product_id: set() for product_id in wanted}
+    for pk, product_id, tag_id in ProductTagAssignment.objects.filter(
+        product_id__in=list(wanted)
+    ).values_list('pk', 'product_id', 'tag_id'):
+        current[product_id].add(tag_id)
+        if tag_id not in wanted[product_id]:
+            stale.append(pk)
+            changed.add(product_id)
+
+    additions = []
+    for product_id, tag_ids in wanted.items():
+        for tag_id in tag_ids - current[product_id]:
+            additions.append(ProductTagAssignment(product_id=product_id, tag_id=tag_id))
+            changed.add(product_id)
+
+    if stale:
+        ProductTagAssignment.objects.filter(pk__in=stale).delete()
+    if additions:
+        ProductTagAssignment.objects.bulk_create(additions, ignore_conflicts=True)
+    return changed
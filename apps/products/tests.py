@@ -1,3 +1,982 @@
-from django.test import TestCase
+import base64
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from PIL import Image
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.vendors.models import Vendor
+from core.checks import check_shared_cache
+from core.media_gc import MediaGarbageCollector
+from core.query_audit import IndexComparisonUnsupported, audit, audit_without_indexes, get_query_shapes
+from apps.analytics.models import ProductAnalytics, SearchAnalytics
+from apps.products import autocomplete, search
+from apps.products.autocomplete import discard_autocomplete_index
+from apps.products.category_tree import get_category_tree, invalidate_category_tree
+from apps.products.detail_cache import product_stamps
+from apps.products.ratings import reconcile_ratings
+from apps.products.review_votes import wilson_lower_bound
+from apps.products.serializers import ProductListSerializer
+from apps.products.view_counter import LocalViewCounter, flush_view_counts
+from apps.products.models import (
+    Brand, Category, Product, ProductAttribute, ProductAttributeValue, ProductImage,
+    ProductImportJob, ProductReview, ProductTag, ProductTagAssignment, ProductVariation, Wishlist
+)
+
+User = get_user_model()
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), PRODUCT_VIEW_FLUSH_ASYNC=False)
+class CatalogTestCase(TestCase):
+    """Published catalog of 25 products with nested categories, brands and tags."""
+    MAX_QUERIES = None
+
+    @classmethod
+    def tearDownClass(cls):
+        # Uploaded files go to a temporary MEDIA_ROOT, still overridden here
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(
+            email='vendor@example.com', password='password',
+            first_name='Test', last_name='Vendor', user_type='vendor'
+        )
+        vendor = Vendor.objects.create(
+            user=user, business_name='Test Shop', business_type='individual',
+            business_email='vendor@example.com', business_phone='+919876543210',
+            address_line_1='1 Test Street', city='Pune', state='MH', postal_code='411001'
+        )
+        parent = Category.objects.create(name='Electronics')
+        tag = ProductTag.objects.create(name='sale')
+
+        for i in range(25):
+            category = Category.objects.create(name=f'Category {i}', parent=parent)
+            Category.objects.create(name=f'Subcategory {i}', parent=category)
+            brand = Brand.objects.create(name=f'Brand {i}')
+            product = Product.objects.create(
+                vendor=vendor, name=f'Product {i}', description='A product',
+                price=Decimal('99.00'), stock_quantity=10, status='published',
+                category=category, brand=brand
+            )
+            for position in range(2):
+                ProductImage.objects.create(
+                    product=product, sort_order=position, is_primary=(position == 0),
+                    image=SimpleUploadedFile(f'p{i}-{position}.gif', b'GIF89a', content_type='image/gif')
+                )
+            ProductTagAssignment.objects.create(product=product, tag=tag)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def assertPageWithinBudget(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params or {})
+        self.captured_sql = [query['sql'] for query in queries.captured_queries]
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(
+            len(queries), self.MAX_QUERIES,
+            '\n'.join(query['sql'] for query in queries.captured_queries)
+        )
+        return response
+
+class ProductListQueryCountTests(CatalogTestCase):
+    """Guard the product list endpoints against N+1 regressions."""
+
+    # COUNT + products (with category/brand) + images + tag assignments
+    MAX_QUERIES = 4
+
+    def test_product_list_page_query_count(self):
+        response = self.assertPageWithinBudget('/api/products/')
+        self.assertEqual(len(response.data['results']), 20)
+        product = response.data['results'][0]
+        self.assertEqual(set(product['category_detail']), {'id', 'name', 'slug', 'icon'})
+        self.assertNotIn('tags', product)
+
+    def test_product_list_expand_tags_query_count(self):
+        response = self.assertPageWithinBudget('/api/products/', {'expand': 'tags'})
+        self.assertEqual(response.data['results'][0]['tags'][0]['name'], 'sale')
+
+    def test_search_page_query_count(self):
+        response = self.assertPageWithinBudget('/api/products/search/', {'page_size': 20})
+        self.assertEqual(len(response.data['data']['products']), 20)
+
+class ProductFacetTests(CatalogTestCase):
+    """Facet counts are computed in a fixed number of queries."""
+
+    # page queries + one conditional aggregate + one brand/category GROUP BY
+    MAX_QUERIES = 6
+
+    def setUp(self):
+        super().setUp()
+        get_category_tree()  # facet labels come from the cached tree
+
+    def test_product_list_facets(self):
+        response = self.assertPageWithinBudget('/api/products/', {'facets': 'true'})
+        facets = response.data['facets']
+        self.assertEqual(facets['total'], 25)
+        self.assertEqual(len(facets['brands']), 25)
+        self.assertEqual(len(facets['categories']), 25)
+        self.assertEqual(facets['price_ranges'][0]['count'], 25)
+        self.assertEqual(facets['availability'], {'in_stock': 25, 'out_of_stock': 0})
+
+    def test_facets_flag_is_parsed_like_search(self):
+        self.assertIn('facets', self.assertPageWithinBudget('/api/products/', {'facets': '1'}).data)
+        self.assertNotIn('facets', self.assertPageWithinBudget('/api/products/', {'facets': 'false'}).data)
+        self.assertEqual(self.client.get('/api/products/', {'facets': 'maybe'}).status_code, 400)
+
+    def test_search_facets_follow_filters(self):
+        brand = Brand.objects.get(name='Brand 3')
+        response = self.assertPageWithinBudget(
+            '/api/products/search/', {'facets': 'true', 'brand': str(brand.id)}
+        )
+        facets = response.data['data']['facets']
+        self.assertEqual(facets['total'], 1)
+        self.assertEqual(facets['brands'], [{'id': str(brand.id), 'name': 'Brand 3', 'count': 1}])
+
+class CategoryDetailTests(CatalogTestCase):
+    def get_detail(self, category):
+        get_category_tree()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/products/categories/{category.slug}/')
+        self.assertEqual(response.status_code, 200)
+        return response.data, len(queries)
+
+    def test_nested_children_render_in_a_constant_number_of_queries(self):
+        electronics = Category.objects.get(name='Electronics')
+        Category.objects.filter(parent=electronics).exclude(name='Category 7').update(sort_order=1)
+        invalidate_category_tree()  # update() skips the signals
+        data, three_levels = self.get_detail(electronics)
+
+        for subcategory in Category.objects.filter(name__startswith='Subcategory'):
+            Category.objects.create(name=f'Leaf {subcategory.name}', parent=subcategory)
+        data, four_levels = self.get_detail(electronics)
+
+        self.assertEqual(four_levels, three_levels)
+        names = [child['name'] for child in data['children']]
+        self.assertEqual(names, ['Category 7'] + sorted(f'Category {i}' for i in range(25) if i != 7))
+        leaf = data['children'][0]['children'][0]['children'][0]
+        self.assertEqual((leaf['name'], leaf['children']), ('Leaf Subcategory 7', []))
+
+class ProductKeysetPaginationTests(CatalogTestCase):
+    """Cursor pagination walks the whole catalog without COUNT or OFFSET."""
+
+    # products (with category/brand) + images + tag assignments
+    MAX_QUERIES = 3
+
+    def walk(self, url, params, results_key):
+        seen = []
+        cursor = ''
+        while cursor is not None:
+            response = self.assertPageWithinBudget(url, {**params, 'cursor': cursor})
+            body = response.data
+            if results_key == 'products':
+                body = {**body['data']['pagination'], 'results': body['data']['products']}
+            self.assertNotIn('OFFSET', ' '.join(self.captured_sql))
+            seen.extend(product['id'] for product in body['results'])
+            cursor = body['next_cursor']
+        return seen
+
+    def test_product_list_cursor_covers_every_product_once(self):
+        seen = self.walk('/api/products/', {'page_size': 10}, 'results')
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(len(set(seen)), 25)
+
+    def test_cursor_follows_sort_key_with_ties(self):
+        # Every product has the same price, so the primary key breaks ties.
+        seen = self.walk('/api/products/', {'page_size': 7, 'ordering': 'price'}, 'results')
+        self.assertEqual(len(set(seen)), 25)
+
+    def test_search_cursor(self):
+        seen = self.walk('/api/products/search/', {'page_size': 10, 'sort_by': 'name'}, 'products')
+        self.assertEqual(len(set(seen)), 25)
+
+    def test_previous_cursor_returns_prior_page(self):
+        first = self.client.get('/api/products/', {'page_size': 10, 'cursor': ''}).data
+        second = self.client.get('/api/products/', {'page_size': 10, 'cursor': first['next_cursor']}).data
+        back = self.client.get('/api/products/', {'page_size': 10, 'cursor': second['previous_cursor']}).data
+        self.assertEqual(
+            [p['id'] for p in back['results']], [p['id'] for p in first['results']]
+        )
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/products/', {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+        def cursor(position):
+            payload = json.dumps({'o': ['-created_at', '-pk'], 'p': position})
+            return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+        valid = self.client.get('/api/products/', {'cursor': '', 'page_size': 5}).data['next_cursor']
+        self.assertEqual(self.client.get('/api/products/', {'cursor': valid}).status_code, 200)
+        for position in [5, 'ab', ['yesterday', 'x'], [None, None], [[1], {}]]:
+            response = self.client.get('/api/products/', {'cursor': cursor(position)})
+            self.assertEqual(response.status_code, 404, position)
+
+class ProductSearchTests(CatalogTestCase):
+    """BM25 ranking, prefix expansion, AND semantics and index maintenance."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.vendor = Vendor.objects.get()
+
+        def create(name, description='', status='published'):
+            return Product.objects.create(
+                vendor=cls.vendor, name=name, description=description, price=Decimal('10.00'),
+                stock_quantity=5, status=status
+            )
+
+        cls.mouse = create('Wireless Mouse')
+        cls.pad = create('Mouse Pad')
+        cls.case = create('Padded Case')
+        cls.keyboard = create('Keyboard', description='Pairs with any mouse')
+        cls.draft = create('Wired Mouse', status='draft')
+
+    def setUp(self):
+        super().setUp()
+        search._backend = None
+
+    def ids(self, query, backend=None):
+        return [product_id for product_id, _ in (backend or search.get_search_backend()).search(query)]
+
+    def test_name_matches_outrank_description_matches(self):
+        ranked = self.ids('mouse')
+        self.assertEqual(set(ranked[:2]), {str(self.mouse.pk), str(self.pad.pk)})
+        self.assertEqual(ranked[2:], [str(self.keyboard.pk)])
+
+    def test_prefixes_expand_and_rank_below_exact_terms(self):
+        self.assertEqual(self.ids('wirel'), [str(self.mouse.pk)])
+        self.assertEqual(self.ids('pad'), [str(self.pad.pk), str(self.case.pk)])
+
+    def test_every_query_term_must_match(self):
+        self.assertEqual(self.ids('mouse pad'), [str(self.pad.pk)])
+        self.assertEqual(self.ids('wireless pad'), [])
+
+    def test_saves_and_deletes_update_the_index(self):
+        self.ids('mouse')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.draft.status = 'published'
+            self.draft.save()
+            self.pad.name = 'Desk Mat'
+            self.pad.save()
+            self.keyboard.delete()
+        # The changes are applied locally, not replayed from the change log
+        with CaptureQueriesContext(connection) as queries:
+            ranked = self.ids('mouse')
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(set(ranked), {str(self.mouse.pk), str(self.draft.pk)})
+        self.assertEqual(self.ids('desk'), [str(self.pad.pk)])
+
+    def test_bulk_publish_reindexes_and_reaches_other_processes(self):
+        other_worker = search.InvertedIndexSearchBackend()
+        self.assertEqual(self.ids('wired'), [])
+        self.assertEqual(self.ids('wired', other_worker), [])
+
+        self.client.force_authenticate(self.vendor.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/products/vendor/products/bulk-update/', {
+                'product_ids': [str(self.draft.pk)], 'action': 'publish'
+            }, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.ids('wired'), [str(self.draft.pk)])
+        # Replayed from the change log in the shared cache
+        self.assertEqual(self.ids('wired', other_worker), [str(self.draft.pk)])
+
+class ProductViewCounterTests(CatalogTestCase):
+    """Product page views are buffered and written in batches."""
+
+    def test_views_are_buffered_until_flush(self):
+        flush_view_counts()
+        product = Product.objects.get(name='Product 1')
+        other = APIClient(REMOTE_ADDR='10.0.0.2')
+        for client in (self.client, self.client, other):
+            response = client.get(f'/api/products/{product.slug}/')
+            self.assertEqual(response.status_code, 200)
+
+        product.refresh_from_db()
+        self.assertEqual(product.view_count, 0)
+
+        self.assertEqual(flush_view_counts(), 3)
+        product.refresh_from_db()
+        self.assertEqual(product.view_count, 3)
+        analytics = ProductAnalytics.objects.get(product=product)
+        self.assertEqual((analytics.views, analytics.unique_views), (3, 2))
+
+    def test_failed_flush_requeues_the_drained_views(self):
+        flush_view_counts()
+        product = Product.objects.get(name='Product 2')
+        self.client.get(f'/api/products/{product.slug}/')
+        with mock.patch('apps.products.view_counter.apply_view_counts', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                flush_view_counts()
+
+        self.assertEqual(flush_view_counts(), 1)
+        product.refresh_from_db()
+        self.assertEqual(product.view_count, 1)
+
+    def test_flush_command_needs_a_shared_counter(self):
+        with self.assertRaisesMessage(CommandError, 'shared PRODUCT_VIEW_COUNTER_BACKEND'):
+            call_command('flush_product_views', stdout=io.StringIO())
+
+    @override_settings(PRODUCT_VIEW_SEEN_LIMIT=2)
+    def test_seen_visitors_are_capped(self):
+        counter = LocalViewCounter()
+        for visitor in ('a', 'b', 'c', 'd', 'e'):
+            counter.record(1, visitor)
+        self.assertLessEqual(len(counter._seen), 2)
+        self.assertEqual(counter.drain()[(timezone.localdate().isoformat(), '1')], (5, 5))
+
+class ProductDetailCacheTests(CatalogTestCase):
+    """Product detail responses are cached and support conditional GET."""
+
+    def setUp(self):
+        super().setUp()
+        self.product = Product.objects.get(name='Product 2')
+        self.url = f'/api/products/{self.product.slug}/'
+
+    def test_repeat_view_is_served_from_cache(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.data['data']['tags'][0]['name'], 'sale')
+
+        with CaptureQueriesContext(connection) as queries:
+            cached = self.client.get(self.url)
+            not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(cached.data, first.data)
+        self.assertEqual(not_modified.status_code, 304)
+
+        since = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(since.status_code, 304)
+
+    def test_review_invalidates_cached_detail(self):
+        first = self.client.get(self.url)
+        reviewer = User.objects.create_user(
+            email='reviewer@example.com', password='password', first_name='Re', last_name='Viewer'
+        )
+        ProductReview.objects.create(product=self.product, user=reviewer, rating=5, comment='Great')
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        self.assertEqual(len(response.data['data']['reviews']), 1)
+
+    def test_several_workers_require_a_shared_cache(self):
+        with override_settings(WEB_CONCURRENCY=4):
+            self.assertEqual([error.id for error in check_shared_cache(None)], ['core.E001'])
+            with override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost:6379/3'
+            }}):
+                self.assertEqual(check_shared_cache(None), [])
+        self.assertEqual(check_shared_cache(None), [])
+
+class ProductReviewTests(CatalogTestCase):
+    """Detail embeds a bounded review summary; the full list is paginated."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.product = Product.objects.get(name='Product 4')
+        for i in range(12):
+            reviewer = User.objects.create_user(
+                email=f'reviewer{i}@example.com', password='password',
+                first_name='Re', last_name=f'Viewer {i}'
+            )
+            ProductReview.objects.create(
+                product=cls.product, user=reviewer, rating=i % 5 + 1,
+                comment='Review', helpful_count=i
+            )
+
+    def test_detail_embeds_top_reviews_and_histogram(self):
+        data = self.client.get(f'/api/products/{self.product.slug}/').data['data']
+        self.assertEqual(len(data['reviews']), 5)
+        self.assertEqual(data['reviews'][0]['helpful_count'], 11)
+        self.assertEqual(data['review_summary']['count'], 12)
+        self.assertEqual(data['review_summary']['histogram'], {'1': 3, '2': 3, '3': 2, '4': 2, '5': 2})
+
+    def test_review_list_cursor_pages(self):
+        url = f'/api/products/{self.product.id}/reviews/'
+        seen = []
+        cursor = ''
+        while cursor is not None:
+            with CaptureQueriesContext(connection) as queries:
+                body = self.client.get(url, {'cursor': cursor, 'page_size': 5, 'sort': 'helpful'}).data
+            # product lookup + one page of reviews joined to users
+            self.assertEqual(len(queries), 2)
+            seen.extend(review['helpful_count'] for review in body['results'])
+            cursor = body['next_cursor']
+        self.assertEqual(seen, list(range(11, -1, -1)))
+
+    def assertRatings(self, count, total, histogram, average):
+        product = Product.objects.get(pk=self.product.pk)
+        self.assertEqual((product.review_count, product.rating_sum), (count, total))
+        self.assertEqual(
+            [getattr(product, f'rating_{star}_count') for star in range(1, 6)], histogram
+        )
+        self.assertEqual(product.average_rating, Decimal(average))
+
+    def test_rating_aggregates_follow_review_writes(self):
+        self.assertRatings(12, 33, [3, 3, 2, 2, 2], '2.75')
+
+        review = ProductReview.objects.filter(product=self.product, rating=1).first()
+        review.rating = 5
+        review.save()
+        self.assertRatings(12, 37, [2, 3, 2, 2, 3], '3.08')
+
+        review.is_approved = False
+        review.save(update_fields=['is_approved'])
+        self.assertRatings(11, 32, [2, 3, 2, 2, 2], '2.91')
+
+        ProductReview.objects.filter(product=self.product, rating=2).first().delete()
+        self.assertRatings(10, 30, [2, 2, 2, 2, 2], '3.00')
+
+    def test_stale_copies_apply_a_review_change_once(self):
+        review = ProductReview.objects.filter(product=self.product, rating=1).first()
+        first, second = ProductReview.objects.get(pk=review.pk), ProductReview.objects.get(pk=review.pk)
+        for copy in (first, second):
+            copy.is_approved = False
+            copy.save()
+        self.assertRatings(11, 32, [2, 3, 2, 2, 2], '2.91')
+
+        # Deleting a copy loaded before an edit takes out the stored rating
+        stale = ProductReview.objects.filter(product=self.product, rating=2).first()
+        current = ProductReview.objects.get(pk=stale.pk)
+        current.rating = 5
+        current.save()
+        stale.delete()
+        self.assertRatings(10, 30, [2, 2, 2, 2, 2], '3.00')
+
+    def test_helpful_votes_are_deduplicated_per_user(self):
+        review = ProductReview.objects.get(product=self.product, helpful_count=0)
+        voter = User.objects.create_user(
+            email='voter@example.com', password='password', first_name='Vo', last_name='Ter'
+        )
+        self.client.force_authenticate(voter)
+        url = f'/api/products/reviews/{review.id}/helpful/'
+        version = product_stamps(self.product.pk, time.time())[0]
+
+        self.assertEqual(self.client.post(url, {'action': 'helpful'}).data['data'],
+                         {'helpful_count': 1, 'not_helpful_count': 0})
+        # Cached detail responses embed the most helpful reviews
+        self.assertNotEqual(product_stamps(self.product.pk, time.time())[0], version)
+        self.assertEqual(self.client.post(url, {'action': 'helpful'}).data['data'],
+                         {'helpful_count': 1, 'not_helpful_count': 0})
+        self.assertEqual(self.client.post(url, {'action': 'not_helpful'}).data['data'],
+                         {'helpful_count': 0, 'not_helpful_count': 1})
+
+        review.refresh_from_db()
+        self.assertAlmostEqual(review.helpfulness_score, wilson_lower_bound(0, 1))
+        self.assertEqual(review.rating, 1)
+
+    def test_helpfulness_ranking_prefers_confident_scores(self):
+        self.assertGreater(wilson_lower_bound(90, 100), wilson_lower_bound(2, 2))
+        self.assertEqual(wilson_lower_bound(0, 0), 0.0)
+
+    def test_reconcile_repairs_drift(self):
+        Product.objects.filter(pk=self.product.pk).update(
+            review_count=0, rating_sum=7, rating_3_count=9, average_rating=0
+        )
+        other = Product.objects.get(name='Product 5')
+        Product.objects.filter(pk=other.pk).update(review_count=4, average_rating=3)
+
+        self.assertEqual(reconcile_ratings(), 2)
+        self.assertRatings(12, 33, [3, 3, 2, 2, 2], '2.75')
+        other.refresh_from_db()
+        self.assertEqual((other.review_count, other.average_rating), (0, 0))
+        self.assertEqual(reconcile_ratings(), 0)
+
+@override_settings(PRODUCT_AUTOCOMPLETE_REBUILD_ASYNC=False)
+class AutocompleteTests(CatalogTestCase):
+    """Typo-tolerant suggestions are served from memory."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        vendor = Vendor.objects.get()
+        brand = Brand.objects.create(name='Samsung')
+        for name in ['Samsung Galaxy S23', 'Apple iPhone 15', 'Apple iPhone 15 Pro']:
+            Product.objects.create(
+                vendor=vendor, name=name, description='Phone', price=Decimal('999.00'),
+                stock_quantity=5, status='published', brand=brand if 'Samsung' in name else None
+            )
+
+    def setUp(self):
+        super().setUp()
+        discard_autocomplete_index()
+
+    def suggest(self, query):
+        response = self.client.get('/api/products/autocomplete/', {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return response.data['data']
+
+    def test_misspelled_and_partial_queries(self):
+        data = self.suggest('samsng')
+        self.assertEqual(data['products'][0]['name'], 'Samsung Galaxy S23')
+        self.assertEqual(data['brands'][0]['name'], 'Samsung')
+
+        data = self.suggest('apple iphon')
+        self.assertEqual(
+            {product['name'] for product in data['products']}, {'Apple iPhone 15', 'Apple iPhone 15 Pro'}
+        )
+
+    def test_warm_index_answers_without_queries(self):
+        self.suggest('galaxy')
+        with CaptureQueriesContext(connection) as queries:
+            data = self.suggest('galxy')
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(data['products'][0]['name'], 'Samsung Galaxy S23')
+
+    def test_each_kind_is_ranked_separately(self):
+        vendor = Vendor.objects.get()
+        for i in range(30):
+            Product.objects.create(
+                vendor=vendor, name=f'Samsung Phone {i}', description='Phone',
+                price=Decimal('99.00'), sales_count=100, status='published'
+            )
+        data = self.suggest('samsung')
+        self.assertEqual(len(data['products']), 8)
+        self.assertEqual([brand['name'] for brand in data['brands']], ['Samsung'])
+
+    def test_only_suggested_fields_mark_the_index_stale(self):
+        product = Product.objects.get(name='Samsung Galaxy S23')
+        version = cache.get(autocomplete.VERSION_KEY)
+        product.price = Decimal('899.00')
+        product.stock_quantity = 2
+        product.save()
+        self.assertEqual(cache.get(autocomplete.VERSION_KEY), version)
+
+        product.name = 'Samsung Galaxy S24'
+        product.save()
+        self.assertNotEqual(cache.get(autocomplete.VERSION_KEY), version)
+
+    def test_misses_are_recorded(self):
+        self.assertEqual(self.suggest('qwxzvb')['products'], [])
+        self.suggest('qwxzvb')
+        analytics = SearchAnalytics.objects.get(search_term='qwxzvb')
+        self.assertEqual((analytics.search_count, analytics.no_results), (2, True))
+
+@override_settings(PRODUCT_IMPORT_RUN_ASYNC=False, PRODUCT_IMPORT_CHUNK_SIZE=2, MEDIA_ROOT=tempfile.mkdtemp())
+class ProductImportExportTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.vendor = Vendor.objects.get()
+        self.client.force_authenticate(self.vendor.user)
+
+    def upload(self, name, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/products/vendor/products/import/', {
+                'file': SimpleUploadedFile(name, content.encode())
+            }, format='multipart')
+        self.assertEqual(response.status_code, 202)
+        return ProductImportJob.objects.get(pk=response.data['data']['id'])
+
+    def test_csv_import_creates_updates_and_reports_errors(self):
+        existing = Product.objects.get(name='Product 0')
+        job = self.upload('catalog.csv', (
+            'sku,name,description,price,brand,category,tags,stock_quantity\n'
+            f'{existing.sku},,,120.50,brand-1,,"new,sale",\n'
+            'NEW-1,Desk Lamp,A lamp,15.00,Brand 2,category-3,lighting,7\n'
+            'NEW-2,Missing price,No price,,,,,\n'
+            'NEW-3,Bad brand,Desc,5.00,no-such-brand,,,\n'
+            'NEW-1,Duplicate,Desc,5.00,,,,\n'
+        ))
+
+        self.assertEqual(job.status, 'completed')
+        self.assertEqual(
+            (job.processed_rows, job.created_count, job.updated_count, job.error_count), (5, 1, 1, 3)
+        )
+        self.assertEqual([error['line'] for error in job.errors], [4, 5, 6])
+
+        existing.refresh_from_db()
+        self.assertEqual((existing.name, existing.price), ('Product 0', Decimal('120.50')))
+        self.assertEqual(existing.brand.slug, 'brand-1')
+        self.assertEqual(
+            set(existing.tag_assignments.values_list('tag__name', flat=True)), {'new', 'sale'}
+        )
+        self.assertEqual(Brand.objects.get(slug='brand-0').published_product_count, 0)
+        self.assertEqual(Brand.objects.get(slug='brand-1').published_product_count, 2)
+
+        lamp = Product.objects.get(sku='NEW-1')
+        self.assertEqual((lamp.status, lamp.stock_quantity, lamp.category.slug), ('draft', 7, 'category-3'))
+
+    def test_export_round_trip(self):
+        response = self.client.get('/api/products/vendor/products/export/', {'file_format': 'jsonl'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 25)
+        self.assertEqual(json.loads(lines[0])['tags'], ['sale'])
+
+        response = self.client.get('/api/products/vendor/products/export/')
+        exported = b''.join(response.streaming_content).decode()
+        Product.objects.filter(vendor=self.vendor).update(price=Decimal('1.00'))
+
+        job = self.upload('catalog.csv', exported)
+        self.assertEqual((job.updated_count, job.error_count), (25, 0), job.errors)
+        self.assertFalse(Product.objects.exclude(price=Decimal('99.00')).exists())
+
+class ProductWriteTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = Product.objects.get(name='Product 0')
+        self.url = f'/api/products/vendor/products/{self.product.pk}/'
+        self.client.force_authenticate(self.product.vendor.user)
+
+    def test_tag_update_only_touches_the_difference(self):
+        kept = self.product.tag_assignments.get()
+        ProductTag.objects.create(name='New')
+
+        response = self.client.patch(self.url, {'tags': ['sale', 'new', 'featured']}, format='json')
+        self.assertEqual(response.status_code, 200)
+        assignments = {a.tag.name: a.pk for a in self.product.tag_assignments.select_related('tag')}
+        self.assertEqual(set(assignments), {'sale', 'New', 'featured'})
+        self.assertEqual(assignments['sale'], kept.pk)
+        self.assertEqual(ProductTag.objects.filter(slug='new').count(), 1)
+
+        self.client.patch(self.url, {'tags': ['featured']}, format='json')
+        self.assertEqual(
+            list(self.product.tag_assignments.values_list('pk', flat=True)), [assignments['featured']]
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.patch(self.url, {'tags': ['featured']}, format='json')
+        self.assertFalse([q for q in queries.captured_queries if q['sql'].startswith(('INSERT', 'DELETE'))])
+
+    def test_saving_a_deferred_copy_writes_only_loaded_fields(self):
+        product = Product.objects.only('name', 'slug', 'sku').get(pk=self.product.pk)
+        Product.objects.filter(pk=product.pk).update(description='Changed meanwhile')
+        product.name = 'Renamed'
+        with CaptureQueriesContext(connection) as queries:
+            product.save()
+        self.assertEqual(len(queries), 1, [q['sql'] for q in queries.captured_queries])
+        self.assertNotIn('description', queries.captured_queries[0]['sql'])
+
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.name, self.product.description), ('Renamed', 'Changed meanwhile'))
+
+    def test_image_update_reorders_without_recreating(self):
+        first, second = self.product.images.order_by('sort_order')
+        response = self.client.patch(self.url, {
+            'images': [{'id': str(second.pk), 'alt_text': 'Back'}, {'id': str(first.pk)}]
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(self.product.images.values_list('pk', 'is_primary', 'alt_text')),
+            [(second.pk, True, 'Back'), (first.pk, False, '')]
+        )
+
+        self.client.patch(self.url, {'images': [{'id': str(first.pk)}]}, format='json')
+        self.assertEqual(list(self.product.images.values_list('pk', 'is_primary')), [(first.pk, True)])
+
+        other = Product.objects.get(name='Product 1').images.first()
+        response = self.client.patch(self.url, {'images': [{'id': str(other.pk)}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+@override_settings(PRODUCT_IMAGE_RENDITIONS_ASYNC=False, MEDIA_ROOT=tempfile.mkdtemp())
+class ProductImageRenditionTests(CatalogTestCase):
+    def png(self, size=(1200, 800)):
+        buffer = io.BytesIO()
+        Image.new('RGBA', size, (200, 30, 30, 128)).save(buffer, 'PNG')
+        return SimpleUploadedFile('photo.png', buffer.getvalue(), content_type='image/png')
+
+    def test_upload_renders_sized_renditions(self):
+        product = Product.objects.get(name='Product 0')
+        self.client.force_authenticate(product.vendor.user)
+        url = f'/api/products/vendor/products/{product.pk}/images/'
+
+        response = self.client.post(url, {'images': [SimpleUploadedFile(
+            'fake.png', b'not an image', content_type='image/png'
+        )]}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {'images': [self.png()]}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+
+        image = ProductImage.objects.get(pk=response.data['data'][0]['id'])
+        self.assertEqual(image.rendition_status, 'ready')
+        self.assertEqual(set(image.renditions), {'small', 'medium', 'large'})
+        with Image.open(image.image.storage.open(image.renditions['medium']['webp'])) as medium:
+            self.assertEqual((medium.format, medium.size), ('WEBP', (300, 200)))
+        with Image.open(image.image.storage.open(image.renditions['small']['jpeg'])) as small:
+            self.assertEqual((small.format, small.size), ('JPEG', (150, 100)))
+
+        data = ProductListSerializer(image.product).data['images']
+        rendered = next(item for item in data if item['id'] == str(image.pk))
+        self.assertTrue(rendered['url'].endswith('_medium.webp'))
+        pending = next(item for item in data if item['id'] != str(image.pk))
+        self.assertEqual(pending['url'], pending['image'])
+
+    def test_multi_image_upload_is_one_insert(self):
+        product = Product.objects.get(name='Product 1')
+        self.client.force_authenticate(product.vendor.user)
+        files = [self.png((64, 64)) for _ in range(4)]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                f'/api/products/vendor/products/{product.pk}/images/', {'images': files}, format='multipart'
+            )
+        self.assertEqual(response.status_code, 201)
+        inserts = [q for q in queries.captured_queries if q['sql'].startswith('INSERT INTO "product_images"')]
+        self.assertEqual(len(inserts), 1)
+
+        images = list(product.images.values_list('image', 'sort_order', 'is_primary'))
+        self.assertEqual([order for _, order, _ in images], [0, 1, 2, 3, 4, 5])
+        self.assertEqual(sum(primary for _, _, primary in images), 1)
+        self.assertEqual(len({name for name, _, _ in images}), 6)
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class MediaGarbageCollectorTests(CatalogTestCase):
+    def write(self, name, age_hours):
+        name = default_storage.save(name, ContentFile(b'data'))
+        stamp = time.time() - age_hours * 3600
+        os.utime(default_storage.path(name), (stamp, stamp))
+        return name
+
+    def test_deletes_only_old_unreferenced_files(self):
+        product = Product.objects.get(name='Product 0')
+        kept = self.write('products/kept.png', 48)
+        rendition = self.write('products/renditions/kept_small.webp', 48)
+        ProductImage.objects.create(
+            product=product, image=kept, renditions={'small': {'webp': rendition}}
+        )
+        Brand.objects.filter(name='Brand 0').update(logo=self.write('brands/logo.png', 48))
+        orphans = [self.write('products/old.png', 48), self.write('vendors/logos/old.png', 48)]
+        recent = self.write('products/recent.png', 1)
+        unmanaged = self.write('product_imports/old.csv', 48)
+
+        stats = MediaGarbageCollector(dry_run=True).run()
+        self.assertEqual((stats['orphaned'], stats['recent'], stats['deleted']), (2, 1, 0))
+
+        stats = MediaGarbageCollector(workers=2).run()
+        self.assertEqual(stats['deleted'], 2)
+        for name in orphans:
+            self.assertFalse(default_storage.exists(name))
+        for name in [kept, rendition, 'brands/logo.png', recent, unmanaged]:
+            self.assertTrue(default_storage.exists(name), name)
+
+class VariationMatrixTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = Product.objects.get(name='Product 0')
+        self.client.force_authenticate(self.product.vendor.user)
+        for name in ['Color', 'Size']:
+            ProductAttribute.objects.create(name=name)
+
+    def generate(self, attributes, **extra):
+        return self.client.post(
+            f'/api/products/vendor/products/{self.product.pk}/variations/generate/',
+            {'attributes': attributes, **extra}, format='json'
+        )
+
+    def test_generate_cartesian_product_and_resolve_matrix(self):
+        ProductAttributeValue.objects.create(attribute=ProductAttribute.objects.get(name='Size'), value='S')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.generate({'Color': ['Red', 'Blue'], 'Size': ['S', 'M', 'L']}, stock_quantity=4)
+        self.assertEqual(response.status_code, 201)
+        inserts = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 3, inserts)
+
+        matrix = response.data['data']
+        self.assertEqual([a['name'] for a in matrix['attributes']], ['Color', 'Size'])
+        self.assertEqual(len(matrix['variations']), 6)
+        colors = [v['value'] for v in matrix['attributes'][0]['values']]
+        sizes = [v['value'] for v in matrix['attributes'][1]['values']]
+        red_m = matrix['variations'][f"{colors.index('Red')}:{sizes.index('M')}"]
+        self.assertEqual((red_m['price'], red_m['stock_quantity']), ('99.00', 4))
+        self.assertEqual(sum(v['is_default'] for v in matrix['variations'].values()), 1)
+
+        response = self.generate({'Color': ['Red', 'Green'], 'Size': ['S']})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['data']['variations']), 7)
+
+        self.assertEqual(self.generate({'Material': ['Wool']}).status_code, 400)
+
+    def test_skus_follow_the_attribute_values(self):
+        ProductVariation.objects.create(product=self.product, sku=f'{self.product.sku}-BLUE-S', price=Decimal('99.00'))
+        self.assertEqual(self.generate({'Color': ['Red', 'Blue', 'blue!'], 'Size': ['S']}).status_code, 201)
+
+        skus = set(self.product.variations.values_list('sku', flat=True))
+        self.assertEqual(len(skus), 4)
+        self.assertIn(f'{self.product.sku}-RED-S', skus)
+        self.assertEqual(len([sku for sku in skus if sku.startswith(f'{self.product.sku}-BLUE')]), 1)
+
+    def test_matrix_is_cached_until_a_variation_changes(self):
+        self.generate({'Color': ['Red'], 'Size': ['S']})
+        url = f'/api/products/{self.product.pk}/variation-matrix/'
+
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(url).data['data']
+        self.assertEqual(len(queries), 1)  # the published-product check only
+        self.assertEqual(data['variations']['0:0']['stock_quantity'], 0)
+
+        variation = self.product.variations.get()
+        variation.stock_quantity = 9
+        variation.save()
+        self.assertEqual(self.client.get(url).data['data']['variations']['0:0']['stock_quantity'], 9)
+
+@override_settings(PRODUCT_STOCK_NOTIFICATIONS_ASYNC=False)
+class StockMaintenanceTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = Product.objects.get(name='Product 0')
+
+    def test_variation_stock_rolls_up_into_product(self):
+        self.assertEqual((self.product.available_quantity, self.product.stock_status), (10, 'in_stock'))
+        first = ProductVariation.objects.create(product=self.product, sku='V-1', price=Decimal('99.00'), stock_quantity=0)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.available_quantity, self.product.stock_status), (0, 'out_of_stock'))
+
+        stale = Product.objects.get(pk=self.product.pk)
+        first.stock_quantity = 3
+        first.save()
+        ProductVariation.objects.create(product=self.product, sku='V-2', price=Decimal('99.00'), stock_quantity=4)
+
+        # A save of a copy loaded before the variation writes keeps the rollup
+        stale.name = 'Renamed'
+        stale.save()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.name, 'Renamed')
+        self.assertEqual((self.product.available_quantity, self.product.stock_status), (7, 'in_stock'))
+        self.assertFalse(Product.objects.filter(stock_status='out_of_stock').exists())
+
+    def test_stock_transitions_send_notifications(self):
+        from apps.notifications.models import Notification
+
+        shopper = User.objects.create_user(
+            email='shopper@example.com', password='password', first_name='Shop', last_name='Per'
+        )
+        Wishlist.objects.create(user=shopper, product=self.product)
+        self.product.stock_quantity = 0
+        self.product.save()
+        self.assertFalse(Notification.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.stock_quantity = 8
+            self.product.save()
+        self.assertEqual(
+            list(Notification.objects.filter(user=shopper).values_list('title', flat=True)),
+            ['Product Back in Stock!']
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.stock_quantity = 2
+            self.product.save()
+        alert = Notification.objects.get(user=self.product.vendor.user)
+        self.assertEqual(alert.data['available_quantity'], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.stock_quantity = 1
+            self.product.save()
+        self.assertEqual(Notification.objects.count(), 2)
+
+class CatalogCounterTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = Product.objects.get(name='Product 0')
+        self.category, self.brand = self.product.category, self.product.brand
+
+    def assertCounts(self, category, brand):
+        self.category.refresh_from_db()
+        self.brand.refresh_from_db()
+        self.assertEqual(
+            (self.category.published_product_count, self.brand.published_product_count), (category, brand)
+        )
+
+    def test_publish_and_unpublish(self):
+        self.assertCounts(1, 1)
+        self.product.status = 'draft'
+        self.product.save()
+        self.assertCounts(0, 0)
+
+        # A copy loaded before the unpublish must not count the product twice
+        stale = Product.objects.get(pk=self.product.pk)
+        stale.status = 'published'
+        stale.save()
+        self.product.status = 'published'
+        self.product.save()
+        self.assertCounts(1, 1)
+
+    def test_move_and_delete(self):
+        other = Category.objects.get(name='Category 1')
+        self.product.category = other
+        self.product.save()
+        self.assertCounts(0, 1)
+        other.refresh_from_db()
+        self.assertEqual(other.published_product_count, 2)
+
+        self.product.delete()
+        self.assertCounts(0, 0)
+        other.refresh_from_db()
+        self.assertEqual(other.published_product_count, 1)
+
+    def test_deleting_a_stale_copy_releases_the_stored_slots(self):
+        stale = Product.objects.get(pk=self.product.pk)
+        other = Category.objects.get(name='Category 1')
+        self.product.category = other
+        self.product.save()
+        stale.delete()
+        self.assertCounts(0, 0)
+        other.refresh_from_db()
+        self.assertEqual(other.published_product_count, 1)
+
+    def test_rebuild_command_verifies_and_repairs(self):
+        Category.objects.filter(pk=self.category.pk).update(published_product_count=5)
+        out = io.StringIO()
+        call_command('rebuild_product_counts', '--verify', stdout=out)
+        self.assertIn(f'Category {self.category.name}: 5 -> 1', out.getvalue())
+        self.assertIn('Found 1 stale counters', out.getvalue())
+        self.assertCounts(5, 1)
+
+        call_command('rebuild_product_counts', stdout=io.StringIO())
+        self.assertCounts(1, 1)
+
+class IndexAuditTests(TransactionTestCase):
+    def test_hot_queries_are_served_by_indexes(self):
+        out = io.StringIO()
+        call_command('audit_indexes', '--fail-on-issues', stdout=out)
+        self.assertIn('served by indexes', out.getvalue())
+
+    def test_compare_shows_plans_without_the_new_indexes(self):
+        shapes = get_query_shapes()
+        listing = [shapes['product_list_newest'], shapes['product_list_price']]
+
+        before, missing = audit_without_indexes([shape.expect_index for shape in listing], listing)
+        self.assertEqual(missing, [])
+        self.assertTrue(all(report.sorts for report in before))
+
+        after = audit(listing)
+        self.assertTrue(all(report.ok and report.uses_expected_index for report in after))
+
+    def test_compare_needs_transactional_ddl(self):
+        with mock.patch.object(connection.features, 'can_rollback_ddl', False):
+            with self.assertRaises(IndexComparisonUnsupported):
+                audit_without_indexes([], [])
+            with self.assertRaisesMessage(CommandError, 'cannot roll back DROP INDEX'):
+                call_command('audit_indexes', '--compare', '--i-know-this-locks', stdout=io.StringIO())
+
+    def test_compare_refuses_to_lock_tables_by_default(self):
+        with self.assertRaisesMessage(CommandError, '--i-know-this-locks'):
+            call_command('audit_indexes', '--compare', stdout=io.StringIO())
+        out = io.StringIO()
+        call_command('audit_indexes', '--compare', '--i-know-this-locks', '--shape', 'product_list_newest', stdout=out)
+        self.assertIn('before', out.getvalue())
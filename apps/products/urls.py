@@ -16,24 +16,32 @@ urlpatterns = [
     
     # Products - Public
     path('', views.ProductListView.as_view(), name='product_list'),
-    path('<slug:slug>/', views.ProductDetailView.as_view(), name='product_detail'),
     path('search/', views.search_products, name='product_search'),
+    path('autocomplete/', views.autocomplete, name='product_autocomplete'),
+    path('<slug:slug>/', views.ProductDetailView.as_view(), name='product_detail'),
     
     # Products - Vendor Management
     path('vendor/products/', views.VendorProductListView.as_view(), name='vendor_product_list'),
     path('vendor/products/<uuid:pk>/', views.VendorProductDetailView.as_view(), name='vendor_product_detail'),
     path('vendor/products/<uuid:product_id>/images/', views.upload_product_images, name='upload_product_images'),
     path('vendor/products/bulk-update/', views.bulk_product_update, name='bulk_product_update'),
+    path('vendor/products/import/', views.import_products, name='import_products'),
+    path('vendor/products/import/<uuid:job_id>/', views.product_import_status, name='product_import_status'),
+    path('vendor/products/export/', views.export_products, name='export_products'),
     path('vendor/products/stats/', views.vendor_product_stats, name='vendor_product_stats'),
     
     # Product Variations
     path('vendor/products/<uuid:product_id>/variations/', views.ProductVariationListView.as_view(), name='product_variation_list'),
+    path('vendor/products/<uuid:product_id>/variations/generate/', views.generate_product_variations, name='generate_product_variations'),
     path('vendor/products/<uuid:product_id>/variations/<uuid:pk>/', views.ProductVariationDetailView.as_view(), name='product_variation_detail'),
     
     # Product Attributes
     path('attributes/', views.ProductAttributeListView.as_view(), name='attribute_list'),
     path('attributes/<uuid:pk>/', views.ProductAttributeDetailView.as_view(), name='attribute_detail'),
     
+    # Product Variations - Public
+    path('<uuid:product_id>/variation-matrix/', views.product_variation_matrix, name='product_variation_matrix'),
+    
     # Product Reviews
     path('<uuid:product_id>/reviews/', views.ProductReviewListView.as_view(), name='product_review_list'),
     path('reviews/<uuid:review_id>/helpful/', views.mark_review_helpful, name='mark_review_helpful'),
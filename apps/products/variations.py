@@ -0,0 +1,199 @@
+# apps/products/variations.py
+import hashlib
+import time
+from collections import Counter
+from itertools import product as cartesian
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.text import slugify
+
+from .detail_cache import bump_product_version, product_stamps
+from .stock import refresh_stock
+
+MATRIX_KEY = 'products:variation_matrix:%s'
+
+def resolve_attribute_values(values_by_attribute):
+    """
+    Resolve {attribute name: [value, ...]} to attribute and value objects.
+
+    Attributes are looked up with one query; values with one more, after
+    missing values are created in a single bulk_create. Returns
+    ({name: attribute}, {(attribute_id, value): value_obj}, missing_names).
+    """
+    from .models import ProductAttribute, ProductAttributeValue
+
+    names = list(values_by_attribute)
+    attributes = {attribute.name: attribute for attribute in ProductAttribute.objects.filter(name__in=names)}
+    missing = [name for name in names if name not in attributes]
+    if missing:
+        return attributes, {}, missing
+
+    wanted = {
+        (attributes[name].pk, value)
+        for name, values in values_by_attribute.items() for value in values
+    }
+    attribute_ids = {attribute_id for attribute_id, _ in wanted}
+    lookup = {'attribute_id__in': attribute_ids, 'value__in': {value for _, value in wanted}}
+
+    values = {(v.attribute_id, v.value): v for v in ProductAttributeValue.objects.filter(**lookup)}
+    new = [key for key in wanted if key not in values]
+    if new:
+        ProductAttributeValue.objects.bulk_create([
+            ProductAttributeValue(attribute_id=attribute_id, value=value) for attribute_id, value in new
+        ], ignore_conflicts=True)
+        values = {(v.attribute_id, v.value): v for v in ProductAttributeValue.objects.filter(**lookup)}
+    return attributes, values, []
+
+def _variation_rows(product_id):
+    from .models import ProductVariationAttribute
+
+    return ProductVariationAttribute.objects.filter(variation__product_id=product_id).values_list(
+        'variation_id', 'variation__sku', 'variation__price', 'variation__compare_price',
+        'variation__stock_quantity', 'variation__is_active', 'variation__is_default',
+        'attribute_id', 'attribute__name', 'attribute__slug',
+        'value_id', 'value__value', 'value__color_code', 'value__sort_order',
+    )
+
+def build_variation_matrix(product_id):
+    """
+    Build the attribute-combination index of a product in a single query.
+
+    Returns a compact payload::
+
+        {'attributes': [{'id', 'name', 'slug', 'values': [{'id', 'value', 'color_code'}]}],
+         'variations': {'0:1': {'id', 'sku', 'price', 'compare_price', 'stock_quantity', 'is_default'}}}
+
+    Variation keys join, in `attributes` order, the index of the selected
+    value within each attribute's `values`; '*' marks an attribute the
+    variation does not set. Only active variations are listed.
+    """
+    attributes = {}
+    variations = {}
+    for (variation_id, sku, price, compare_price, stock, is_active, is_default,
+         attribute_id, attribute_name, attribute_slug,
+         value_id, value, color_code, value_order) in _variation_rows(product_id):
+        if not is_active:
+            continue
+        attribute = attributes.setdefault(attribute_id, {
+            'id': str(attribute_id), 'name': attribute_name, 'slug': attribute_slug, 'values': {}
+        })
+        attribute['values'][value_id] = (value_order, value, {
+            'id': str(value_id), 'value': value, 'color_code': color_code
+        })
+        variation = variations.setdefault(variation_id, {
+            'id': str(variation_id), 'sku': sku, 'price': str(price),
+            'compare_price': str(compare_price) if compare_price is not None else None,
+            'stock_quantity': stock, 'is_default': is_default, 'selection': {}
+        })
+        variation['selection'][attribute_id] = value_id
+
+    ordered = sorted(attributes.items(), key=lambda item: item[1]['name'])
+    positions = []
+    for attribute_id, attribute in ordered:
+        values = sorted(attribute['values'].items(), key=lambda item: item[1][:2])
+        positions.append((attribute_id, {value_id: index for index, (value_id, _) in enumerate(values)}))
+        attribute['values'] = [payload for _, (_, _, payload) in values]
+
+    matrix = {}
+    for variation in variations.values():
+        selection = variation.pop('selection')
+        key = ':'.join(
+            str(index[selection[attribute_id]]) if attribute_id in selection else '*'
+            for attribute_id, index in positions
+        )
+        matrix[key] = variation
+    return {'attributes': [attribute for _, attribute in ordered], 'variations': matrix}
+
+def get_variation_matrix(product_id):
+    """Return the variation matrix, cached until the product version changes."""
+    key = MATRIX_KEY % product_id
+    stamps = product_stamps(product_id, time.time())
+    cached = cache.get(key)
+    if cached is not None and cached['stamps'] == stamps:
+        return cached['data']
+    data = build_variation_matrix(product_id)
+    # Stamps were read before building, so a concurrent change makes this
+    # entry stale on the next read rather than hiding the change.
+    cache.set(key, {'stamps': stamps, 'data': data}, getattr(settings, 'PRODUCT_DETAIL_CACHE_TIMEOUT', 60 * 60))
+    return data
+
+def _combination_digest(combination):
+    raw = ':'.join(sorted(str(value.pk) for value in combination))
+    return hashlib.blake2b(raw.encode('utf-8'), digest_size=4).hexdigest().upper()
+
+def variation_sku(product_sku, combination):
+    """
+    SKU of a generated variation, derived from its attribute values
+    ('SKU1A2B3C4D-RED-XL'), so generating twice yields the same SKUs.
+    """
+    parts = [slugify(value.value).upper() or _combination_digest([value]) for value in combination]
+    sku = '-'.join([product_sku, *parts])
+    if len(sku) > 100:
+        sku = f'{product_sku[:91]}-{_combination_digest(combination)}'
+    return sku
+
+def generate_variations(product, values_by_attribute, defaults):
+    """
+    Create a variation for every combination of the given attribute values.
+
+    Combinations the product already has are skipped. SKUs come from
+    variation_sku(); one already used, or shared within the batch, gets the
+    combination's digest instead. Variations and their attribute links are
+    inserted with two bulk_create calls. Returns
+    (created_count, skipped_count, missing_attribute_names).
+    """
+    from .models import ProductVariation, ProductVariationAttribute
+
+    with transaction.atomic():
+        attributes, values, missing = resolve_attribute_values(values_by_attribute)
+        if missing:
+            return 0, 0, missing
+
+        existing = {}
+        for row in _variation_rows(product.pk):
+            existing.setdefault(row[0], set()).add(row[10])
+        existing = {frozenset(value_ids) for value_ids in existing.values()}
+        has_default = ProductVariation.objects.filter(product=product, is_default=True).exists()
+
+        axes = [
+            [values[(attributes[name].pk, value)] for value in dict.fromkeys(names)]
+            for name, names in values_by_attribute.items()
+        ]
+        combinations = []
+        skipped = 0
+        for combination in cartesian(*axes):
+            if frozenset(value.pk for value in combination) in existing:
+                skipped += 1
+            else:
+                combinations.append((combination, variation_sku(product.sku, combination)))
+        # Values that slugify alike ('XL', 'xl') would share a SKU too
+        taken = {sku for sku, count in Counter(sku for _, sku in combinations).items() if count > 1}
+        taken.update(ProductVariation.objects.filter(
+            sku__in=[sku for _, sku in combinations]
+        ).values_list('sku', flat=True))
+
+        variations, links = [], []
+        for combination, sku in combinations:
+            if sku in taken:
+                sku = f'{product.sku[:91]}-{_combination_digest(combination)}'
+            variation = ProductVariation(
+                product=product,
+                sku=sku,
+                is_default=not has_default and not variations,
+                **defaults
+            )
+            variations.append(variation)
+            links.extend(
+                ProductVariationAttribute(variation=variation, attribute_id=value.attribute_id, value=value)
+                for value in combination
+            )
+        ProductVariation.objects.bulk_create(variations)
+        ProductVariationAttribute.objects.bulk_create(links)
+        if variations:
+            # bulk_create bypasses the signals that bump the product version
+            # and roll variation stock up into the product
+            bump_product_version(product.pk)
+            refresh_stock([product.pk])
+    return len(variations), skipped, []
@@ -0,0 +1,279 @@
+# apps/products/view_counter.py
+import atexit
+import hashlib
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+def visitor_key(request):
+    """Stable, anonymised identifier for unique-view counting."""
+    from core.utils import get_client_ip
+
+    if request.user.is_authenticated:
+        raw = f'user:{request.user.pk}'
+    else:
+        raw = f"anon:{get_client_ip(request)}:{request.META.get('HTTP_USER_AGENT', '')}"
+    return hashlib.blake2b(raw.encode('utf-8'), digest_size=8).hexdigest()
+
+class BaseViewCounter:
+    """Interface for product view buffers."""
+
+    def __init__(self):
+        self.flush_interval = getattr(settings, 'PRODUCT_VIEW_FLUSH_INTERVAL', 30)
+
+    def record(self, product_id, visitor):
+        """Buffer one view of a product."""
+        raise NotImplementedError
+
+    def drain(self):
+        """
+        Atomically take the buffered counts.
+
+        Returns {(date_iso, product_id): (views, unique_views)}.
+        """
+        raise NotImplementedError
+
+    def requeue(self, drained):
+        """Put counts taken by drain() back, e.g. after a failed write."""
+        raise NotImplementedError
+
+    def should_flush(self):
+        """Return True when this caller should flush the buffer now."""
+        raise NotImplementedError
+
+class LocalViewCounter(BaseViewCounter):
+    """
+    In-process buffer. Each worker flushes its own counts; unique visitors are
+    tracked per process, so unique_views is an upper bound with many workers.
+    The set of visitors seen today holds at most PRODUCT_VIEW_SEEN_LIMIT
+    entries; past that it starts over, which can count a visitor twice.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.seen_limit = getattr(settings, 'PRODUCT_VIEW_SEEN_LIMIT', 100000)
+        self._lock = threading.Lock()
+        self._pending = defaultdict(lambda: [0, 0])
+        self._seen_date = None
+        self._seen = set()
+        self._last_flush = time.monotonic()
+
+    def record(self, product_id, visitor):
+        today = timezone.localdate().isoformat()
+        key = (today, str(product_id))
+        with self._lock:
+            if self._seen_date != today or len(self._seen) >= self.seen_limit:
+                self._seen_date = today
+                self._seen = set()
+            counts = self._pending[key]
+            counts[0] += 1
+            if (key[1], visitor) not in self._seen:
+                self._seen.add((key[1], visitor))
+                counts[1] += 1
+
+    def drain(self):
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(lambda: [0, 0])
+        return {key: tuple(counts) for key, counts in pending.items()}
+
+    def requeue(self, drained):
+        with self._lock:
+            for key, (views, uniques) in drained.items():
+                counts = self._pending[key]
+                counts[0] += views
+                counts[1] += uniques
+
+    def should_flush(self):
+        now = time.monotonic()
+        with self._lock:
+            if not self._pending or now - self._last_flush < self.flush_interval:
+                return False
+            self._last_flush = now
+            return True
+
+class RedisViewCounter(BaseViewCounter):
+    """
+    Redis-backed buffer shared by all workers. Unique visitors are tracked in
+    a per-product daily set; draining renames the pending hashes so increments
+    that arrive during a flush land in the next batch.
+    """
+    views_key = 'products:views:pending'
+    unique_key = 'products:views:unique_pending'
+    seen_key = 'products:views:seen:%s:%s'
+    lock_key = 'products:views:flush_lock'
+    seen_timeout = 60 * 60 * 48
+
+    def __init__(self):
+        super().__init__()
+        import redis
+
+        self.client = redis.Redis.from_url(settings.PRODUCT_VIEW_COUNTER_REDIS_URL)
+        self.response_error = redis.exceptions.ResponseError
+
+    def record(self, product_id, visitor):
+        today = timezone.localdate().isoformat()
+        field = f'{today}:{product_id}'
+        seen_key = self.seen_key % (today, product_id)
+
+        pipe = self.client.pipeline()
+        pipe.hincrby(self.views_key, field, 1)
+        pipe.sadd(seen_key, visitor)
+        pipe.expire(seen_key, self.seen_timeout)
+        _, added, _ = pipe.execute()
+        if added:
+            self.client.hincrby(self.unique_key, field, 1)
+
+    def _take(self, key):
+        batch_key = f'{key}:flushing'
+        try:
+            self.client.rename(key, batch_key)
+        except self.response_error:
+            return {}  # nothing buffered
+        pipe = self.client.pipeline()
+        pipe.hgetall(batch_key)
+        pipe.delete(batch_key)
+        values, _ = pipe.execute()
+        return {field.decode(): int(value) for field, value in values.items()}
+
+    def drain(self):
+        views = self._take(self.views_key)
+        uniques = self._take(self.unique_key)
+        drained = {}
+        for field in set(views) | set(uniques):
+            date_iso, product_id = field.split(':', 1)
+            drained[(date_iso, product_id)] = (views.get(field, 0), uniques.get(field, 0))
+        return drained
+
+    def requeue(self, drained):
+        pipe = self.client.pipeline()
+        for (date_iso, product_id), (views, uniques) in drained.items():
+            field = f'{date_iso}:{product_id}'
+            if views:
+                pipe.hincrby(self.views_key, field, views)
+            if uniques:
+                pipe.hincrby(self.unique_key, field, uniques)
+        pipe.execute()
+
+    def should_flush(self):
+        # One worker per interval wins the flush.
+        return bool(self.client.set(self.lock_key, 1, nx=True, ex=self.flush_interval))
+
+_counter = None
+_counter_lock = threading.Lock()
+
+def get_view_counter():
+    """Return the configured view counter backend (process-wide singleton)."""
+    global _counter
+    if _counter is None:
+        with _counter_lock:
+            if _counter is None:
+                backend_path = getattr(
+                    settings, 'PRODUCT_VIEW_COUNTER_BACKEND',
+                    'apps.products.view_counter.LocalViewCounter'
+                )
+                _counter = import_string(backend_path)()
+                atexit.register(_flush_at_exit)
+    return _counter
+
+def _group_by_delta(deltas):
+    groups = defaultdict(list)
+    for key, delta in deltas.items():
+        groups[delta].append(key)
+    return groups
+
+def apply_view_counts(drained):
+    """
+    Write drained view counts with one UPDATE per distinct delta, for both
+    Product.view_count and the day's ProductAnalytics rows.
+    """
+    from apps.analytics.models import ProductAnalytics
+    from .models import Product
+
+    if not drained:
+        return 0
+
+    product_views = defaultdict(int)
+    for (_, product_id), (views, _) in drained.items():
+        product_views[product_id] += views
+    existing = {
+        str(pk) for pk in Product.objects.filter(id__in=list(product_views)).values_list('id', flat=True)
+    }
+    drained = {key: counts for key, counts in drained.items() if key[1] in existing}
+
+    with transaction.atomic():
+        for delta, product_ids in _group_by_delta(
+            {pk: views for pk, views in product_views.items() if pk in existing and views}
+        ).items():
+            Product.objects.filter(id__in=product_ids).update(view_count=F('view_count') + delta)
+
+        ProductAnalytics.objects.bulk_create(
+            [ProductAnalytics(product_id=product_id, date=date_iso) for date_iso, product_id in drained],
+            ignore_conflicts=True
+        )
+        for date_iso in {date_iso for date_iso, _ in drained}:
+            day = {pk: counts for (d, pk), counts in drained.items() if d == date_iso}
+            for (views, uniques), product_ids in _group_by_delta(day).items():
+                ProductAnalytics.objects.filter(date=date_iso, product_id__in=product_ids).update(
+                    views=F('views') + views,
+                    unique_views=F('unique_views') + uniques
+                )
+
+    return sum(views for views, _ in drained.values())
+
+def flush_view_counts():
+    """
+    Drain the buffer and persist it. Returns the number of views written.
+
+    If the write fails the drained counts are put back into the buffer for
+    the next flush and the error is re-raised.
+    """
+    counter = get_view_counter()
+    drained = counter.drain()
+    try:
+        return apply_view_counts(drained)
+    except Exception:
+        counter.requeue(drained)
+        raise
+
+def _flush_in_thread():
+    try:
+        flush_view_counts()
+    except Exception:
+        # The drained counts were requeued for the next flush.
+        logger.exception('Failed to flush product views')
+    finally:
+        connection.close()
+
+def record_product_view(request, product_id):
+    """
+    Buffer a product view and flush the buffer when the interval elapses.
+
+    The flush runs in a background thread unless PRODUCT_VIEW_FLUSH_ASYNC is
+    False, so its writes stay off the product page.
+    """
+    counter = get_view_counter()
+    try:
+        counter.record(product_id, visitor_key(request))
+        if counter.should_flush():
+            if getattr(settings, 'PRODUCT_VIEW_FLUSH_ASYNC', True):
+                threading.Thread(target=_flush_in_thread, daemon=True).start()
+            else:
+                flush_view_counts()
+    except Exception:
+        # View counting must never break the product page.
+        logger.exception('Failed to record product view')
+
+def _flush_at_exit():
+    try:
+        flush_view_counts()
+    except Exception:
+        logger.exception('Failed to flush product views at exit')
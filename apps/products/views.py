@@ -1,15 +1,18 @@
 # apps/products/views.py
 from rest_framework import generics, permissions, status, filters
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.fields import empty
 from rest_framework.response import Response
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from django.db.models import Q, Count, Avg, Sum
+from django.db.models import Q, F, Count, Avg, Sum
 from django.db import transaction
 from django_filters.rest_framework import DjangoFilterBackend
+import time
 
 from .models import (
     Category, Brand, Product, ProductAttribute, ProductAttributeValue,
-    ProductVariation, ProductImage, ProductReview, ProductTag, Wishlist
+    ProductVariation, ProductImage, ProductReview, ProductTag, Wishlist, ProductImportJob
 )
 from .serializers import (
     CategorySerializer, CategoryListSerializer, CategoryTreeSerializer,
@@ -17,9 +20,23 @@ from .serializers import (
     ProductCreateUpdateSerializer, ProductVariationSerializer,
     ProductVariationCreateSerializer, ProductAttributeSerializer,
     ProductReviewSerializer, WishlistSerializer, WishlistCreateSerializer,
-    ProductSearchSerializer, ProductBulkUpdateSerializer, ProductStatsSerializer
+    ProductSearchSerializer, ProductBulkUpdateSerializer, ProductStatsSerializer,
+    ProductImportSerializer, ProductImportJobSerializer, ProductVariationGenerateSerializer
 )
-from .filters import ProductFilter
+from .filters import ProductFilter, SearchRankOrderingFilter
+from .search import search_queryset, schedule_reindex
+from .counters import rebuild_catalog_counters
+from .category_tree import get_category_tree
+from .facets import compute_facets
+from .view_counter import record_product_view
+from .review_votes import record_review_vote
+from .autocomplete import bump_autocomplete_version, get_autocomplete_index, record_search_miss
+from .detail_cache import bump_product_versions, cache_detail, get_cached_detail
+from .bulk_import import export_csv, export_jsonl, start_import_job
+from .images import add_product_images, inspect_image
+from .variations import generate_variations, get_variation_matrix
+from apps.vendors.models import Vendor
+from core.pagination import HybridPagination, KeysetPagination
 from core.permissions import IsVendorOnly, IsVerifiedVendor, IsOwnerOrReadOnly
 
 # Category Views
@@ -46,8 +63,7 @@ class CategoryDetailView(generics.RetrieveUpdateDestroyAPIView):
 @permission_classes([permissions.AllowAny])
 def category_tree(request):
     """Get complete category tree structure."""
-    categories = Category.objects.filter(is_active=True, parent__isnull=True)
-    serializer = CategoryTreeSerializer(categories, many=True)
+    serializer = CategoryTreeSerializer(get_category_tree().root_nodes(), many=True)
     return Response({
         'success': True,
         'data': serializer.data
@@ -76,16 +92,16 @@ class ProductListView(generics.ListAPIView):
     """List products with filtering and search."""
     serializer_class = ProductListSerializer
     permission_classes = [permissions.AllowAny]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, SearchRankOrderingFilter]
     filterset_class = ProductFilter
-    search_fields = ['name', 'description', 'short_description']
     ordering_fields = ['name', 'price', 'created_at', 'average_rating', 'sales_count']
     ordering = ['-created_at']
+    pagination_class = HybridPagination
     
     def get_queryset(self):
-        queryset = Product.objects.filter(status='published').select_related(
-            'category', 'brand', 'vendor'
-        ).prefetch_related('images', 'tag_assignments__tag')
+        queryset = ProductListSerializer.setup_eager_loading(
+            Product.objects.filter(status='published')
+        )
         
         # Add additional filters from query params
         min_price = self.request.query_params.get('min_price')
@@ -101,12 +117,29 @@ class ProductListView(generics.ListAPIView):
         if min_rating:
             queryset = queryset.filter(average_rating__gte=min_rating)
         if in_stock == 'true':
-            queryset = queryset.filter(stock_quantity__gt=0)
+            queryset = queryset.exclude(stock_status='out_of_stock')
         if tags:
             tag_list = tags.split(',')
             queryset = queryset.filter(tag_assignments__tag__name__in=tag_list).distinct()
         
         return queryset
+    
+    def list(self, request, *args, **kwargs):
+        # `facets` is parsed like the BooleanField of product search
+        with_facets = ProductSearchSerializer().fields['facets'].run_validation(
+            request.query_params.get('facets', empty)
+        )
+        queryset = self.filter_queryset(self.get_queryset())
+        
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            response = self.get_paginated_response(self.get_serializer(page, many=True).data)
+        else:
+            response = Response(self.get_serializer(queryset, many=True).data)
+        if with_facets:
+            # Facets count the same filtered queryset as the page
+            response.data['facets'] = compute_facets(queryset)
+        return response
 
 class ProductDetailView(generics.RetrieveAPIView):
     """Get product details."""
@@ -115,25 +148,36 @@ class ProductDetailView(generics.RetrieveAPIView):
     permission_classes = [permissions.AllowAny]
     lookup_field = 'slug'
     
+    def get_queryset(self):
+        return ProductDetailSerializer.setup_eager_loading(super().get_queryset())
+    
     def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
+        slug = kwargs[self.lookup_field]
+        detail = get_cached_detail(slug, request)
+        if detail is None:
+            started = time.time()
+            instance = self.get_object()
+            serializer = self.get_serializer(instance)
+            detail = cache_detail(slug, request, instance.pk, serializer.data, started)
         
-        # Increment view count
-        Product.objects.filter(id=instance.id).update(view_count=instance.view_count + 1)
+        # Buffer the view; counts are written in batches
+        record_product_view(request, detail.product_id)
         
-        serializer = self.get_serializer(instance)
-        return Response({
+        if detail.not_modified(request):
+            return detail.apply_headers(Response(status=status.HTTP_304_NOT_MODIFIED))
+        
+        return detail.apply_headers(Response({
             'success': True,
-            'data': serializer.data
-        })
+            'data': detail.data
+        }))
 
 class VendorProductListView(generics.ListCreateAPIView):
     """List and create products for vendors."""
     permission_classes = [permissions.IsAuthenticated, IsVendorOnly]
     
     def get_queryset(self):
-        vendor = get_object_or_404('vendors.Vendor', user=self.request.user)
-        return Product.objects.filter(vendor=vendor).select_related('category', 'brand')
+        vendor = get_object_or_404(Vendor, user=self.request.user)
+        return ProductListSerializer.setup_eager_loading(Product.objects.filter(vendor=vendor))
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -143,7 +187,7 @@ class VendorProductListView(generics.ListCreateAPIView):
     def get_serializer_context(self):
         context = super().get_serializer_context()
         if self.request.method == 'POST':
-            vendor = get_object_or_404('vendors.Vendor', user=self.request.user)
+            vendor = get_object_or_404(Vendor, user=self.request.user)
             context['vendor'] = vendor
         return context
 
@@ -152,7 +196,7 @@ class VendorProductDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated, IsVendorOnly]
     
     def get_queryset(self):
-        vendor = get_object_or_404('vendors.Vendor', user=self.request.user)
+        vendor = get_object_or_404(Vendor, user=self.request.user)
         return Product.objects.filter(vendor=vendor)
     
     def get_serializer_class(self):
@@ -163,7 +207,7 @@ class VendorProductDetailView(generics.RetrieveUpdateDestroyAPIView):
     def get_serializer_context(self):
         context = super().get_serializer_context()
         if self.request.method in ['PUT', 'PATCH']:
-            vendor = get_object_or_404('vendors.Vendor', user=self.request.user)
+            vendor = get_object_or_404(Vendor, user=self.request.user)
             context['vendor'] = vendor
         return context
 
@@ -171,7 +215,7 @@ class VendorProductDetailView(generics.RetrieveUpdateDestroyAPIView):
 @permission_classes([permissions.IsAuthenticated, IsVendorOnly])
 def upload_product_images(request, product_id):
     """Upload multiple images for a product."""
-    vendor = get_object_or_404('vendors.Vendor', user=request.user)
+    vendor = get_object_or_404(Vendor, user=request.user)
     product = get_object_or_404(Product, id=product_id, vendor=vendor)
     
     if 'images' not in request.FILES:
@@ -188,31 +232,28 @@ def upload_product_images(request, product_id):
             'message': 'Maximum 10 images allowed per product'
         }, status=status.HTTP_400_BAD_REQUEST)
     
-    uploaded_images = []
-    
+    # Validate every file before anything is written
+    from core.utils import validate_image_file
     for i, image in enumerate(images):
-        # Validate image
-        from core.utils import validate_image_file
         is_valid, message = validate_image_file(image)
+        if is_valid:
+            is_valid, message = inspect_image(image)
         
         if not is_valid:
             return Response({
                 'success': False,
                 'message': f'Image {i+1}: {message}'
             }, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Create product image
-        product_image = ProductImage.objects.create(
-            product=product,
-            image=image,
-            sort_order=i,
-            is_primary=(i == 0 and not product.images.exists())
-        )
-        uploaded_images.append({
+    
+    uploaded_images = [
+        {
             'id': str(product_image.id),
             'image_url': request.build_absolute_uri(product_image.image.url),
-            'is_primary': product_image.is_primary
-        })
+            'is_primary': product_image.is_primary,
+            'rendition_status': product_image.rendition_status
+        }
+        for product_image in add_product_images(product, images)
+    ]
     
     return Response({
         'success': True,
@@ -227,7 +268,7 @@ class ProductVariationListView(generics.ListCreateAPIView):
     
     def get_queryset(self):
         product_id = self.kwargs['product_id']
-        vendor = get_object_or_404('vendors.Vendor', user=self.request.user)
+        vendor = get_object_or_404(Vendor, user=self.request.user)
         product = get_object_or_404(Product, id=product_id, vendor=vendor)
         return ProductVariation.objects.filter(product=product)
     
@@ -240,11 +281,55 @@ class ProductVariationListView(generics.ListCreateAPIView):
         context = super().get_serializer_context()
         if self.request.method == 'POST':
             product_id = self.kwargs['product_id']
-            vendor = get_object_or_404('vendors.Vendor', user=self.request.user)
+            vendor = get_object_or_404(Vendor, user=self.request.user)
             product = get_object_or_404(Product, id=product_id, vendor=vendor)
             context['product'] = product
         return context
 
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated, IsVendorOnly])
+def generate_product_variations(request, product_id):
+    """Create variations for every combination of the given attribute values."""
+    vendor = get_object_or_404(Vendor, user=request.user)
+    product = get_object_or_404(Product, id=product_id, vendor=vendor)
+    serializer = ProductVariationGenerateSerializer(data=request.data)
+    
+    if serializer.is_valid():
+        defaults = dict(serializer.validated_data)
+        values_by_attribute = defaults.pop('attributes')
+        defaults.setdefault('price', product.price)
+        
+        created, skipped, missing = generate_variations(product, values_by_attribute, defaults)
+        if missing:
+            return Response({
+                'success': False,
+                'message': f"Attributes do not exist: {', '.join(missing)}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'success': True,
+            'message': f'{created} variations created, {skipped} existing combinations skipped',
+            'data': get_variation_matrix(product.pk)
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+    
+    return Response({
+        'success': False,
+        'errors': serializer.errors
+    }, status=status.HTTP_400_BAD_REQUEST)
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def product_variation_matrix(request, product_id):
+    """Map attribute-value combinations of a product to variation, price and stock."""
+    product_id = get_object_or_404(
+        Product.objects.values_list('id', flat=True), id=product_id, status='published'
+    )
+    
+    return Response({
+        'success': True,
+        'data': get_variation_matrix(product_id)
+    })
+
 class ProductVariationDetailView(generics.RetrieveUpdateDestroyAPIView):
     """Retrieve, update, and delete product variation."""
     serializer_class = ProductVariationSerializer
@@ -252,7 +337,7 @@ class ProductVariationDetailView(generics.RetrieveUpdateDestroyAPIView):
     
     def get_queryset(self):
         product_id = self.kwargs['product_id']
-        vendor = get_object_or_404('vendors.Vendor', user=self.request.user)
+        vendor = get_object_or_404(Vendor, user=self.request.user)
         product = get_object_or_404(Product, id=product_id, vendor=vendor)
         return ProductVariation.objects.filter(product=product)
 
@@ -275,11 +360,23 @@ class ProductReviewListView(generics.ListCreateAPIView):
     """List and create product reviews."""
     serializer_class = ProductReviewSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = HybridPagination
+    sort_orderings = {
+        'recent': ['-created_at'],
+        'helpful': ['-helpfulness_score', '-helpful_count', '-created_at'],
+        'rating_high': ['-rating', '-created_at'],
+        'rating_low': ['rating', '-created_at'],
+    }
     
     def get_queryset(self):
         product_id = self.kwargs['product_id']
         product = get_object_or_404(Product, id=product_id, status='published')
-        return ProductReview.objects.filter(product=product, is_approved=True)
+        ordering = self.sort_orderings.get(
+            self.request.query_params.get('sort'), self.sort_orderings['recent']
+        )
+        return ProductReview.objects.filter(
+            product=product, is_approved=True
+        ).select_related('user').order_by(*ordering)
     
     def perform_create(self, serializer):
         product_id = self.kwargs['product_id']
@@ -292,50 +389,37 @@ class ProductReviewListView(generics.ListCreateAPIView):
                 'message': 'You have already reviewed this product'
             }, status=status.HTTP_400_BAD_REQUEST)
         
+        # Saving the review updates the product's rating aggregates
         review = serializer.save(user=self.request.user, product=product)
         
-        # Update product rating
-        self.update_product_rating(product)
-        
         return Response({
             'success': True,
             'message': 'Review added successfully',
             'data': ProductReviewSerializer(review).data
         }, status=status.HTTP_201_CREATED)
-    
-    def update_product_rating(self, product):
-        """Update product average rating and review count."""
-        reviews = ProductReview.objects.filter(product=product, is_approved=True)
-        if reviews.exists():
-            avg_rating = reviews.aggregate(avg=Avg('rating'))['avg']
-            review_count = reviews.count()
-            
-            product.average_rating = round(avg_rating, 2)
-            product.review_count = review_count
-            product.save(update_fields=['average_rating', 'review_count'])
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def mark_review_helpful(request, review_id):
     """Mark a review as helpful or not helpful."""
-    review = get_object_or_404(ProductReview, id=review_id)
+    review = get_object_or_404(ProductReview.objects.only('id'), id=review_id)
     action = request.data.get('action')  # 'helpful' or 'not_helpful'
     
-    if action == 'helpful':
-        review.helpful_count += 1
-    elif action == 'not_helpful':
-        review.not_helpful_count += 1
-    else:
+    if action not in ['helpful', 'not_helpful']:
         return Response({
             'success': False,
             'message': 'Invalid action. Use "helpful" or "not_helpful"'
         }, status=status.HTTP_400_BAD_REQUEST)
     
-    review.save()
+    changed = record_review_vote(review.id, request.user, is_helpful=(action == 'helpful'))
+    counts = ProductReview.objects.filter(id=review.id).values(
+        'helpful_count', 'not_helpful_count'
+    ).first()
     
     return Response({
         'success': True,
-        'message': 'Review feedback recorded'
+        'message': 'Review feedback recorded' if changed else 'You have already given this feedback',
+        'data': counts
     })
 
 # Wishlist Views
@@ -344,7 +428,10 @@ class WishlistView(generics.ListCreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return Wishlist.objects.filter(user=self.request.user).select_related('product')
+        return ProductListSerializer.setup_eager_loading(
+            Wishlist.objects.filter(user=self.request.user).select_related('product'),
+            prefix='product__'
+        )
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -369,6 +456,31 @@ def remove_from_wishlist(request, product_id):
         }, status=status.HTTP_404_NOT_FOUND)
 
 # Search and Filter Views
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def autocomplete(request):
+    """Typo-tolerant suggestions for products, brands and categories."""
+    query = request.query_params.get('q', '').strip()
+    try:
+        limit = min(max(int(request.query_params.get('limit', 8)), 1), 20)
+    except ValueError:
+        limit = 8
+    
+    suggestions = get_autocomplete_index().suggest(query, limit=limit) if query else {}
+    
+    if len(query) >= 3 and not suggestions:
+        record_search_miss(query)
+    
+    return Response({
+        'success': True,
+        'data': {
+            'query': query,
+            'products': suggestions.get('products', []),
+            'brands': suggestions.get('brands', []),
+            'categories': suggestions.get('categories', []),
+        }
+    })
+
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
 def search_products(request):
@@ -377,19 +489,18 @@ def search_products(request):
     
     if serializer.is_valid():
         filters = serializer.validated_data
-        queryset = Product.objects.filter(status='published')
+        queryset = ProductListSerializer.setup_eager_loading(
+            Product.objects.filter(status='published')
+        )
         
         # Apply filters
         if filters.get('q'):
-            query = filters['q']
-            queryset = queryset.filter(
-                Q(name__icontains=query) |
-                Q(description__icontains=query) |
-                Q(short_description__icontains=query)
-            )
+            queryset = search_queryset(queryset, filters['q'])
         
         if filters.get('category'):
-            queryset = queryset.filter(category=filters['category'])
+            queryset = queryset.filter(
+                category_id__in=get_category_tree().subtree_ids(filters['category'])
+            )
         
         if filters.get('brand'):
             queryset = queryset.filter(brand=filters['brand'])
@@ -407,7 +518,7 @@ def search_products(request):
             queryset = queryset.filter(average_rating__gte=filters['min_rating'])
         
         if filters.get('in_stock'):
-            queryset = queryset.filter(stock_quantity__gt=0)
+            queryset = queryset.exclude(stock_status='out_of_stock')
         
         if filters.get('is_featured'):
             queryset = queryset.filter(is_featured=True)
@@ -416,36 +527,50 @@ def search_products(request):
             tag_names = filters['tags'].split(',')
             queryset = queryset.filter(tag_assignments__tag__name__in=tag_names).distinct()
         
-        # Apply sorting
-        sort_by = filters.get('sort_by', '-created_at')
-        queryset = queryset.order_by(sort_by)
+        # Apply sorting (search results default to relevance order)
+        if filters.get('q') and 'sort_by' not in request.query_params:
+            queryset = queryset.order_by('search_rank')
+        else:
+            sort_by = filters.get('sort_by', '-created_at')
+            queryset = queryset.order_by(sort_by)
         
-        # Paginate results
-        page = request.query_params.get('page', 1)
-        page_size = min(int(request.query_params.get('page_size', 20)), 100)
-        
-        from django.core.paginator import Paginator
-        paginator = Paginator(queryset, page_size)
-        
-        try:
-            products = paginator.page(page)
-        except:
-            products = paginator.page(1)
+        # Paginate results (keyset pagination when a cursor is supplied)
+        if KeysetPagination.cursor_query_param in request.query_params:
+            paginator = KeysetPagination()
+            products = paginator.paginate_queryset(queryset, request)
+            pagination = paginator.get_pagination_data()
+        else:
+            page = request.query_params.get('page', 1)
+            page_size = min(int(request.query_params.get('page_size', 20)), 100)
+            
+            from django.core.paginator import Paginator
+            paginator = Paginator(queryset, page_size)
+            
+            try:
+                products = paginator.page(page)
+            except:
+                products = paginator.page(1)
+            
+            pagination = {
+                'current_page': products.number,
+                'total_pages': paginator.num_pages,
+                'total_items': paginator.count,
+                'has_next': products.has_next(),
+                'has_previous': products.has_previous(),
+            }
         
         serializer = ProductListSerializer(products, many=True, context={'request': request})
         
+        data = {
+            'products': serializer.data,
+            'pagination': pagination
+        }
+        if filters.get('facets'):
+            data['facets'] = compute_facets(queryset)
+        
         return Response({
             'success': True,
-            'data': {
-                'products': serializer.data,
-                'pagination': {
-                    'current_page': products.number,
-                    'total_pages': paginator.num_pages,
-                    'total_items': paginator.count,
-                    'has_next': products.has_next(),
-                    'has_previous': products.has_previous(),
-                }
-            }
+            'data': data
         })
     
     return Response({
@@ -464,7 +589,7 @@ def bulk_product_update(request):
         product_ids = serializer.validated_data['product_ids']
         action = serializer.validated_data['action']
         
-        vendor = get_object_or_404('vendors.Vendor', user=request.user)
+        vendor = get_object_or_404(Vendor, user=request.user)
         products = Product.objects.filter(id__in=product_ids, vendor=vendor)
         
         if products.count() != len(product_ids):
@@ -474,6 +599,9 @@ def bulk_product_update(request):
             }, status=status.HTTP_400_BAD_REQUEST)
         
         with transaction.atomic():
+            if action in ['publish', 'unpublish']:
+                affected = list(products.values_list('category_id', 'brand_id'))
+            
             if action == 'publish':
                 products.update(status='published')
             elif action == 'unpublish':
@@ -484,6 +612,18 @@ def bulk_product_update(request):
                 products.update(is_featured=False)
             elif action == 'delete':
                 products.delete()
+            
+            # Queryset updates bypass model signals
+            if action in ['publish', 'unpublish']:
+                rebuild_catalog_counters(
+                    category_ids={category_id for category_id, _ in affected},
+                    brand_ids={brand_id for _, brand_id in affected}
+                )
+                schedule_reindex(product_ids)
+            if action in ['publish', 'unpublish', 'delete']:
+                bump_autocomplete_version()
+            if action != 'delete':
+                bump_product_versions(product_ids)
         
         return Response({
             'success': True,
@@ -495,22 +635,82 @@ def bulk_product_update(request):
         'errors': serializer.errors
     }, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated, IsVendorOnly])
+def import_products(request):
+    """Start a background import of products from a CSV or JSON-lines file."""
+    serializer = ProductImportSerializer(data=request.data)
+    
+    if serializer.is_valid():
+        vendor = get_object_or_404(Vendor, user=request.user)
+        with transaction.atomic():
+            job = ProductImportJob.objects.create(
+                vendor=vendor,
+                file=serializer.validated_data['file'],
+                file_format=serializer.validated_data['file_format']
+            )
+            start_import_job(job)
+        
+        return Response({
+            'success': True,
+            'message': 'Import started',
+            'data': ProductImportJobSerializer(job).data
+        }, status=status.HTTP_202_ACCEPTED)
+    
+    return Response({
+        'success': False,
+        'errors': serializer.errors
+    }, status=status.HTTP_400_BAD_REQUEST)
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated, IsVendorOnly])
+def product_import_status(request, job_id):
+    """Get progress and row errors of an import job."""
+    vendor = get_object_or_404(Vendor, user=request.user)
+    job = get_object_or_404(ProductImportJob, id=job_id, vendor=vendor)
+    
+    return Response({
+        'success': True,
+        'data': ProductImportJobSerializer(job).data
+    })
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated, IsVendorOnly])
+def export_products(request):
+    """Stream the vendor's catalog as CSV or JSON lines."""
+    vendor = get_object_or_404(Vendor, user=request.user)
+    file_format = request.query_params.get('file_format', 'csv')
+    
+    if file_format == 'jsonl':
+        response = StreamingHttpResponse(export_jsonl(vendor), content_type='application/x-ndjson')
+    elif file_format == 'csv':
+        response = StreamingHttpResponse(export_csv(vendor), content_type='text/csv; charset=utf-8')
+    else:
+        return Response({
+            'success': False,
+            'message': 'file_format must be csv or jsonl'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    response['Content-Disposition'] = f'attachment; filename="products.{file_format}"'
+    return response
+
 # Analytics and Stats
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated, IsVendorOnly])
 def vendor_product_stats(request):
     """Get vendor product statistics."""
-    vendor = get_object_or_404('vendors.Vendor', user=request.user)
+    vendor = get_object_or_404(Vendor, user=request.user)
     products = Product.objects.filter(vendor=vendor)
     
     stats = {
         'total_products': products.count(),
         'published_products': products.filter(status='published').count(),
         'draft_products': products.filter(status='draft').count(),
-        'out_of_stock_products': products.filter(stock_quantity=0).count(),
+        'out_of_stock_products': products.filter(stock_status='out_of_stock').count(),
         'low_stock_products': products.filter(
-            stock_quantity__gt=0,
-            stock_quantity__lte=models.F('low_stock_threshold')
+            stock_status='in_stock',
+            manage_stock=True,
+            available_quantity__lte=F('low_stock_threshold')
         ).count(),
         'featured_products': products.filter(is_featured=True).count(),
         'total_views': products.aggregate(Sum('view_count'))['view_count__sum'] or 0,
@@ -171,6 +171,29 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
+# Cache
+# Search index sync, cached product responses, the category tree and
+# autocomplete versions, cart versions and guest carts are shared between
+# workers through the default cache. Without CACHE_URL each process gets its
+# own LocMem cache, which is only correct for a single process; the
+# core.E001 check refuses to start with it when WEB_CONCURRENCY > 1.
+CACHE_URL = config('CACHE_URL', default='')
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+# Worker processes serving requests (the gunicorn convention)
+WEB_CONCURRENCY = config('WEB_CONCURRENCY', default=1, cast=int)
+
 # Celery Configuration
 CELERY_BROKER_URL = config('CELERY_BROKER_URL', default='redis://localhost:6379/0')
 CELERY_RESULT_BACKEND = config('CELERY_RESULT_BACKEND', default='redis://localhost:6379/0')
@@ -226,6 +249,61 @@ THUMBNAIL_SIZES = {
     'medium': (300, 300),
     'large': (600, 600),
 }
+# Renditions are rendered by a bounded thread pool after the upload commits
+PRODUCT_IMAGE_WORKERS = 2
+# Concurrent storage writes per multi-image upload
+PRODUCT_IMAGE_UPLOAD_CONCURRENCY = 5
+PRODUCT_IMAGE_RENDITIONS_ASYNC = True
+# Files referenced outside FileFields, kept by the cleanup_unused_images GC
+MEDIA_GC_EXTRA_REFERENCES = ['apps.products.images.rendition_references']
+# Rendition size linked as `url` in product lists (details use 'large')
+PRODUCT_LIST_IMAGE_SIZE = 'medium'
+# Back-in-stock and low-stock notifications are sent from a background thread
+PRODUCT_STOCK_NOTIFICATIONS_ASYNC = True
+
+# Product search
+PRODUCT_SEARCH_BACKEND = 'apps.products.search.InvertedIndexSearchBackend'
+PRODUCT_SEARCH_MAX_RESULTS = 1000
+# Build the search index in the background when a web worker starts
+PRODUCT_SEARCH_WARM_ON_STARTUP = True
+# Lower bounds of the price ranges reported by faceted search
+PRODUCT_FACET_PRICE_BUCKETS = [0, 500, 1000, 5000, 10000, 50000]
+# Rebuild a stale autocomplete index in a background thread
+PRODUCT_AUTOCOMPLETE_REBUILD_ASYNC = True
+
+# Product view counting (buffered, flushed every PRODUCT_VIEW_FLUSH_INTERVAL seconds)
+PRODUCT_VIEW_COUNTER_BACKEND = config(
+    'PRODUCT_VIEW_COUNTER_BACKEND', default='apps.products.view_counter.LocalViewCounter'
+)
+PRODUCT_VIEW_COUNTER_REDIS_URL = config('PRODUCT_VIEW_COUNTER_REDIS_URL', default='redis://localhost:6379/1')
+PRODUCT_VIEW_FLUSH_INTERVAL = config('PRODUCT_VIEW_FLUSH_INTERVAL', default=30, cast=int)
+# Flush in a background thread rather than in the request that hits the interval
+PRODUCT_VIEW_FLUSH_ASYNC = True
+# Visitors remembered per process for unique-view counting (LocalViewCounter)
+PRODUCT_VIEW_SEEN_LIMIT = 100000
+
+# Rendered product detail responses (invalidated by product version stamps)
+PRODUCT_DETAIL_CACHE_TIMEOUT = 60 * 60
+
+# Largest cartesian product the bulk variation generator creates in one request
+PRODUCT_VARIATION_MAX_COMBINATIONS = 500
+
+# Bulk product import (rows written per transaction; run off the request thread)
+PRODUCT_IMPORT_CHUNK_SIZE = 500
+PRODUCT_IMPORT_RUN_ASYNC = True
 
 # Frontend configuration
-FRONTEND_URL = config('FRONTEND_URL', default='http://localhost:3000')
\ No newline at end of file
+FRONTEND_URL = config('FRONTEND_URL', default='http://localhost:3000')
+# Hot cart store (unset: carts are read and written as CartItem rows).
+# Dirty carts are written back every CART_STORE_FLUSH_INTERVAL seconds,
+# at checkout and by the flush_carts command.
+CART_STORE_BACKEND = config('CART_STORE_BACKEND', default='')
+CART_STORE_REDIS_URL = config('CART_STORE_REDIS_URL', default='redis://localhost:6379/2')
+CART_STORE_TTL = config('CART_STORE_TTL', default=60 * 60 * 24 * 7, cast=int)
+CART_STORE_FLUSH_INTERVAL = config('CART_STORE_FLUSH_INTERVAL', default=30, cast=int)
+CART_STORE_PERSIST_ASYNC = True
+# Largest list of operations PATCH /api/orders/cart/ accepts
+CART_BATCH_MAX_OPERATIONS = 100
+# Where guest carts live when no hot cart store is configured. CacheCartStore
+# needs a shared cache (CACHE_URL) once WEB_CONCURRENCY > 1 (orders.E002).
+GUEST_CART_STORE_BACKEND = config('GUEST_CART_STORE_BACKEND', default='apps.orders.cart_store.CacheCartStore')
@@ -0,0 +1,32 @@
+# core/checks.py
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+def cache_is_process_local(alias='default'):
+    """True when the cache is private to each worker process."""
+    return settings.CACHES[alias]['BACKEND'] in PROCESS_LOCAL_CACHES
+
+def runs_multiple_workers():
+    return getattr(settings, 'WEB_CONCURRENCY', 1) > 1
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Version stamps and change logs kept in the default cache only invalidate
+    other workers' data when every worker sees the same cache.
+    """
+    if not runs_multiple_workers() or not cache_is_process_local():
+        return []
+    return [Error(
+        'The default cache is local to each process, but WEB_CONCURRENCY runs several workers.',
+        hint=(
+            'Set CACHE_URL to a shared Redis cache. Otherwise search results, product detail '
+            'responses, the category tree and autocomplete stay stale in other workers after a change.'
+        ),
+        id='core.E001',
+    )]
@@ -0,0 +1,192 @@
+# core/media_gc.py
+import hashlib
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import islice
+
+from django.apps import apps
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 1000
+
+def _fingerprint(name):
+    """8-byte hash of a storage name; sets of ints are far smaller than sets of paths."""
+    return int.from_bytes(hashlib.blake2b(name.encode(), digest_size=8).digest(), 'big')
+
+def file_fields():
+    """Every (model, FileField) in the project, ImageFields included."""
+    for model in apps.get_models():
+        for field in model._meta.concrete_fields:
+            if isinstance(field, models.FileField):
+                yield model, field
+
+def _prefix(field):
+    """Directory an ImageField uploads into, or None if upload_to is a callable."""
+    if callable(field.upload_to):
+        return None
+    # Stop at the first strftime placeholder, e.g. 'uploads/%Y/%m/'
+    static = field.upload_to.split('%', 1)[0]
+    return static.rsplit('/', 1)[0] + '/' if '/' in static else ''
+
+def scan_targets():
+    """
+    Storage locations to scan: {storage: set of prefixes}, one entry per
+    distinct storage used by an ImageField.
+    """
+    targets = {}
+    for model, field in file_fields():
+        if not isinstance(field, models.ImageField):
+            continue
+        prefix = _prefix(field)
+        if prefix is None:
+            logger.warning('Skipping %s.%s: callable upload_to', model.__name__, field.name)
+            continue
+        targets.setdefault(field.storage, set()).add(prefix)
+    # Drop prefixes nested in another prefix of the same storage
+    for storage, prefixes in targets.items():
+        targets[storage] = {
+            prefix for prefix in prefixes
+            if not any(other != prefix and prefix.startswith(other) for other in prefixes)
+        }
+    return targets
+
+def collect_references():
+    """
+    Fingerprints of every file name the database points at.
+
+    Streams each FileField with values_list().iterator(), plus the names
+    yielded by the callables listed in MEDIA_GC_EXTRA_REFERENCES (files that
+    live outside FileFields, such as image renditions).
+    """
+    references = set()
+    for model, field in file_fields():
+        names = model._default_manager.exclude(**{field.attname: ''}).exclude(
+            **{f'{field.attname}__isnull': True}
+        ).values_list(field.attname, flat=True)
+        for name in names.iterator(chunk_size=5000):
+            references.add(_fingerprint(name))
+    for path in getattr(settings, 'MEDIA_GC_EXTRA_REFERENCES', []):
+        for name in import_string(path)():
+            references.add(_fingerprint(name))
+    return references
+
+def iter_storage_files(storage, prefix):
+    """
+    Yield (name, modified_time or None) for every file below prefix.
+
+    S3-style storages are listed through the bucket's paged object listing,
+    which also carries modification times; other storages are walked one
+    directory at a time.
+    """
+    bucket = getattr(storage, 'bucket', None)
+    if bucket is not None:
+        location = getattr(storage, 'location', '')
+        root = posixpath.join(location, prefix) if location else prefix
+        for obj in bucket.objects.filter(Prefix=root).page_size(PAGE_SIZE):
+            name = obj.key[len(location):].lstrip('/') if location else obj.key
+            yield name, obj.last_modified
+        return
+
+    pending = [prefix.rstrip('/')]
+    while pending:
+        directory = pending.pop()
+        try:
+            dirs, files = storage.listdir(directory)
+        except FileNotFoundError:
+            continue
+        for name in files:
+            yield posixpath.join(directory, name), None
+        pending.extend(posixpath.join(directory, name) for name in dirs)
+
+def _modified(storage, name, modified):
+    if modified is not None:
+        return modified
+    try:
+        return storage.get_modified_time(name)
+    except (NotImplementedError, OSError):
+        return None
+
+def _pages(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        page = list(islice(iterator, size))
+        if not page:
+            return
+        yield page
+
+class MediaGarbageCollector:
+    """
+    Find and delete media files no database row refers to.
+
+    Files younger than the grace period are never touched, so uploads whose
+    rows are not committed yet survive. Unreferenced files are handled page by
+    page, and deletes within a page run concurrently.
+    """
+
+    def __init__(self, grace_period=timedelta(hours=24), workers=8, dry_run=False, on_orphan=None):
+        self.grace_period = grace_period
+        self.workers = workers
+        self.dry_run = dry_run
+        self.on_orphan = on_orphan
+        self.stats = {'scanned': 0, 'orphaned': 0, 'deleted': 0, 'recent': 0, 'errors': 0}
+
+    def run(self, targets=None):
+        targets = scan_targets() if targets is None else targets
+        references = collect_references()
+        cutoff = timezone.now() - self.grace_period
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for storage, prefixes in targets.items():
+                for prefix in sorted(prefixes):
+                    files = iter_storage_files(storage, prefix)
+                    for page in _pages(files, PAGE_SIZE):
+                        self._collect_page(executor, storage, page, references, cutoff)
+        return self.stats
+
+    def _collect_page(self, executor, storage, page, references, cutoff):
+        self.stats['scanned'] += len(page)
+        candidates = [
+            (name, modified) for name, modified in page
+            if _fingerprint(name) not in references
+        ]
+        if not candidates:
+            return
+        checked = executor.map(
+            lambda item: (item[0], _modified(storage, *item)), candidates
+        )
+        orphans = []
+        for name, modified in checked:
+            if modified is None:
+                continue
+            if timezone.is_naive(modified):
+                modified = timezone.make_aware(modified)
+            if modified > cutoff:
+                self.stats['recent'] += 1
+                continue
+            orphans.append(name)
+        self.stats['orphaned'] += len(orphans)
+        for name in orphans:
+            if self.on_orphan:
+                self.on_orphan(name)
+        if self.dry_run:
+            return
+        for name, error in executor.map(lambda name: (name, self._delete(storage, name)), orphans):
+            if error is None:
+                self.stats['deleted'] += 1
+            else:
+                self.stats['errors'] += 1
+                logger.warning('Could not delete %s: %s', name, error)
+
+    @staticmethod
+    def _delete(storage, name):
+        try:
+            storage.delete(name)
+        except Exception as e:
+            return e
+        return None
@@ -0,0 +1,219 @@
+# core/pagination.py
+import base64
+import binascii
+import datetime
+import json
+from collections import OrderedDict
+from functools import reduce
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+class _CursorEncoder(DjangoJSONEncoder):
+    """Keep full microsecond precision; DjangoJSONEncoder truncates to milliseconds."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+class KeysetPagination(BasePagination):
+    """
+    Opaque-cursor keyset pagination.
+
+    The page boundary is the sort-key tuple of the last (or first) row, so each
+    page is a single indexed range scan of page_size + 1 rows at any depth.
+    The queryset's ordering is used as the key, with the primary key appended
+    as a tie-breaker; ordering fields must not be nullable. The total count is
+    only computed when `include_count=true` is passed.
+    """
+    page_size = api_settings.PAGE_SIZE or 20
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    count_query_param = 'include_count'
+    default_ordering = ('-created_at',)
+    invalid_cursor_message = 'Invalid cursor.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+        position, reverse = self.decode_cursor(request)
+        if position is not None:
+            position = self.clean_position(queryset, position)
+
+        self.count = None
+        if request.query_params.get(self.count_query_param) == 'true':
+            self.count = queryset.count()
+
+        ordering = [_invert(field) for field in self.ordering] if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(_after(ordering, position))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        self.next_cursor = self.previous_cursor = None
+        if results and self.has_next:
+            self.next_cursor = self.encode_cursor(results[-1], reverse=False)
+        if results and self.has_previous:
+            self.previous_cursor = self.encode_cursor(results[0], reverse=True)
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def get_ordering(self, queryset):
+        ordering = list(queryset.query.order_by) or list(queryset.model._meta.ordering)
+        if not ordering or not all(isinstance(field, str) and field != '?' for field in ordering):
+            ordering = list(self.default_ordering)
+        names = {field.lstrip('-') for field in ordering}
+        if not names & {'pk', 'id', queryset.model._meta.pk.name}:
+            ordering.append('-pk' if ordering[0].startswith('-') else 'pk')
+        return ordering
+
+    # Cursors
+    def encode_cursor(self, instance, reverse):
+        payload = {
+            'o': self.ordering,
+            'p': [_value(instance, field.lstrip('-')) for field in self.ordering],
+        }
+        if reverse:
+            payload['r'] = 1
+        data = json.dumps(payload, cls=_CursorEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, request):
+        """Return (position, reverse) for the cursor in the request."""
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            position = payload['p']
+            reverse = bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        # A cursor from a different sort order cannot be applied to this one.
+        if not isinstance(position, list) or payload.get('o') != self.ordering \
+                or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def clean_position(self, queryset, position):
+        """Convert cursor values to their ordering fields' types, or raise NotFound."""
+        cleaned = []
+        for field_path, value in zip(self.ordering, position):
+            try:
+                field = _model_field(queryset.model, field_path.lstrip('-'))
+            except FieldDoesNotExist:
+                # Annotations are compared as they were encoded
+                cleaned.append(value)
+                continue
+            if value is None or isinstance(value, (list, dict)):
+                raise NotFound(self.invalid_cursor_message)
+            try:
+                cleaned.append(field.to_python(value))
+            except (ValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+        return cleaned
+
+    # Responses
+    def get_cursor_link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_pagination_data(self):
+        """Pagination metadata for views that build their own response body."""
+        data = OrderedDict([
+            ('next_cursor', self.next_cursor),
+            ('previous_cursor', self.previous_cursor),
+            ('has_next', self.has_next),
+            ('has_previous', self.has_previous),
+            ('page_size', self.page_size),
+        ])
+        if self.count is not None:
+            data['total_items'] = self.count
+        return data
+
+    def get_paginated_response(self, data):
+        response = OrderedDict()
+        if self.count is not None:
+            response['count'] = self.count
+        response['next'] = self.get_cursor_link(self.next_cursor)
+        response['previous'] = self.get_cursor_link(self.previous_cursor)
+        response['next_cursor'] = self.next_cursor
+        response['previous_cursor'] = self.previous_cursor
+        response['results'] = data
+        return Response(response)
+
+class HybridPagination(PageNumberPagination):
+    """
+    Page-number pagination that switches to keyset pagination when the request
+    carries a `cursor` parameter (an empty cursor starts from the first page).
+    """
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.keyset_class.cursor_query_param in request.query_params:
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+def _model_field(model, path):
+    """The model field at the end of a `a__b` lookup path ('pk' allowed)."""
+    opts = model._meta
+    parts = path.split('__')
+    for part in parts[:-1]:
+        opts = opts.get_field(part).related_model._meta
+    return opts.pk if parts[-1] == 'pk' else opts.get_field(parts[-1])
+
+def _invert(field):
+    return field[1:] if field.startswith('-') else f'-{field}'
+
+def _value(instance, path):
+    value = instance
+    for attr in path.split('__'):
+        value = getattr(value, attr)
+    return value
+
+def _after(ordering, position):
+    """
+    Build the row-value comparison `(a, b, c) > (x, y, z)` as OR-ed prefixes,
+    honouring the direction of each ordering field.
+    """
+    clauses = []
+    for index, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        equal = {
+            ordering[i].lstrip('-'): position[i] for i in range(index)
+        }
+        clauses.append(Q(**equal, **{f'{name}__{lookup}': position[index]}))
+    return reduce(lambda left, right: left | right, clauses)
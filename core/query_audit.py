@@ -0,0 +1,183 @@
+# core/query_audit.py
+import json
+import re
+import time
+from dataclasses import dataclass, field
+
+from django.db import connection
+from django.utils.module_loading import autodiscover_modules
+
+# Plan fragments that mean "read the whole table" or "sort after reading",
+# per database vendor. Group 1 is the table name. Plans from other vendors
+# are reported without flags.
+FULL_SCAN_PATTERNS = {
+    'sqlite': re.compile(r'\bSCAN (\w+)(?! USING (?:COVERING )?INDEX)\s*$', re.MULTILINE),
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+}
+SORT_PATTERNS = {
+    'sqlite': re.compile(r'USE TEMP B-TREE FOR (?:ORDER BY|RIGHT PART OF ORDER BY)'),
+    'postgresql': re.compile(r'\bSort\b'),
+}
+
+_shapes = {}
+
+class _Rollback(Exception):
+    pass
+
+class IndexComparisonUnsupported(Exception):
+    """The database cannot drop indexes inside a rolled-back transaction."""
+
+@dataclass
+class QueryShape:
+    """A query the application issues, rebuilt with representative parameters."""
+    name: str
+    build: object
+    expect_index: str = None
+    description: str = ''
+
+    def queryset(self):
+        return self.build()
+
+@dataclass
+class PlanReport:
+    name: str
+    sql: str
+    plan: str
+    full_scans: list = field(default_factory=list)
+    sorts: bool = False
+    expect_index: str = None
+    seconds: float = None
+
+    @property
+    def uses_expected_index(self):
+        return self.expect_index is None or self.expect_index in self.plan
+
+    @property
+    def ok(self):
+        """No full table scan and no sort step; the index chosen may differ."""
+        return not self.full_scans and not self.sorts
+
+def register(name, expect_index=None):
+    """
+    Register a query shape builder under `name`.
+
+    Apps declare their hot queries in a `query_shapes` module; each builder
+    returns the QuerySet the application would run. `expect_index` names the
+    index the plan is expected to use.
+    """
+    def decorator(build):
+        _shapes[name] = QueryShape(name, build, expect_index, (build.__doc__ or '').strip())
+        return build
+    return decorator
+
+def get_query_shapes():
+    """Every registered shape, after importing each installed app's query_shapes."""
+    autodiscover_modules('query_shapes')
+    return dict(_shapes)
+
+def sample_pk(model):
+    """A primary key value to filter on: an existing row's, or a fresh default."""
+    pk = model._default_manager.values_list('pk', flat=True).first()
+    if pk is None:
+        pk = model._meta.pk.get_default()
+    return 0 if pk is None else pk
+
+def load_captured_queries(fileobj):
+    """
+    Read captured SQL: JSON lines with `sql` (and optionally `name` and
+    `params`), as produced from connection.queries or CaptureQueriesContext.
+    """
+    shapes = []
+    for number, line in enumerate(fileobj, 1):
+        line = line.strip()
+        if not line:
+            continue
+        entry = json.loads(line)
+        shapes.append((entry.get('name') or f'captured:{number}', entry['sql'], entry.get('params') or ()))
+    return shapes
+
+def _analyse(name, sql, plan, expect_index=None):
+    vendor = connection.vendor
+    scans = FULL_SCAN_PATTERNS.get(vendor)
+    sorts = SORT_PATTERNS.get(vendor)
+    return PlanReport(
+        name=name, sql=sql, plan=plan,
+        full_scans=sorted(set(scans.findall(plan))) if scans else [],
+        sorts=bool(sorts and sorts.search(plan)),
+        expect_index=expect_index,
+    )
+
+def _explain_sql(sql, params):
+    prefix = connection.ops.explain_query_prefix()
+    with connection.cursor() as cursor:
+        cursor.execute(f'{prefix} {sql}', params)
+        rows = cursor.fetchall()
+    return '\n'.join(' '.join(str(column) for column in row) for row in rows)
+
+def _time(run, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+    return sorted(timings)[len(timings) // 2]
+
+def explain_shape(shape, repeat=0):
+    """EXPLAIN a registered shape; with `repeat`, also time it (median seconds)."""
+    queryset = shape.queryset()
+    report = _analyse(shape.name, str(queryset.query), queryset.explain(), shape.expect_index)
+    if repeat:
+        report.seconds = _time(lambda: list(queryset.all()), repeat)
+    return report
+
+def explain_captured(name, sql, params, repeat=0):
+    report = _analyse(name, sql, _explain_sql(sql, params))
+    if repeat:
+        def run():
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                cursor.fetchall()
+        report.seconds = _time(run, repeat)
+    return report
+
+def audit(shapes, captured=(), repeat=0):
+    """Plan reports for registered shapes and captured statements."""
+    reports = [explain_shape(shape, repeat) for shape in shapes]
+    reports.extend(explain_captured(name, sql, params, repeat) for name, sql, params in captured)
+    return reports
+
+def _model_indexes(names):
+    from django.apps import apps
+
+    found = {}
+    for model in apps.get_models():
+        for index in model._meta.indexes:
+            if index.name in names:
+                found[index.name] = (model, index)
+    return found
+
+def audit_without_indexes(index_names, shapes, captured=(), repeat=0):
+    """
+    Plan reports as they were before the given indexes existed.
+
+    The indexes are dropped inside a transaction that is always rolled back,
+    so this needs a database with transactional DDL (SQLite, PostgreSQL) and
+    raises IndexComparisonUnsupported elsewhere. DROP INDEX holds an
+    exclusive lock on each table until the rollback (ACCESS EXCLUSIVE on
+    PostgreSQL), blocking every query on it for the whole audit, so only run
+    this against a database nobody else is using. Returns (reports, names of
+    indexes that were not found).
+    """
+    if not connection.features.can_rollback_ddl:
+        raise IndexComparisonUnsupported(f'{connection.vendor} cannot roll back DROP INDEX')
+
+    indexes = _model_indexes(set(index_names))
+    try:
+        with connection.schema_editor(atomic=True) as editor:
+            for model, index in indexes.values():
+                editor.remove_index(model, index)
+            reports = audit(shapes, captured, repeat)
+            raise _Rollback
+    except _Rollback:
+        pass
+    return reports, sorted(set(index_names) - set(indexes))
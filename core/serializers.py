@@ -22,4 +22,28 @@ class ErrorSerializer(serializers.Serializer):
     success = serializers.BooleanField(default=False)
     message = serializers.CharField(max_length=255)
     errors = serializers.JSONField()
-    status_code = serializers.IntegerField()
\ No newline at end of file
+    status_code = serializers.IntegerField()
+
+class ExpandableFieldsMixin:
+    """
+    Adds heavier nested fields only when the request asks for them via
+    `?expand=name1,name2`. Subclasses declare `expandable_fields` as
+    {name: (field_name, field_class, kwargs)}; an expanded field replaces any
+    lean field declared under the same field_name.
+    """
+    expandable_fields = {}
+    expand_param = 'expand'
+    
+    def get_requested_expansions(self):
+        request = self.context.get('request')
+        if request is None:
+            return set()
+        value = request.query_params.get(self.expand_param, '')
+        return {name.strip() for name in value.split(',') if name.strip()}
+    
+    def get_fields(self):
+        fields = super().get_fields()
+        for name in self.get_requested_expansions() & set(self.expandable_fields):
+            field_name, field_class, kwargs = self.expandable_fields[name]
+            fields[field_name] = field_class(**kwargs)
+        return fields